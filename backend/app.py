@@ -1,20 +1,93 @@
+import asyncio
+import hashlib
+import io
+import json
+import logging
 import os
-from typing import List, Dict, Any, Tuple
+import time
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import AsyncIterator, List, Dict, Any, Optional, Tuple, Union
 
-from fastapi import FastAPI, Request
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse, HTMLResponse
+from fastapi.responses import (
+    JSONResponse,
+    PlainTextResponse,
+    Response,
+    StreamingResponse,
+)
 import numpy as np
-from chromadb.api.types import Include, Embeddings
 
-from db import collection
+import metrics
+from cache import LRUCache, SharedCache, SingleFlight
+from dots import (
+    MEDIA_TYPE,
+    SearchResult,
+    from_binary,
+    result_size,
+    to_binary,
+    to_json,
+)
+from projection import (
+    ALL_LANGUAGES,
+    ProjectionBasis,
+    basis_key,
+    fit_local_basis,
+    load_bases,
+    pca,
+)
+from retrieval import (
+    embed_query,
+    load_resources,
+    query_embeddings,
+    retrieve,
+    retrieve_many,
+    search_language,
+)
+from static import StaticSite
+from vector_index import Neighbors
+from warmup import WORDS_PER_LANGUAGE, warm_from_env
+from workers import PoolSaturated, pool_from_env
+
+logger = logging.getLogger("uvicorn.error")
+
+
+# Filled in once the lifespan has opened the index; /ready reports it
+readiness: Dict[str, Any] = {"ready": False, "error": None, "seconds": None}
+
+
+async def start_up() -> None:
+    "Open the index and embedding function, then warm the cache"
+    loop = asyncio.get_running_loop()
+    try:
+        seconds = await loop.run_in_executor(None, load_resources)
+    except Exception as e:
+        logger.exception("Opening the search index failed")
+        readiness["error"] = str(e)
+        return
+    readiness.update(ready=True, seconds={k: round(v, 3) for k, v in seconds.items()})
+    logger.info(f"Search index ready: {readiness['seconds']}")
+    try:
+        await warm_from_env(warm_search, exclusive=shared_cache is not None)
+    except Exception as e:
+        # Most likely a bad WARMUP_* setting; report it rather than serve cold
+        logger.exception("Warming the search cache failed")
+        readiness.update(ready=False, error=f"Warm-up failed: {e}")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    # Load and warm up in the background: the server accepts connections at
+    # once, and a search arriving first opens what it needs itself
+    startup = asyncio.ensure_future(start_up())
+    yield
+    startup.cancel()
+    search_pool.shutdown()
 
-# Define valid include parameters
-EMBEDDINGS_AND_DOCUMENTS: Include = ["embeddings", "documents"]  # type: ignore
-DOCUMENTS_AND_METADATAS: Include = ["documents", "metadatas"]  # type: ignore
 
 # Server
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -24,85 +97,374 @@ app.add_middleware(
 )
 
 
-def pca(data: Embeddings) -> Embeddings:
-    "Basic 3-dimensional Principal Component Analysis"
-    # Convert input to numpy array
-    data_array = np.array(data, dtype=np.float64)
+# "local" fits a PCA to each result set; "global" projects with a basis fitted
+# offline by projection.py, so a word keeps its place across searches
+PROJECTION_MODES = ("local", "global")
+DEFAULT_PROJECTION = os.getenv("PROJECTION_MODE", "local")
+projection_bases = load_bases()
 
-    # Reshape if we have a 3D array
-    if len(data_array.shape) == 3:
-        # Flatten to 2D: (batch*n_embeddings, embedding_dim)
-        data_array = data_array.reshape(-1, data_array.shape[-1])
+SearchKey = Tuple[str, Tuple[str, ...], int, str]
 
-    X = data_array - np.mean(data_array, axis=0)
-    _, _, Vt = np.linalg.svd(X, full_matrices=False)
-    coordinates = np.dot(X, Vt.T[:, :3])
-    return coordinates.tolist()
 
+def normalize_search(word: str, languages: List[str]) -> Tuple[str, List[str]]:
+    """The word without surrounding whitespace, and each language once.
 
-cache: Dict[Tuple[str, Tuple[str, ...], int], List[dict]] = {}
+    Done once per request, so the cache key and the computed result come from
+    the same values. Case is kept: it can change the word ("Sie", "sie").
+    """
+    return word.strip(), list(dict.fromkeys(languages))
 
 
-@app.post("/api/search")
-async def search(request: Request) -> List[Dict[str, Any]]:
-    data = await request.json()
-    word: str = data["word"]
-    languages: List[str] = data["languages"]
-    words_per_l: int = data["words_per_l"]
-    cache_key = (word, tuple(languages), words_per_l)
-    if cache_key in cache:
-        return cache[cache_key]
+def search_key(
+    word: str, languages: List[str], words_per_l: int, projection: str
+) -> SearchKey:
+    "Any ordering of a search's languages shares one entry"
+    return (word, tuple(sorted(set(languages))), words_per_l, projection)
+
+
+def _env_ttl() -> Optional[float]:
+    ttl = os.getenv("SEARCH_CACHE_TTL")
+    return float(ttl) if ttl else None
+
+
+cache: LRUCache[SearchKey, SearchResult] = LRUCache(
+    max_entries=int(os.getenv("SEARCH_CACHE_MAX_ENTRIES", "20000")),
+    max_bytes=int(os.getenv("SEARCH_CACHE_MAX_MB", "128")) * 1024 * 1024,
+    ttl=_env_ttl(),
+    sizeof=result_size,
+)
+# With several worker processes (uvicorn --workers), a cache every worker
+# reads and writes, so each search is computed once per host, not per worker
+SEARCH_CACHE_SHARED_PATH = os.getenv("SEARCH_CACHE_SHARED_PATH")
+shared_cache: Optional[SharedCache] = (
+    SharedCache(
+        Path(SEARCH_CACHE_SHARED_PATH).expanduser(),
+        max_bytes=int(os.getenv("SEARCH_CACHE_SHARED_MB", "512")) * 1024 * 1024,
+        ttl=_env_ttl(),
+    )
+    if SEARCH_CACHE_SHARED_PATH
+    else None
+)
+
 
+# Searches slower than this many seconds are logged with their stage timings
+SLOW_SEARCH_SECONDS = float(os.getenv("SLOW_SEARCH_SECONDS", "0")) or None
+
+# Retrieval and projection block, so they run here instead of on the event loop
+search_pool = pool_from_env()
+# Identical searches arriving while one is being computed wait for that one
+in_flight: SingleFlight[SearchKey, SearchResult] = SingleFlight()
+
+
+def compute_search(
+    word: str, languages: List[str], words_per_l: int, projection: str = "local"
+) -> SearchResult:
+    "Retrieve each language's neighbours of `word` and project them to 3D"
+    return project(retrieve(word, languages, words_per_l), languages, projection)
+
+
+def project(
+    found: List[Neighbors],
+    languages: List[str],
+    projection: str,
+    basis: Optional[ProjectionBasis] = None,
+) -> SearchResult:
+    """Lay out `found` neighbours in 3D, in `basis` if one is given.
+
+    `languages` is every language searched, which picks the global basis
+    even while `found` only covers some of them.
+    """
     words = []
     embeddings = []
     word_languages = []
 
-    # Get embeddings for each language
-    include: Include = EMBEDDINGS_AND_DOCUMENTS
-    for language in languages:
-        records = collection.query(
-            query_texts=[word],
-            where={"language": language},
-            n_results=words_per_l,
-            include=include,
-        )
-        docs = records.get("documents", [[]])
-        lang_embeddings = records.get("embeddings", [[]])
-
-        if docs and lang_embeddings and docs[0] and len(lang_embeddings) > 0:
-            words.extend(docs[0])
-            embeddings.extend(list(lang_embeddings[0]))
-            word_languages.extend([language] * len(docs[0]))
+    for neighbors in found:
+        words.extend(neighbors.words)
+        embeddings.extend(neighbors.embeddings)
+        word_languages.extend([neighbors.language] * len(neighbors.words))
 
     if not words or not embeddings:
-        return []
+        return SearchResult([], [], np.empty((0, 3)))
     # Transform to coordinates
-    coordinates = pca(embeddings)
-    dots = []
-    for word, language, c in zip(words, word_languages, coordinates):
-        dots.append(
-            {
-                "word": word,
-                "language": language,
-                "x": float(c[0]),
-                "y": float(c[1]),
-                "z": float(c[2]),
-            }
+    if basis is None and projection == "global":
+        fallback = projection_bases.get(ALL_LANGUAGES)
+        basis = projection_bases.get(basis_key(languages), fallback)
+    with metrics.stage("projection"):
+        if basis is not None:
+            coordinates = basis.project(np.vstack(embeddings))
+        else:
+            # Also the fallback when no global basis has been fitted yet
+            coordinates = pca(np.vstack(embeddings))
+    return SearchResult(words, word_languages, coordinates)
+
+
+async def cached_search(
+    word: str, languages: List[str], words_per_l: int, projection: str
+) -> SearchResult:
+    "compute_search through the result cache and in-flight deduplication"
+    cache_key = search_key(word, languages, words_per_l, projection)
+    result = cached_result(cache_key)
+    if result is not None:
+        return result
+
+    async def compute() -> SearchResult:
+        # Covers the stages below plus any wait for a worker
+        with metrics.stage("compute"):
+            result = await search_pool.run(
+                compute_search, word, languages, words_per_l, projection
+            )
+        store_result(cache_key, result)
+        return result
+
+    return await in_flight.run(cache_key, compute)
+
+
+def cached_result(cache_key: SearchKey) -> Optional[SearchResult]:
+    result = cache.get(cache_key)
+    if result is None and shared_cache is not None:
+        data = shared_cache.get(json.dumps(cache_key))
+        if data is not None:
+            result = from_binary(data)
+            cache.set(cache_key, result)
+    return result
+
+
+def store_result(cache_key: SearchKey, result: SearchResult) -> None:
+    if not result.words:
+        return
+    cache.set(cache_key, result)
+    if shared_cache is not None:
+        shared_cache.set(json.dumps(cache_key), to_binary(result))
+
+
+async def search_events(
+    word: str, languages: List[str], words_per_l: int, projection: str
+) -> AsyncIterator[Dict[str, Any]]:
+    """Results of a search, refined as each language's neighbours arrive.
+
+    Every event is the whole layout so far; the last one has "done" set and
+    matches what /api/search returns. Cached searches are a single event.
+    """
+    cache_key = search_key(word, languages, words_per_l, projection)
+    result = cached_result(cache_key)
+    if result is not None:
+        yield {"done": True, "languages": languages, "dots": to_json(result)}
+        return
+
+    query_embedding = await search_pool.run(embed_query, word, languages)
+    pending = [
+        asyncio.ensure_future(
+            search_pool.run(search_language, query_embedding, language, words_per_l)
+        )
+        for language in languages
+    ]
+    found: Dict[str, Neighbors] = {}
+    try:
+        for next_done in asyncio.as_completed(pending):
+            neighbors = await next_done
+            found[neighbors.language] = neighbors
+            if len(found) == len(languages):
+                break
+            # In request order, so a language's dots keep their place
+            done = [language for language in languages if language in found]
+            partial = await search_pool.run(
+                project, [found[language] for language in done], languages, projection
+            )
+            yield {"done": False, "languages": done, "dots": to_json(partial)}
+    finally:
+        for task in pending:
+            task.cancel()
+    result = await search_pool.run(
+        project, [found[language] for language in languages], languages, projection
+    )
+    store_result(cache_key, result)
+    yield {"done": True, "languages": languages, "dots": to_json(result)}
+
+
+# Local layouts handed out by /api/neighborhood, so a follow-up request can
+# place new points in the same space. They are also kept in the shared cache
+# when there is one, as the follow-up may reach another worker.
+NEIGHBORHOOD_MAX_WORDS = int(os.getenv("NEIGHBORHOOD_MAX_WORDS", "20"))
+layout_bases: LRUCache[str, ProjectionBasis] = LRUCache(
+    max_entries=int(os.getenv("NEIGHBORHOOD_BASES", "10000")),
+    max_bytes=64 * 1024 * 1024,
+    sizeof=lambda basis: basis.mean.nbytes + basis.components.nbytes,
+)
+
+
+def compute_neighborhood(
+    words: List[str],
+    languages: List[str],
+    words_per_l: int,
+    projection: str,
+    basis: Optional[ProjectionBasis],
+) -> Tuple[SearchResult, Optional[ProjectionBasis]]:
+    """The union of the neighbourhoods of `words`, laid out in one space.
+
+    A local layout is placed in `basis` when given (existing points stay
+    put), otherwise in a new basis fitted to the union, which is returned.
+    """
+    found = retrieve_many(words, languages, words_per_l)
+    if projection == "local" and basis is None:
+        embeddings = [n.embeddings for n in found if n.words]
+        if embeddings:
+            with metrics.stage("projection"):
+                basis = fit_local_basis(np.vstack(embeddings))
+    return project(found, languages, projection, basis), basis
+
+
+def basis_id(basis: ProjectionBasis) -> str:
+    return hashlib.sha256(basis.components.tobytes()).hexdigest()[:16]
+
+
+def cached_layout(layout: str) -> Optional[ProjectionBasis]:
+    basis = layout_bases.get(layout)
+    if basis is None and shared_cache is not None:
+        data = shared_cache.get(f"layout:{layout}")
+        if data is not None:
+            with np.load(io.BytesIO(data)) as arrays:
+                basis = ProjectionBasis(arrays["mean"], arrays["components"])
+            layout_bases.set(layout, basis)
+    return basis
+
+
+def store_layout(basis: ProjectionBasis) -> str:
+    layout = basis_id(basis)
+    layout_bases.set(layout, basis)
+    if shared_cache is not None:
+        data = io.BytesIO()
+        np.savez(data, mean=basis.mean, components=basis.components)
+        shared_cache.set(f"layout:{layout}", data.getvalue())
+    return layout
+
+
+async def warm_search(word: str, languages: List[str]) -> SearchResult:
+    word, languages = normalize_search(word, languages)
+    return await cached_search(word, languages, WORDS_PER_LANGUAGE, DEFAULT_PROJECTION)
+
+
+@app.post("/api/search", response_model=None)
+async def search(request: Request) -> Union[List[Dict[str, Any]], Response]:
+    data = await request.json()
+    word, languages = normalize_search(data["word"], data["languages"])
+    words_per_l: int = data["words_per_l"]
+    projection: str = data.get("projection", DEFAULT_PROJECTION)
+    if projection not in PROJECTION_MODES:
+        raise HTTPException(400, f"projection must be one of {PROJECTION_MODES}")
+    start = time.perf_counter()
+    with metrics.breakdown() as stages:
+        try:
+            result = await cached_search(word, languages, words_per_l, projection)
+        except PoolSaturated:
+            raise HTTPException(503, "Too many searches in progress, try again")
+
+        with metrics.stage("serialize"):
+            if MEDIA_TYPE in request.headers.get("accept", ""):
+                response: Response = Response(
+                    content=to_binary(result), media_type=MEDIA_TYPE
+                )
+            else:
+                response = JSONResponse(to_json(result))
+    elapsed = time.perf_counter() - start
+    # Only the request that computed the result has its stages; cache hits
+    # and coalesced waiters have none
+    computed = "compute" in stages
+    metrics.request_seconds.observe(str(computed).lower(), elapsed)
+    if SLOW_SEARCH_SECONDS is not None and elapsed > SLOW_SEARCH_SECONDS:
+        timings = ", ".join(f"{name}={t * 1000:.1f}ms" for name, t in stages.items())
+        logger.warning(
+            f"Slow search {word!r} in {languages} took {elapsed * 1000:.1f}ms "
+            f"(computed={computed}): {timings}"
+        )
+    return response
+
+
+@app.post("/api/search/stream")
+async def search_stream(request: Request) -> StreamingResponse:
+    "Same request as /api/search; the response is NDJSON, see search_events"
+    data = await request.json()
+    word, languages = normalize_search(data["word"], data["languages"])
+    words_per_l: int = data["words_per_l"]
+    projection: str = data.get("projection", DEFAULT_PROJECTION)
+    if projection not in PROJECTION_MODES:
+        raise HTTPException(400, f"projection must be one of {PROJECTION_MODES}")
+    if search_pool.saturated:
+        raise HTTPException(503, "Too many searches in progress, try again")
+
+    async def lines() -> AsyncIterator[str]:
+        try:
+            async for event in search_events(word, languages, words_per_l, projection):
+                yield json.dumps(event) + "\n"
+        except PoolSaturated:
+            yield json.dumps({"error": "Too many searches in progress"}) + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
+@app.get("/metrics")
+async def metrics_endpoint() -> PlainTextResponse:
+    "Prometheus text format: stage histograms and cache/pool counters"
+    lines = metrics.request_seconds.render() + metrics.stage_seconds.render()
+    lines += metrics.render_stats("search_cache", cache.stats())
+    if shared_cache is not None:
+        lines += metrics.render_stats("shared_cache", shared_cache.stats())
+    lines += metrics.render_stats("in_flight", in_flight.stats())
+    lines += metrics.render_stats("search_pool", search_pool.stats())
+    lines += metrics.render_stats(
+        "query_embedding_cache", {"entries": len(query_embeddings)}
+    )
+    lines += metrics.render_stats("index", {"ready": int(readiness["ready"])})
+    return PlainTextResponse("\n".join(lines) + "\n", media_type="text/plain")
+
+
+@app.get("/health")
+async def health() -> Dict[str, str]:
+    "Liveness: the process is up and its event loop is responsive"
+    return {"status": "ok"}
+
+
+@app.get("/ready")
+async def ready() -> JSONResponse:
+    "Readiness: 200 once the search index is loaded, 503 until then or on an error"
+    return JSONResponse(readiness, status_code=200 if readiness["ready"] else 503)
+
+
+@app.post("/api/neighborhood")
+async def neighborhood(request: Request) -> Dict[str, Any]:
+    """Neighbours of several words at once, e.g. a result set plus a new word.
+
+    Takes "words" instead of "word", otherwise like /api/search, plus an
+    optional "layout" id from an earlier response: with the local
+    projection, the points are then placed in that earlier layout, so points
+    already on screen keep their coordinates. The response is {"layout":
+    id or null, "dots": [...]}; an unknown or expired layout gets a new one.
+    """
+    data = await request.json()
+    words: List[str] = list(dict.fromkeys(data["words"]))
+    languages: List[str] = list(dict.fromkeys(data["languages"]))
+    words_per_l: int = data["words_per_l"]
+    projection: str = data.get("projection", DEFAULT_PROJECTION)
+    if projection not in PROJECTION_MODES:
+        raise HTTPException(400, f"projection must be one of {PROJECTION_MODES}")
+    if not 0 < len(words) <= NEIGHBORHOOD_MAX_WORDS:
+        raise HTTPException(400, f"words must be 1 to {NEIGHBORHOOD_MAX_WORDS} words")
+    layout = data.get("layout")
+    basis = cached_layout(layout) if layout and projection == "local" else None
+    try:
+        result, basis = await search_pool.run(
+            compute_neighborhood, words, languages, words_per_l, projection, basis
         )
-    cache[cache_key] = dots
-    return dots
+    except PoolSaturated:
+        raise HTTPException(503, "Too many searches in progress, try again")
+    if basis is None:
+        return {"layout": None, "dots": to_json(result)}
+    return {"layout": store_layout(basis), "dots": to_json(result)}
 
 
 # Frontend
-@app.get("/favicon.png")
-async def favicon():
-    return FileResponse("frontend/dist/favicon.png")
+static_site = StaticSite()
 
 
 @app.get("/{full_path:path}")
-async def serve_index(request: Request, full_path: str):
-    public_file_path = os.path.join("../frontend/dist", full_path)
-    if os.path.exists(public_file_path) and os.path.isfile(public_file_path):
-        return FileResponse(public_file_path)
-    with open("../frontend/dist/index.html") as file:
-        return HTMLResponse(content=file.read())
+async def serve_index(request: Request, full_path: str) -> Response:
+    return static_site.response(full_path, request.headers)
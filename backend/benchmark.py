@@ -0,0 +1,323 @@
+"""Offline benchmarks for ingestion, projection, retrieval, the search API and
+wordlist extraction.
+
+Builds a synthetic collection of random vectors across the six languages,
+embedded by a local stub (nothing is downloaded and no embedding API is
+called), and prints the results as JSON so runs can be compared:
+
+    python3 benchmark.py --records 60000 --dim 1536 -o bench.json
+    SEARCH_INDEX=numpy python3 benchmark.py --db-path /tmp/bench-db
+
+Pass --db-path to keep the synthetic collection between runs; ingestion is
+only measured when the collection has to be built. Word extraction runs over
+the pages saved by fetch_wordlists.py, or over a synthetic 50k-row frequency
+table when none have been fetched.
+"""
+
+import argparse
+import asyncio
+import contextlib
+import hashlib
+import json
+import math
+import os
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+
+LANGUAGES = ["english", "spanish", "french", "german", "italian", "chinese"]
+WORDS_PER_LANGUAGE = 20
+PCA_SIZES = [20, 60, 120, 200, 500, 1000]
+
+
+class StubEmbeddingFunction:
+    "Deterministic random vectors seeded by each text, in place of a model"
+
+    def __init__(self, dim: int):
+        self.dim = dim
+
+    def __call__(self, texts: List[str]) -> List[np.ndarray]:
+        return [self.embed(text) for text in texts]
+
+    def embed(self, text: str) -> np.ndarray:
+        seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "big")
+        return np.random.default_rng(seed).normal(size=self.dim).astype(np.float32)
+
+
+def latency_stats(seconds: List[float]) -> Dict[str, float]:
+    ms = np.asarray(seconds) * 1000
+    return {
+        "n": len(ms),
+        "mean_ms": float(ms.mean()),
+        "p50_ms": float(np.percentile(ms, 50)),
+        "p90_ms": float(np.percentile(ms, 90)),
+        "p99_ms": float(np.percentile(ms, 99)),
+        "max_ms": float(ms.max()),
+    }
+
+
+def synthetic_words(records: int) -> List[Tuple[str, str]]:
+    "`records` (word, language) pairs spread evenly over LANGUAGES"
+    n = len(LANGUAGES)
+    return [
+        (f"{LANGUAGES[i % n][:2]}{i // n}", LANGUAGES[i % n]) for i in range(records)
+    ]
+
+
+def bench_pca(dim: int, repeats: int) -> List[Dict[str, Any]]:
+    from projection import pca
+
+    rng = np.random.default_rng(0)
+    results = []
+    for n in PCA_SIZES:
+        data = rng.normal(size=(n, dim)).astype(np.float32)
+        times = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            pca(data)
+            times.append(time.perf_counter() - start)
+        results.append({"points": n, **latency_stats(times)})
+    return results
+
+
+def synthetic_page(rows: int) -> str:
+    "A frequency-list table shaped like Wiktionary's parse output"
+    return (
+        '<div class="mw-parser-output"><table class="wikitable"><tbody>'
+        + "".join(
+            f'<tr><td>{i + 1}</td><td><a href="/wiki/w{i}#Italian" '
+            f'title="w{i}">w{i}</a></td><td><span class="Hans" lang="zh-Hans">'
+            f'<a href="/wiki/z{i}" title="z{i}">z{i}</a></span></td>'
+            f"<td>{(rows - i) * 7}</td></tr>\n"
+            for i in range(rows)
+        )
+        + "</tbody></table></div>"
+    )
+
+
+def bench_extract(pages: List[str], repeats: int) -> Dict[str, Any]:
+    "Each wordlist extractor over whole pages, and over their first 1000 words"
+    from fetch_wordlists import HANS_LINK_TEXT, LINK_TEXT, HTMLLinkExtractor
+
+    extractors = {
+        "link_text_regex": LINK_TEXT,
+        "hans_link_text_regex": HANS_LINK_TEXT,
+        "html_tokenizer": HTMLLinkExtractor(),
+    }
+    results: Dict[str, Any] = {"pages": len(pages), "bytes": sum(map(len, pages))}
+    for name, extractor in extractors.items():
+        full, first = [], []
+        words = 0
+        for _ in range(repeats):
+            start = time.perf_counter()
+            words = sum(sum(1 for _ in extractor(page)) for page in pages)
+            full.append(time.perf_counter() - start)
+            start = time.perf_counter()
+            for page in pages:
+                for i, _ in enumerate(extractor(page)):
+                    if i == 999:
+                        break
+            first.append(time.perf_counter() - start)
+        results[name] = {
+            "words": words,
+            "all_words": latency_stats(full),
+            "first_1000_words": latency_stats(first),
+        }
+    return results
+
+
+def bench_ingest(words: List[Tuple[str, str]], batch_size: int) -> Dict[str, Any]:
+    import db
+
+    ids = [db.record_id(language, word) for word, language in words]
+    start = time.perf_counter()
+    # ingest reports progress on stdout, which is reserved for the results
+    with contextlib.redirect_stdout(sys.stderr):
+        db.ingest(words, ids, batch_size=batch_size)
+    elapsed = time.perf_counter() - start
+    return {
+        "records": len(words),
+        "seconds": elapsed,
+        "words_per_second": len(words) / elapsed,
+    }
+
+
+def bench_retrieval(queries: int) -> Dict[str, Any]:
+    "Raw top-k search per language: Chroma's HNSW index and the numpy index"
+    import retrieval
+    from db import get_collection
+    from vector_index import NumpyIndex
+
+    rng = np.random.default_rng(1)
+    dim = len(retrieval.get_embedding_function()(["probe"])[0])
+    vectors = rng.normal(size=(queries, dim)).astype(np.float32)
+
+    start = time.perf_counter()
+    index = retrieval.get_numpy_index() or NumpyIndex.from_collection(get_collection())
+    load_seconds = time.perf_counter() - start
+    results: Dict[str, Any] = {"numpy_load_seconds": load_seconds}
+    for name, search in (
+        ("chroma", retrieval.query_language),
+        ("numpy", index.query),
+    ):
+        times = []
+        for i, vector in enumerate(vectors):
+            language = LANGUAGES[i % len(LANGUAGES)]
+            start = time.perf_counter()
+            search(vector, language, WORDS_PER_LANGUAGE)
+            times.append(time.perf_counter() - start)
+        results[name] = latency_stats(times)
+    return results
+
+
+async def bench_search(
+    words: List[Tuple[str, str]], requests: int, concurrency_levels: List[int]
+) -> Dict[str, Any]:
+    """Latency and throughput of POST /api/search, in process.
+
+    Cold requests are distinct searches against an empty result cache; warm
+    requests repeat searches that are already cached.
+    """
+    import httpx
+
+    import app
+
+    transport = httpx.ASGITransport(app=app.app)  # type: ignore[arg-type]
+    language_sets = {"one_language": LANGUAGES[:1], "six_languages": LANGUAGES}
+    results: Dict[str, Any] = {}
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://bench"
+    ) as client:
+
+        async def search(word: str, languages: List[str]) -> float:
+            start = time.perf_counter()
+            response = await client.post(
+                "/api/search",
+                json={
+                    "word": word,
+                    "languages": languages,
+                    "words_per_l": WORDS_PER_LANGUAGE,
+                },
+            )
+            response.raise_for_status()
+            return time.perf_counter() - start
+
+        stride = max(1, len(words) // requests)
+        queries = [words[i * stride % len(words)][0] for i in range(requests)]
+        for name, languages in language_sets.items():
+            app.cache.clear()
+            cold = [await search(word, languages) for word in queries]
+            warm = [await search(word, languages) for word in queries]
+            results[name] = {"cold": latency_stats(cold), "warm": latency_stats(warm)}
+
+        load = []
+        for concurrency in concurrency_levels:
+            app.cache.clear()
+            semaphore = asyncio.Semaphore(concurrency)
+            failed = 0
+
+            async def limited(word: str) -> float:
+                nonlocal failed
+                async with semaphore:
+                    try:
+                        return await search(word, LANGUAGES)
+                    except httpx.HTTPStatusError:
+                        failed += 1
+                        return float("nan")
+
+            start = time.perf_counter()
+            times = await asyncio.gather(*[limited(word) for word in queries])
+            elapsed = time.perf_counter() - start
+            ok = [t for t in times if not math.isnan(t)]
+            load.append(
+                {
+                    "concurrency": concurrency,
+                    "requests_per_second": len(ok) / elapsed,
+                    "failed": failed,
+                    **(latency_stats(ok) if ok else {}),
+                }
+            )
+        results["load_six_languages_cold"] = load
+    return results
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        description="Benchmark the search hot path on a synthetic collection"
+    )
+    parser.add_argument("--records", type=int, default=60000)
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument(
+        "--db-path", type=Path, help="Keep the synthetic collection here"
+    )
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--requests", type=int, default=200, help="Per measurement")
+    parser.add_argument(
+        "--concurrency", default="1,8,32", help="Comma-separated load levels"
+    )
+    parser.add_argument("--pca-repeats", type=int, default=20)
+    parser.add_argument(
+        "--pages", type=Path, help="Saved wordlist pages (default: fetch cache)"
+    )
+    parser.add_argument("--extract-repeats", type=int, default=3)
+    parser.add_argument("-o", "--output", type=Path, help="Also write JSON here")
+    args = parser.parse_args()
+
+    workdir = Path(tempfile.mkdtemp(prefix="latentdictionary-bench-"))
+    db_path = args.db_path.expanduser() if args.db_path else workdir / "db"
+    # Everything the app would read from or write to the home directory is
+    # redirected, and no embedding API is configured
+    os.environ.update(
+        {
+            "DB_PATH": str(db_path),
+            "OPENAI_API_KEY": "",
+            "EMBEDDING_CACHE_PATH": str(workdir / "embeddings"),
+            "PROJECTION_PATH": str(workdir / "projection.npz"),
+            "WARMUP_WORDS": "0",
+        }
+    )
+    os.environ.pop("SEARCH_CACHE_SHARED_PATH", None)
+    os.environ.pop("EMBEDDING_BUNDLE", None)
+
+    import db
+
+    db.embedding_function = StubEmbeddingFunction(args.dim)
+    words = synthetic_words(args.records)
+    results: Dict[str, Any] = {
+        "config": {
+            "records": args.records,
+            "dim": args.dim,
+            "search_index": os.getenv("SEARCH_INDEX", "chroma"),
+            "search_workers": os.getenv("SEARCH_WORKERS", str(os.cpu_count())),
+            "cpus": os.cpu_count(),
+        },
+        "ingest": None,
+    }
+    if db.get_collection().count() < args.records:
+        results["ingest"] = bench_ingest(words, args.batch_size)
+    results["pca"] = bench_pca(args.dim, args.pca_repeats)
+    from fetch_wordlists import CACHE_PATH, saved_pages
+
+    pages = saved_pages(args.pages.expanduser() if args.pages else CACHE_PATH)
+    results["extract"] = bench_extract(
+        pages or [synthetic_page(50000)], args.extract_repeats
+    )
+    results["retrieval"] = bench_retrieval(args.requests)
+    concurrency = [int(level) for level in args.concurrency.split(",")]
+    results["search"] = asyncio.run(bench_search(words, args.requests, concurrency))
+
+    output = json.dumps(results, indent=2)
+    print(output)
+    if args.output:
+        args.output.write_text(output + "\n")
+    shutil.rmtree(workdir, ignore_errors=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
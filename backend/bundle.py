@@ -0,0 +1,300 @@
+"""Export the collection to a memory-mappable bundle, and rebuild it from one.
+
+A bundle is a directory holding everything needed to serve or rebuild the
+dictionary without calling the embedding API:
+
+    meta.json        model, dtype, dim, count and each language's row range
+    embeddings.npy   (count, dim) float32, rows grouped by language; or
+                     float16/int8 with --dtype (see quantize.py)
+    scales.npy       (count,) float32, per-row scales of int8 embeddings
+    inv_norms.npy    (count,) float32, 1 / ||embedding||
+    ids.txt          one record id per line, in row order
+    words.txt        one word per line, in row order
+    truncated_<dims>.npy
+                     (count, dims) float32, written on first use with
+                     SEARCH_INDEX_DIMS (see Bundle.truncated)
+
+    python3 bundle.py export ~/.latentdictionary-bundle
+    python3 bundle.py import ~/.latentdictionary-bundle
+"""
+
+import json
+import os
+import shutil
+import sys
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from quantize import INDEX_DTYPES, inverse_norms, quantize
+from vector_index import (
+    EMBEDDINGS_DOCUMENTS_AND_METADATAS,
+    LanguageMatrix,
+    NumpyIndex,
+    iter_records,
+    truncate_rows,
+)
+
+if TYPE_CHECKING:
+    from chromadb.api.models.Collection import Collection
+    from chromadb.api.types import Include
+
+BUNDLE_FORMAT = 1
+
+
+class Bundle(NamedTuple):
+    path: Path
+    model: str
+    ids: List[str]
+    words: List[str]
+    languages: Dict[str, Tuple[int, int]]  # language -> [start, stop) rows
+    embeddings: np.ndarray  # (count, dim) float32/float16/int8, memory-mapped
+    inv_norms: np.ndarray  # (count,) float32
+    scales: Optional[np.ndarray] = None  # (count,) float32 for int8
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def numpy_index(self) -> NumpyIndex:
+        """A NumpyIndex over the bundle that shares its memory map.
+
+        Each language is a slice of the mapped matrix, so nothing is copied:
+        pages are read on first use, and processes that map the same bundle
+        share one copy in the page cache.
+        """
+        return NumpyIndex(
+            {
+                language: LanguageMatrix(
+                    self.words[start:stop],
+                    self.embeddings[start:stop],
+                    self.inv_norms[start:stop],
+                    None if self.scales is None else self.scales[start:stop],
+                )
+                for language, (start, stop) in self.languages.items()
+            }
+        )
+
+    def truncated(self, dims: int) -> Dict[str, np.ndarray]:
+        """First-pass matrices for NumpyIndex(..., truncated=...), per language.
+
+        Rows are cut to `dims` dimensions and renormalized as in
+        NumpyIndex.truncate, but stored in truncated_<dims>.npy in the
+        bundle on first use and memory-mapped, so worker processes share
+        one copy in the page cache instead of each building its own.
+        """
+        path = self.path / f"truncated_{dims}.npy"
+        if not path.exists():
+            tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+            short = np.lib.format.open_memmap(
+                tmp, mode="w+", dtype=np.float32, shape=(len(self), dims)
+            )
+            for language, matrix in self.numpy_index().languages.items():
+                start, stop = self.languages[language]
+                truncate_rows(matrix, dims, short[start:stop])
+            short.flush()
+            del short
+            tmp.replace(path)
+        short = np.load(path, mmap_mode="r")
+        if short.shape != (len(self), dims):
+            raise ValueError(f"{path} does not match the bundle")
+        return {
+            language: short[start:stop]
+            for language, (start, stop) in self.languages.items()
+        }
+
+
+def read_lines(path: Path) -> List[str]:
+    text = path.read_text(encoding="utf-8")
+    return text.split("\n")[:-1] if text else []
+
+
+def load_bundle(path: Path) -> Bundle:
+    meta = json.loads((path / "meta.json").read_text())
+    if meta.get("format") != BUNDLE_FORMAT:
+        raise ValueError(f"Unsupported bundle format {meta.get('format')!r}")
+    embeddings = np.load(path / "embeddings.npy", mmap_mode="r")
+    ids = read_lines(path / "ids.txt")
+    words = read_lines(path / "words.txt")
+    if not len(ids) == len(words) == len(embeddings) == meta["count"]:
+        raise ValueError(f"Bundle at {path} is incomplete")
+    return Bundle(
+        path,
+        meta["model"],
+        ids,
+        words,
+        {language: (start, stop) for language, (start, stop) in meta["languages"]},
+        embeddings,
+        np.load(path / "inv_norms.npy"),
+        np.load(path / "scales.npy") if (path / "scales.npy").exists() else None,
+    )
+
+
+def export_bundle(
+    collection: "Collection",
+    path: Path,
+    model: str,
+    batch_size: int = 5000,
+    dtype: str = "float32",
+) -> Bundle:
+    """Write every record of `collection` to a bundle at `path`.
+
+    `dtype` other than float32 stores the embeddings quantized; such a
+    bundle can be served but not imported.
+
+    Two passes keep memory flat: the first reads only ids and languages to
+    lay out the rows, the second streams embeddings straight into the
+    memory-mapped output. The bundle is written next to `path` and moved
+    into place at the end, so a failed export never leaves half a bundle.
+    """
+    layout: Dict[str, List[str]] = {}
+    metadatas_only: Include = ["metadatas"]  # type: ignore
+    for records in iter_records(collection, metadatas_only, batch_size=batch_size):
+        for record_id, meta in zip(records["ids"], records.get("metadatas") or []):
+            layout.setdefault(str(meta.get("language", "")), []).append(record_id)
+    ids = [record_id for language in sorted(layout) for record_id in layout[language]]
+    if not ids:
+        raise ValueError("Cannot export an empty collection")
+    rows = {record_id: row for row, record_id in enumerate(ids)}
+    languages: List[Tuple[str, Tuple[int, int]]] = []
+    start = 0
+    for language in sorted(layout):
+        languages.append((language, (start, start + len(layout[language]))))
+        start += len(layout[language])
+
+    tmp = path.with_name(path.name + ".tmp")
+    shutil.rmtree(tmp, ignore_errors=True)
+    tmp.mkdir(parents=True)
+    embeddings = None
+    words = [""] * len(ids)
+    include: Include = EMBEDDINGS_DOCUMENTS_AND_METADATAS
+    for records in iter_records(collection, include, batch_size=batch_size):
+        batch = np.asarray(records.get("embeddings"), dtype=np.float32)
+        if embeddings is None:
+            embeddings = np.lib.format.open_memmap(
+                tmp / "embeddings.npy",
+                mode="w+",
+                dtype=np.float32,
+                shape=(len(ids), batch.shape[1]),
+            )
+        batch_rows = [rows[record_id] for record_id in records["ids"]]
+        embeddings[batch_rows] = batch
+        for row, doc in zip(batch_rows, records.get("documents") or []):
+            word = str(doc)
+            if "\n" in word:
+                raise ValueError(f"Cannot export a word with a newline: {word!r}")
+            words[row] = word
+    assert embeddings is not None
+    embeddings.flush()
+
+    stored = embeddings
+    if dtype != "float32":
+        stored = np.lib.format.open_memmap(
+            tmp / "quantized.npy", mode="w+", dtype=dtype, shape=embeddings.shape
+        )
+    scales = np.empty(len(ids), dtype=np.float32) if dtype == "int8" else None
+    inv_norms = np.empty(len(ids), dtype=np.float32)
+    for i in range(0, len(ids), batch_size):
+        block, block_scales = quantize(embeddings[i : i + batch_size], dtype)
+        if stored is not embeddings:
+            stored[i : i + batch_size] = block
+        if scales is not None:
+            scales[i : i + batch_size] = block_scales
+        inv_norms[i : i + batch_size] = inverse_norms(block, block_scales)
+    np.save(tmp / "inv_norms.npy", inv_norms)
+    if scales is not None:
+        np.save(tmp / "scales.npy", scales)
+    if stored is not embeddings:
+        stored.flush()
+        del stored
+        (tmp / "quantized.npy").replace(tmp / "embeddings.npy")
+    (tmp / "ids.txt").write_text("".join(f"{i}\n" for i in ids), encoding="utf-8")
+    (tmp / "words.txt").write_text("".join(f"{w}\n" for w in words), encoding="utf-8")
+    meta = {
+        "format": BUNDLE_FORMAT,
+        "model": model,
+        "dtype": dtype,
+        "dim": int(embeddings.shape[1]),
+        "count": len(ids),
+        "languages": languages,
+    }
+    (tmp / "meta.json").write_text(json.dumps(meta))
+    del embeddings
+
+    shutil.rmtree(path, ignore_errors=True)
+    tmp.rename(path)
+    return load_bundle(path)
+
+
+def import_bundle(
+    bundle: Bundle, collection: "Collection", batch_size: int = 5000
+) -> None:
+    "Upsert every record of `bundle` into `collection`; nothing is embedded"
+    if bundle.embeddings.dtype != np.float32:
+        raise ValueError(
+            f"Cannot import a {bundle.embeddings.dtype} bundle, "
+            "only full-precision embeddings"
+        )
+    for language, (start, stop) in bundle.languages.items():
+        for i in range(start, stop, batch_size):
+            j = min(i + batch_size, stop)
+            collection.upsert(
+                ids=bundle.ids[i:j],
+                embeddings=np.asarray(bundle.embeddings[i:j]),
+                documents=bundle.words[i:j],
+                metadatas=[{"language": language} for _ in range(i, j)],
+            )
+
+
+def main() -> int:
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description="Export the collection to a bundle, or rebuild it from one"
+    )
+    parser.add_argument("command", choices=["export", "import"])
+    parser.add_argument("path", type=Path)
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument(
+        "--dtype",
+        choices=INDEX_DTYPES,
+        default="float32",
+        help="Embedding storage of an exported bundle (float32 to re-import)",
+    )
+    args = parser.parse_args()
+    path = args.path.expanduser()
+
+    from db import MAX_RECORDS, embedding_model, get_collection
+
+    collection = get_collection()
+
+    if args.command == "export":
+        bundle = export_bundle(
+            collection, path, embedding_model, args.batch_size, args.dtype
+        )
+        print(f"Exported {len(bundle)} records to {path}")
+        return 0
+
+    bundle = load_bundle(path)
+    if bundle.embeddings.dtype != np.float32:
+        print(f"Error: {path} holds {bundle.embeddings.dtype} embeddings")
+        return 1
+    if bundle.model != embedding_model:
+        print(
+            f"Error: bundle was embedded with {bundle.model}, "
+            f"but the collection uses {embedding_model}"
+        )
+        return 1
+    if MAX_RECORDS and len(bundle) > MAX_RECORDS:
+        print(
+            f"Error: bundle has {len(bundle)} records, more than "
+            f"MAX_RECORDS ({MAX_RECORDS})"
+        )
+        return 1
+    import_bundle(bundle, collection, args.batch_size)
+    print(f"Imported {len(bundle)} records from {path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
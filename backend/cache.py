@@ -0,0 +1,235 @@
+import asyncio
+import sqlite3
+import sys
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import (
+    Awaitable,
+    Callable,
+    Dict,
+    Generic,
+    Hashable,
+    Optional,
+    Tuple,
+    TypeVar,
+)
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+
+class LRUCache(Generic[K, V]):
+    """Thread-safe LRU cache bounded by entry count and approximate bytes.
+
+    Entries older than `ttl` seconds (if set) are treated as misses and
+    dropped when next touched. `sizeof` estimates the memory held by a value;
+    it is called once per insert.
+    """
+
+    def __init__(
+        self,
+        max_entries: int,
+        max_bytes: int,
+        ttl: Optional[float] = None,
+        sizeof: Callable[[V], int] = sys.getsizeof,
+    ):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.sizeof = sizeof
+        # key -> (value, size, inserted_at), least recently used first
+        self._entries: "OrderedDict[K, Tuple[V, int, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: K) -> Optional[V]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self._expired(entry[2]):
+                self._remove(key)
+                self.expirations += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, key: K, value: V) -> None:
+        size = self.sizeof(value)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            if size > self.max_bytes:
+                # Would evict everything else and still not fit
+                return
+            self._entries[key] = (value, size, time.monotonic())
+            self.bytes += size
+            while len(self._entries) > self.max_entries or self.bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "entries": len(self._entries),
+            "bytes": self.bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+    def _expired(self, inserted_at: float) -> bool:
+        return self.ttl is not None and time.monotonic() - inserted_at > self.ttl
+
+    def _remove(self, key: K) -> None:
+        _, size, _ = self._entries.pop(key)
+        self.bytes -= size
+
+
+class SharedCache:
+    """Byte-string cache shared by every process on the host, kept in SQLite.
+
+    Meant as a second level behind each worker's LRUCache when the app runs
+    with several worker processes: whichever worker computes a search first
+    stores it here and the others read it instead of recomputing. Eviction
+    is oldest-inserted first, checked every `trim_every` inserts; the hot
+    entries live in the per-process LRU anyway. Entries older than `ttl`
+    seconds (if set) are misses.
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        max_bytes: int,
+        ttl: Optional[float] = None,
+        trim_every: int = 100,
+    ):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.trim_every = trim_every
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # One connection per process; the lock serializes this process's
+        # threads and SQLite's own locking handles the other processes
+        self._db = sqlite3.connect(
+            str(path), timeout=5, isolation_level=None, check_same_thread=False
+        )
+        self._lock = threading.Lock()
+        with self._lock:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS cache ("
+                "key TEXT PRIMARY KEY, value BLOB NOT NULL, inserted_at REAL NOT NULL)"
+            )
+            self._db.execute(
+                "CREATE INDEX IF NOT EXISTS cache_inserted_at ON cache (inserted_at)"
+            )
+        self._inserts = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT value, inserted_at FROM cache WHERE key = ?", (key,)
+            ).fetchone()
+            # Wall clock, unlike LRUCache: the entry may come from another process
+            if row is None or (
+                self.ttl is not None and time.time() - row[1] > self.ttl
+            ):
+                self.misses += 1
+                return None
+            self.hits += 1
+            return row[0]
+
+    def set(self, key: str, value: bytes) -> None:
+        if len(value) > self.max_bytes:
+            return
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO cache VALUES (?, ?, ?)",
+                (key, value, time.time()),
+            )
+            self._inserts += 1
+            if self._inserts % self.trim_every == 0:
+                self._trim()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            entries, size = self._db.execute(
+                "SELECT COUNT(*), COALESCE(SUM(LENGTH(value)), 0) FROM cache"
+            ).fetchone()
+        return {
+            "entries": entries,
+            "bytes": size,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+    def _trim(self) -> None:
+        if self.ttl is not None:
+            self._db.execute(
+                "DELETE FROM cache WHERE inserted_at < ?", (time.time() - self.ttl,)
+            )
+        size = self._db.execute(
+            "SELECT COALESCE(SUM(LENGTH(value)), 0) FROM cache"
+        ).fetchone()[0]
+        for key, length in self._db.execute(
+            "SELECT key, LENGTH(value) FROM cache ORDER BY inserted_at"
+        ).fetchall():
+            if size <= self.max_bytes:
+                break
+            self._db.execute("DELETE FROM cache WHERE key = ?", (key,))
+            size -= length
+
+
+class SingleFlight(Generic[K, V]):
+    """Concurrent calls for the same key await one shared computation.
+
+    The computation runs as its own task, so a caller that disconnects
+    (cancelling its await) does not cancel it for everyone else.
+    """
+
+    def __init__(self) -> None:
+        self._in_flight: Dict[K, "asyncio.Task[V]"] = {}
+        self.started = 0
+        self.coalesced = 0
+
+    def __len__(self) -> int:
+        return len(self._in_flight)
+
+    async def run(self, key: K, compute: Callable[[], Awaitable[V]]) -> V:
+        task = self._in_flight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(compute())
+            self._in_flight[key] = task
+            task.add_done_callback(lambda _: self._in_flight.pop(key, None))
+            self.started += 1
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "in_flight": len(self._in_flight),
+            "started": self.started,
+            "coalesced": self.coalesced,
+        }
@@ -1,120 +1,453 @@
+import hashlib
 import os
+import random
+import shutil
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
 from pathlib import Path
 
-from typing import List, Tuple, Set, cast
-
-import chromadb
-from chromadb.api.types import Include
-from chromadb.utils.embedding_functions.openai_embedding_function import (
-    OpenAIEmbeddingFunction,
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Deque,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+    Set,
+    cast,
 )
+
+import numpy as np
 from dotenv import load_dotenv
 
-# Define valid include parameters
-DOCUMENTS_AND_METADATAS: Include = ["documents", "metadatas"]  # type: ignore
+from embedding_cache import EmbeddingCache
+from vector_index import EMBEDDINGS_DOCUMENTS_AND_METADATAS, iter_records
+
+if TYPE_CHECKING:
+    # chromadb itself is imported when the client is first opened
+    from chromadb.api import ClientAPI
+    from chromadb.api.collection_configuration import CreateCollectionConfiguration
+    from chromadb.api.models.Collection import Collection
+    from chromadb.api.types import EmbeddingFunction, Embeddings, Include, Where
 
 load_dotenv()
 
-DB_PATH = Path("~/.latentdictionary").expanduser()
+DB_PATH = Path(os.getenv("DB_PATH", "~/.latentdictionary")).expanduser()
 DB_PATH.parent.mkdir(exist_ok=True)
 openai_api_key = os.getenv("OPENAI_API_KEY")
-client = chromadb.PersistentClient(path=DB_PATH.as_posix())
-# Configure HNSW index parameters for better performance and capacity
-hnsw_params = {
+COLLECTION_NAME = os.getenv("COLLECTION_NAME", "latent-dictionary")
+# HNSW index of a new collection. Space, M and construction ef are fixed once
+# the collection exists; change them by migrating it (see hnsw.py)
+hnsw_config: Dict[str, Any] = {
     "space": "cosine",
-    "construction_ef": 100,
-    "M": 16,
-    "max_elements": 100000,
+    "max_neighbors": int(os.getenv("HNSW_M", "16")),
+    "ef_construction": int(os.getenv("HNSW_CONSTRUCTION_EF", "100")),
 }
+# Search ef applies to an existing collection too, from the next time its
+# index is loaded. Unset: as the collection was created (Chroma's default 100)
+HNSW_SEARCH_EF = os.getenv("HNSW_SEARCH_EF")
+if HNSW_SEARCH_EF:
+    hnsw_config["ef_search"] = int(HNSW_SEARCH_EF)
+# Most records db.py will sync into the collection (0: no limit; the HNSW
+# index grows as records are added)
+MAX_RECORDS = int(os.getenv("MAX_RECORDS", "0"))
 
-if openai_api_key:
-    embedding_function = OpenAIEmbeddingFunction(
-        api_key=openai_api_key, model_name="text-embedding-3-small"
-    )
-    collection = client.get_or_create_collection(
-        name="latent-dictionary",
-        embedding_function=embedding_function,
-        metadata=hnsw_params,
-    )
-else:
+embedding_model = "text-embedding-3-small" if openai_api_key else "all-MiniLM-L6-v2"
+
+# Opened on first use (see get_client, get_collection, get_embedding_function),
+# so importing this module is cheap; tests and tools may assign their own
+client: Optional["ClientAPI"] = None
+collection: Optional["Collection"] = None
+embedding_function: Optional["EmbeddingFunction"] = None
+_open_lock = threading.RLock()
+
+
+def get_client() -> "ClientAPI":
+    global client
+    if client is None:
+        with _open_lock:
+            if client is None:
+                import chromadb
+
+                client = chromadb.PersistentClient(path=DB_PATH.as_posix())
+    return client
+
+
+def get_embedding_function() -> "EmbeddingFunction":
+    global embedding_function
+    if embedding_function is None:
+        with _open_lock:
+            if embedding_function is None:
+                from chromadb.utils.embedding_functions import (
+                    DefaultEmbeddingFunction,
+                    OpenAIEmbeddingFunction,
+                )
+
+                if openai_api_key:
+                    embedding_function = OpenAIEmbeddingFunction(
+                        api_key=openai_api_key, model_name=embedding_model
+                    )
+                else:
+                    # Same function Chroma falls back to; kept here so queries
+                    # can be embedded once outside of collection.query
+                    embedding_function = DefaultEmbeddingFunction()
+    return embedding_function
+
+
+def get_collection() -> "Collection":
+    global collection
+    if collection is None:
+        with _open_lock:
+            if collection is None:
+                collection = open_collection(get_client(), COLLECTION_NAME)
+    return collection
+
+
+def open_collection(
+    client: "ClientAPI", name: str, config: Optional[Dict[str, Any]] = None
+) -> "Collection":
+    "Get or create collection `name`; `config` (default hnsw_config) applies if new"
+    config = hnsw_config if config is None else config
+    kwargs: Dict[str, Any] = {}
+    if openai_api_key:
+        kwargs["embedding_function"] = get_embedding_function()
     collection = client.get_or_create_collection(
-        name="latent-dictionary",
-        metadata=hnsw_params,
+        name=name,
+        configuration=cast("CreateCollectionConfiguration", {"hnsw": config}),
+        **kwargs,
     )
+    current = (collection.configuration or {}).get("hnsw") or {}
+    if "ef_search" in config and current.get("ef_search") != config["ef_search"]:
+        collection.modify(configuration={"hnsw": {"ef_search": config["ef_search"]}})
+    return collection
 
 
-def main() -> None:
-    include: Include = DOCUMENTS_AND_METADATAS
-    all_records = collection.get(include=include)
+WORDLISTS_DIR = Path(__file__).parent / "wordlists"
+INGEST_CHECKPOINT_PATH = DB_PATH.parent / ".latentdictionary-ingest"
 
-    documents = all_records.get("documents", [])
-    metadatas = all_records.get("metadatas", [])
 
-    if not documents or not metadatas:
-        all_words: Set[Tuple[str, str]] = set()
-    else:
-        all_words = {
-            (cast(str, doc), cast(str, meta.get("language", "")))
-            for doc, meta in zip(documents, metadatas)
-        }
-    print(f"Found {len(all_words)} records in db")
-
-    new_words: List[Tuple[str, str]] = []
-    wordlists_dir = Path(__file__).parent / "wordlists"
-    for file in wordlists_dir.glob("*.txt"):
+def read_wordlists(wordlists_dir: Path) -> Iterator[Tuple[str, str]]:
+    "Stream (word, language) pairs from wordlists/<language>.txt"
+    for file in sorted(wordlists_dir.glob("*.txt")):
         language = file.name[:-4]
-        for line in file.read_text().split("\n"):
-            if line.startswith("#") or not line.strip():
-                continue
-            word = (line.strip(), language)
-            if word not in all_words:
-                new_words.append(word)
-    if len(new_words) == 0:
-        print("Nothing to add")
-    else:
-        print(f"Adding {len(new_words)} new records")
-
-    documents = []
-    metadatas = []
-    for word, language in new_words:
-        documents.append(word)
-        metadatas.append({"language": language})
-    ids = [f"id{i}" for i in range(len(all_words), len(all_words) + len(documents))]
-    batch_size = 1000
-    # First verify collection capacity
-    try:
-        collection_info = collection.get()
-        current_count = len(collection_info.get("ids", []))
-        total_records = current_count + len(documents)
-        max_capacity = hnsw_params["max_elements"]
-        if total_records > max_capacity:
+        with open(file, encoding="utf-8") as f:
+            for line in f:
+                if line.startswith("#") or not line.strip():
+                    continue
+                yield line.strip(), language
+
+
+def record_id(language: str, word: str) -> str:
+    "Deterministic id for a (language, word) record"
+    return hashlib.sha256(f"{language}\x00{word}".encode("utf-8")).hexdigest()[:32]
+
+
+def existing_ids(languages: Optional[List[str]] = None) -> Set[str]:
+    "Ids of every record (of `languages`, if given); nothing else is fetched"
+    if languages is not None and not languages:
+        # Chroma rejects an empty $in
+        return set()
+    include: Include = []  # type: ignore
+    where: Optional[Where] = None
+    if languages is not None:
+        where = cast("Where", {"language": {"$in": languages}})
+    return {
+        record_id
+        for records in iter_records(get_collection(), include, where=where)
+        for record_id in records["ids"]
+    }
+
+
+class RateLimiter:
+    """Token buckets for requests and (estimated) tokens per minute.
+
+    A limit of 0 disables that bucket.
+    """
+
+    def __init__(self, requests_per_minute: float, tokens_per_minute: float):
+        self.limits = (requests_per_minute, tokens_per_minute)
+        self.available = list(self.limits)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self, tokens: int) -> None:
+        cost = (1, tokens)
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                elapsed = now - self.updated
+                self.updated = now
+                wait = 0.0
+                for i, limit in enumerate(self.limits):
+                    if limit <= 0:
+                        continue
+                    self.available[i] = min(
+                        limit, self.available[i] + elapsed * limit / 60
+                    )
+                    # A request bigger than the bucket may go once it is full
+                    needed = min(cost[i], limit)
+                    if self.available[i] < needed:
+                        wait = max(wait, (needed - self.available[i]) * 60 / limit)
+                if wait == 0:
+                    for i, limit in enumerate(self.limits):
+                        if limit > 0:
+                            self.available[i] -= cost[i]
+                    return
+            time.sleep(wait)
+
+
+def estimate_tokens(texts: List[str]) -> int:
+    "Rough token count (~4 characters per token for these short words)"
+    return sum(max(1, len(text) // 4) for text in texts)
+
+
+def embed_with_retry(
+    texts: List[str], limiter: RateLimiter, attempts: int = 5
+) -> "Embeddings":
+    "Call the embedding function, backing off exponentially (with jitter)"
+    for attempt in range(attempts - 1):
+        limiter.acquire(estimate_tokens(texts))
+        try:
+            return get_embedding_function()(texts)
+        except Exception as e:
+            delay = 2**attempt + random.random()
+            print(f"Embedding failed ({e}), retrying in {delay:.1f}s")
+            time.sleep(delay)
+    limiter.acquire(estimate_tokens(texts))
+    return get_embedding_function()(texts)
+
+
+def embed_batch(
+    texts: List[str], limiter: RateLimiter, checkpoint: EmbeddingCache
+) -> np.ndarray:
+    """Embed `texts`, reusing vectors checkpointed by an earlier failed run.
+
+    New vectors are saved to the checkpoint before they are handed to Chroma.
+    """
+    vectors: Dict[str, np.ndarray] = {}
+    for text in texts:
+        vector = checkpoint.get(text)
+        if vector is not None:
+            vectors[text] = vector
+    missing = list(dict.fromkeys(text for text in texts if text not in vectors))
+    if missing:
+        for text, vector in zip(missing, embed_with_retry(missing, limiter)):
+            vectors[text] = np.asarray(vector, dtype=np.float32)
+            checkpoint.set(text, vectors[text])
+    return np.vstack([vectors[text] for text in texts])
+
+
+def ingest(
+    words: List[Tuple[str, str]],
+    ids: List[str],
+    batch_size: int = 1000,
+    workers: int = 4,
+    limiter: Optional[RateLimiter] = None,
+) -> None:
+    """Embed and add `words` to the collection.
+
+    Embedding requests for up to `workers` batches run concurrently while
+    finished batches are written to Chroma, in order, on this thread.
+    Embeddings are checkpointed to disk as they arrive, so rerunning after a
+    failure skips the rows already written (they are in the collection) and
+    the embedding calls already paid for (they are in the checkpoint).
+    """
+    limiter = limiter or RateLimiter(0, 0)
+    checkpoint = EmbeddingCache(INGEST_CHECKPOINT_PATH, embedding_model)
+    # Room for every word of this run on top of what earlier runs left behind
+    checkpoint.max_entries = len(checkpoint) + len(words)
+    batches = [
+        (ids[i : i + batch_size], words[i : i + batch_size])
+        for i in range(0, len(words), batch_size)
+    ]
+    total_words = 0
+    total_tokens = 0
+    start = time.monotonic()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures: Deque[Future] = deque()
+        next_batch = 0
+        for current_batch, (batch_ids, batch_words) in enumerate(batches, 1):
+            # Keep the embedding pool busy while this thread writes
+            while next_batch < len(batches) and len(futures) < workers * 2:
+                texts = [word for word, _ in batches[next_batch][1]]
+                futures.append(pool.submit(embed_batch, texts, limiter, checkpoint))
+                next_batch += 1
+            try:
+                embeddings = futures.popleft().result()
+                get_collection().upsert(
+                    ids=batch_ids,
+                    embeddings=embeddings,
+                    documents=[word for word, _ in batch_words],
+                    metadatas=[{"language": language} for _, language in batch_words],
+                )
+            except Exception as e:
+                for future in futures:
+                    future.cancel()
+                print(f"Error adding batch {current_batch}: {e}")
+                print("Rerun to resume; finished batches will be skipped")
+                raise
+            total_words += len(batch_words)
+            total_tokens += estimate_tokens([word for word, _ in batch_words])
+            elapsed = time.monotonic() - start
             print(
-                f"Error: Total records ({total_records}) would exceed "
-                f"collection capacity ({max_capacity})"
+                f"Added batch {current_batch} of {len(batches)}: "
+                f"{total_words / elapsed:.0f} words/s, "
+                f"~{total_tokens / elapsed:.0f} tokens/s"
             )
-            return
-    except Exception as e:
-        print(f"Error checking collection capacity: {e}")
-        return
-
-    # Proceed with batch insertion
-    for i in range(0, len(documents), batch_size):
-        _end = min(i + batch_size, len(documents))
-        try:
-            collection.add(
-                ids=ids[i:_end],
-                documents=documents[i:_end],
-                metadatas=metadatas[i:_end],
+    shutil.rmtree(checkpoint.path, ignore_errors=True)
+
+
+def reuse_embeddings(
+    removed: Set[str], added: Dict[str, Tuple[str, str]], batch_size: int = 1000
+) -> Dict[str, str]:
+    """Re-key rows that are being removed but whose word is being added.
+
+    This is what happens to every row on the first sync of a collection that
+    still has sequential "id<n>" ids: the rows move to their content ids with
+    their stored embeddings instead of being embedded again. Returns
+    {old id: new id} for the rows that were copied.
+    """
+    include: Include = EMBEDDINGS_DOCUMENTS_AND_METADATAS
+    new_ids = {word: new_id for new_id, word in added.items()}
+    moved: Dict[str, str] = {}
+    removed_ids = sorted(removed)
+    for i in range(0, len(removed_ids), batch_size):
+        records = get_collection().get(
+            ids=removed_ids[i : i + batch_size], include=include
+        )
+        embeddings = records.get("embeddings")
+        if embeddings is None:
+            continue
+        ids, rows, vectors = [], [], []
+        for old_id, doc, meta, embedding in zip(
+            records["ids"],
+            records.get("documents") or [],
+            records.get("metadatas") or [],
+            embeddings,
+        ):
+            word = (cast(str, doc), str(meta.get("language", "")))
+            new_id = new_ids.pop(word, None)
+            if new_id is None:
+                continue
+            moved[old_id] = new_id
+            ids.append(new_id)
+            rows.append(word)
+            vectors.append(embedding)
+        if ids:
+            get_collection().upsert(
+                ids=ids,
+                embeddings=np.asarray(vectors, dtype=np.float32),
+                documents=[word for word, _ in rows],
+                metadatas=[{"language": language} for _, language in rows],
             )
-            total_batches = (len(documents) + batch_size - 1) // batch_size
-            current_batch = i // batch_size + 1
-            print(f"Successfully added batch {current_batch} of {total_batches}")
-        except Exception as e:
-            print(f"Error adding batch {i//batch_size + 1}: {e}")
-            print(f"Failed at records {i} to {_end}")
-            return
-    print("Success! All records added.")
+    return moved
+
+
+def delete_ids(ids: Set[str], batch_size: int = 1000) -> None:
+    sorted_ids = sorted(ids)
+    for i in range(0, len(sorted_ids), batch_size):
+        get_collection().delete(ids=sorted_ids[i : i + batch_size])
+
+
+def main() -> int:
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description="Sync the collection with the wordlists: embed and add new "
+        "words, delete words no longer listed, leave the rest untouched"
+    )
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument(
+        "--workers", type=int, default=4, help="Concurrent embedding requests"
+    )
+    parser.add_argument(
+        "--rpm",
+        type=float,
+        default=0,
+        help="Embedding requests per minute (0: no limit)",
+    )
+    parser.add_argument(
+        "--tpm", type=float, default=0, help="Embedding tokens per minute (0: no limit)"
+    )
+    parser.add_argument(
+        "--keep-removed",
+        action="store_true",
+        help="Don't delete records whose word was removed from its wordlist",
+    )
+    args = parser.parse_args()
+
+    wanted: Dict[str, Tuple[str, str]] = {}
+    for word, language in read_wordlists(WORDLISTS_DIR):
+        wanted.setdefault(record_id(language, word), (word, language))
+    # Only languages that have a wordlist here are synced; records of any
+    # other language are left alone
+    languages = sorted({language for _, language in wanted.values()})
+    if not languages:
+        print(f"No words in {WORDLISTS_DIR}. Nothing to add")
+        return 0
+    current = existing_ids(languages)
+    print(f"Found {len(current)} records in db for {len(languages)} languages")
+
+    added = {i: wanted[i] for i in wanted.keys() - current}
+    removed = current - wanted.keys()
+    print(
+        f"{len(added)} to add, {len(removed)} to remove, "
+        f"{len(current) - len(removed)} unchanged"
+    )
+    if not added and (not removed or args.keep_removed):
+        print("Nothing to do")
+        return 0
+
+    total_records = get_collection().count() + len(added)
+    if not args.keep_removed:
+        total_records -= len(removed)
+    if MAX_RECORDS and total_records > MAX_RECORDS:
+        print(
+            f"Error: Total records ({total_records}) would exceed "
+            f"MAX_RECORDS ({MAX_RECORDS})"
+        )
+        return 1
+
+    if removed and added:
+        moved = reuse_embeddings(removed, added, args.batch_size)
+        if moved:
+            # Moved rows are still wanted, only under a new id
+            delete_ids(set(moved), args.batch_size)
+            removed -= moved.keys()
+            reused = set(moved.values())
+            added = {i: word for i, word in added.items() if i not in reused}
+            print(f"Re-keyed {len(moved)} records without re-embedding")
+    if removed and not args.keep_removed:
+        delete_ids(removed, args.batch_size)
+        print(f"Deleted {len(removed)} records")
+
+    if not added:
+        print("Success! Collection is in sync.")
+        return 0
+    print(f"Embedding {len(added)} new records")
+    start = time.monotonic()
+    try:
+        ingest(
+            list(added.values()),
+            list(added.keys()),
+            batch_size=args.batch_size,
+            workers=args.workers,
+            limiter=RateLimiter(args.rpm, args.tpm),
+        )
+    except Exception:
+        return 1
+    elapsed = time.monotonic() - start
+    print(
+        f"Success! All records added in {elapsed:.1f}s "
+        f"({len(added) / elapsed:.0f} words/s)"
+    )
+    return 0
 
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
@@ -0,0 +1,109 @@
+"""Search results and their wire formats.
+
+JSON (the default) is a list of {word, language, x, y, z} objects. Clients
+that send `Accept: application/vnd.latentdictionary.dots` get the same
+points packed into typed arrays instead, little-endian throughout:
+
+    offset  type                  contents
+    0       char[4]               magic b"LDOT"
+    4       uint32                format version (1)
+    8       uint32                n, number of points
+    12      uint32                m, number of languages
+    16      float32[n * 3]        x, y, z of each point
+    ..      uint32[n + 1]         byte offsets of each word in the word blob
+    ..      uint8[n]              index of each point's language
+    ..      utf-8                 word blob
+    ..      utf-8                 language names joined by "\\n"
+
+Both numeric arrays start on 4-byte boundaries, so a browser can wrap them
+in a Float32Array / Uint32Array without copying.
+"""
+
+import struct
+import sys
+from typing import Any, Dict, List, NamedTuple
+
+import numpy as np
+
+MEDIA_TYPE = "application/vnd.latentdictionary.dots"
+MAGIC = b"LDOT"
+VERSION = 1
+_HEADER = struct.Struct("<4sIII")
+
+
+class SearchResult(NamedTuple):
+    "Projected neighbours of a search, in response order"
+
+    words: List[str]
+    languages: List[str]
+    coordinates: np.ndarray  # (len(words), 3)
+
+
+def result_size(result: SearchResult) -> int:
+    "Approximate bytes held by a cached result (language strings are shared)"
+    size = sys.getsizeof(result.words) + sys.getsizeof(result.languages)
+    size += sum(sys.getsizeof(word) for word in result.words)
+    return size + result.coordinates.nbytes
+
+
+def to_json(result: SearchResult) -> List[Dict[str, Any]]:
+    return [
+        {
+            "word": word,
+            "language": language,
+            "x": float(c[0]),
+            "y": float(c[1]),
+            "z": float(c[2]),
+        }
+        for word, language, c in zip(
+            result.words, result.languages, result.coordinates.tolist()
+        )
+    ]
+
+
+def to_binary(result: SearchResult) -> bytes:
+    n = len(result.words)
+    language_names = list(dict.fromkeys(result.languages))
+    if len(language_names) > 255:
+        raise ValueError("Binary format supports at most 255 languages")
+    language_index = {language: i for i, language in enumerate(language_names)}
+
+    encoded = [word.encode("utf-8") for word in result.words]
+    offsets = np.zeros(n + 1, dtype="<u4")
+    np.cumsum([len(word) for word in encoded], out=offsets[1:])
+
+    return b"".join(
+        [
+            _HEADER.pack(MAGIC, VERSION, n, len(language_names)),
+            np.asarray(result.coordinates, dtype="<f4").reshape(n, 3).tobytes(),
+            offsets.tobytes(),
+            np.array(
+                [language_index[language] for language in result.languages],
+                dtype=np.uint8,
+            ).tobytes(),
+            b"".join(encoded),
+            "\n".join(language_names).encode("utf-8"),
+        ]
+    )
+
+
+def from_binary(data: bytes) -> SearchResult:
+    "Inverse of to_binary, for the shared cache, tests and Python clients"
+    magic, version, n, _ = _HEADER.unpack_from(data)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError("Not a version 1 dots payload")
+    pos = _HEADER.size
+    coordinates = np.frombuffer(data, dtype="<f4", count=n * 3, offset=pos)
+    pos += n * 3 * 4
+    offsets = np.frombuffer(data, dtype="<u4", count=n + 1, offset=pos)
+    pos += (n + 1) * 4
+    language_ids = np.frombuffer(data, dtype=np.uint8, count=n, offset=pos)
+    pos += n
+    blob = data[pos : pos + int(offsets[-1])]
+    words = [blob[offsets[i] : offsets[i + 1]].decode("utf-8") for i in range(n)]
+    language_names = data[pos + int(offsets[-1]) :].decode("utf-8").split("\n")
+    return SearchResult(
+        words,
+        [language_names[i] for i in language_ids],
+        coordinates.reshape(n, 3),
+    )
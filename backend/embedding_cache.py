@@ -0,0 +1,139 @@
+import fcntl
+import json
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, Optional
+
+import numpy as np
+
+
+class EmbeddingCache:
+    """Append-only (text -> vector) store for one embedding model on disk.
+
+    Vectors are packed float32 rows in `vectors.f32` and read through a
+    memory map; `keys.jsonl` holds one JSON-encoded text per row. Rows are
+    written before their key, so a torn write leaves an orphan row that is
+    dropped on the next sync rather than a key without a vector.
+
+    Several processes (uvicorn workers) may share one path: appends happen
+    under an exclusive lock on `.lock`, after reading whatever the others
+    appended, so a row number always means the same row in every process.
+    """
+
+    def __init__(self, path: Path, model: str, max_entries: int = 200_000):
+        self.path = path / model.replace("/", "_")
+        self.model = model
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._rows: Dict[str, int] = {}
+        self._n_rows = 0
+        self._keys_offset = 0
+        self._dim: Optional[int] = None
+        self._vectors: Optional[np.ndarray] = None
+        if (self.path / "meta.json").exists():
+            with self._file_lock():
+                self._sync()
+            self._remap()
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def get(self, text: str) -> Optional[np.ndarray]:
+        with self._lock:
+            row = self._rows.get(text)
+            if row is None and self._appended():
+                with self._file_lock():
+                    self._sync()
+                row = self._rows.get(text)
+            if row is None:
+                return None
+            if self._vectors is None or row >= len(self._vectors):
+                self._remap()
+            assert self._vectors is not None
+            return np.array(self._vectors[row])
+
+    def set(self, text: str, vector: np.ndarray) -> None:
+        vector = np.asarray(vector, dtype=np.float32).ravel()
+        with self._lock, self._file_lock():
+            self._sync()
+            if text in self._rows or self._n_rows >= self.max_entries:
+                return
+            if self._dim is None:
+                self._dim = len(vector)
+                (self.path / "meta.json").write_text(json.dumps({"dim": self._dim}))
+            elif len(vector) != self._dim:
+                raise ValueError(
+                    f"Expected {self._dim}-dim vector for {self.model}, "
+                    f"got {len(vector)}"
+                )
+            with open(self.path / "vectors.f32", "ab") as f:
+                f.write(vector.tobytes())
+            line = (json.dumps(text) + "\n").encode("utf-8")
+            with open(self.path / "keys.jsonl", "ab") as f:
+                f.write(line)
+            self._keys_offset += len(line)
+            self._rows[text] = self._n_rows
+            self._n_rows += 1
+
+    @contextmanager
+    def _file_lock(self) -> Iterator[None]:
+        self.path.mkdir(parents=True, exist_ok=True)
+        with open(self.path / ".lock", "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            yield
+
+    def _appended(self) -> bool:
+        "Whether keys were appended since the last sync"
+        try:
+            return (self.path / "keys.jsonl").stat().st_size > self._keys_offset
+        except FileNotFoundError:
+            return False
+
+    def _sync(self) -> None:
+        """Read the rows appended since the last sync; call with the file lock.
+
+        Anything past the last complete (key, row) pair was left by a writer
+        that died mid-append, and is truncated so that new rows line up with
+        their keys again.
+        """
+        if self._dim is None:
+            meta = self.path / "meta.json"
+            if not meta.exists():
+                return
+            self._dim = int(json.loads(meta.read_text())["dim"])
+        row_bytes = self._dim * 4
+        keys = self.path / "keys.jsonl"
+        vectors = self.path / "vectors.f32"
+        n_vectors = vectors.stat().st_size // row_bytes if vectors.exists() else 0
+        appended = b""
+        if keys.exists():
+            with open(keys, "rb") as f:
+                f.seek(self._keys_offset)
+                appended = f.read()
+        for line in appended.splitlines(keepends=True):
+            if self._n_rows >= n_vectors or not line.endswith(b"\n"):
+                break
+            try:
+                text = json.loads(line)
+            except ValueError:
+                break
+            self._rows.setdefault(text, self._n_rows)
+            self._n_rows += 1
+            self._keys_offset += len(line)
+        if keys.exists() and keys.stat().st_size > self._keys_offset:
+            with open(keys, "r+b") as f:
+                f.truncate(self._keys_offset)
+        if vectors.exists() and vectors.stat().st_size > self._n_rows * row_bytes:
+            with open(vectors, "r+b") as f:
+                f.truncate(self._n_rows * row_bytes)
+
+    def _remap(self) -> None:
+        assert self._dim is not None
+        vectors = self.path / "vectors.f32"
+        if self._n_rows == 0:
+            self._vectors = np.empty((0, self._dim), dtype=np.float32)
+            return
+        self._vectors = np.memmap(
+            vectors, dtype=np.float32, mode="r", shape=(self._n_rows, self._dim)
+        )
@@ -16,96 +16,410 @@ Future languages to be added:
 - Korean (ko)
 - Arabic (ar)
 - Vietnamese (vi)
+
+A language is added by an entry in CONFIGS: its pages, their sections, and
+the extractor that finds its words in a section's HTML.
 """
 
-import sys
+import hashlib
+import json
 import logging
-import requests
+import os
 import re
+import sys
+import threading
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from html.parser import HTMLParser
 from pathlib import Path
-from typing import List, Optional
+from typing import Deque, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
 
 # Configure logging
 logging.basicConfig(
     level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
 )
 
+API_URL = "https://en.wiktionary.org/w/api.php"
+# Parsed pages by revision, so unchanged pages are not downloaded again
+CACHE_PATH = Path(
+    os.getenv("WORDLIST_CACHE_PATH", "~/.latentdictionary-wordlists")
+).expanduser()
+# Wikimedia asks API clients to identify themselves
+USER_AGENT = "latentdictionary-wordlists/1.0 (https://www.latentdictionary.com)"
+# The API accepts up to 50 titles per revisions query
+TITLES_PER_QUERY = 50
+
+Section = Tuple[str, str]  # (page, section)
+
+
+class PageFetcher:
+    """Fetches rendered page sections from the MediaWiki API.
+
+    Requests share one pooled session and run up to `workers` at a time.
+    Every response is cached on disk with its revision id and ETag; a
+    section is downloaded again only when its page has a newer revision (one
+    batched revisions query covers all the pages), and then conditionally.
+    """
+
+    def __init__(
+        self,
+        api_url: str = API_URL,
+        cache_path: Path = CACHE_PATH,
+        workers: int = 6,
+    ):
+        self.api_url = api_url
+        self.cache_path = cache_path
+        self.workers = workers
+        self.session = requests.Session()
+        self.session.headers["User-Agent"] = USER_AGENT
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=workers)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._html: Dict[Section, str] = {}
+        self._lock = threading.Lock()
+        self.downloaded = 0
+        self.not_modified = 0
+        self.cached = 0
+
+    def fetch_all(self, sections: Iterable[Section]) -> Dict[Section, Optional[str]]:
+        "HTML of every (page, section), or None where it could not be fetched"
+        return dict(self.fetch_in_order(sections))
+
+    def fetch_in_order(
+        self, sections: Iterable[Section]
+    ) -> Iterator[Tuple[Section, Optional[str]]]:
+        """Each (page, section) with its HTML (or None), in the given order.
+
+        At most `workers` sections are fetched ahead of the consumer, so once
+        it stops reading, the sections after those are never downloaded.
+        """
+        wanted = list(dict.fromkeys(sections))
+        missing = [section for section in wanted if section not in self._html]
+        revisions = (
+            self.latest_revisions({page for page, _ in missing}) if missing else {}
+        )
+        pool = ThreadPoolExecutor(max_workers=self.workers)
+        ahead: Deque[Tuple[Section, Optional[Future]]] = deque()
+        try:
+            for section in wanted:
+                fetching = None
+                if section not in self._html:
+                    revision = revisions.get(section[0])
+                    fetching = pool.submit(self._fetch, section, revision)
+                ahead.append((section, fetching))
+                if len(ahead) >= self.workers:
+                    yield self._take(*ahead.popleft())
+            while ahead:
+                yield self._take(*ahead.popleft())
+        finally:
+            pool.shutdown(cancel_futures=True)
+
+    def _take(
+        self, section: Section, fetching: Optional[Future]
+    ) -> Tuple[Section, Optional[str]]:
+        if fetching is not None:
+            html = fetching.result()
+            if html is not None:
+                self._html[section] = html
+        return section, self._html.get(section)
+
+    def latest_revisions(self, pages: Iterable[str]) -> Dict[str, int]:
+        "Current revision id of each page that exists"
+        titles = sorted(pages)
+        revisions: Dict[str, int] = {}
+        for i in range(0, len(titles), TITLES_PER_QUERY):
+            params = {
+                "action": "query",
+                "prop": "revisions",
+                "rvprop": "ids",
+                "titles": "|".join(titles[i : i + TITLES_PER_QUERY]),
+                "format": "json",
+                "formatversion": "2",
+            }
+            try:
+                response = self.session.get(self.api_url, params=params, timeout=30)
+                response.raise_for_status()
+                data = response.json()
+            except Exception as e:
+                # Without revisions every section is revalidated instead
+                logging.warning(f"Could not check page revisions: {e}")
+                continue
+            query = data.get("query", {})
+            # The API reports titles normalized ("_" -> " "); map them back
+            normalized = {n["to"]: n["from"] for n in query.get("normalized", [])}
+            for page in query.get("pages", []):
+                if page.get("revisions"):
+                    title = normalized.get(page["title"], page["title"])
+                    revisions[title] = page["revisions"][0]["revid"]
+        return revisions
+
+    def _cache_file(self, section: Section) -> Path:
+        key = hashlib.sha256("\x00".join(section).encode("utf-8")).hexdigest()
+        return self.cache_path / f"{key[:32]}.json"
+
+    def _fetch(self, section: Section, revision: Optional[int]) -> Optional[str]:
+        page, number = section
+        cache_file = self._cache_file(section)
+        entry = None
+        if cache_file.exists():
+            try:
+                entry = json.loads(cache_file.read_text(encoding="utf-8"))
+            except ValueError:
+                entry = None
+        if entry is not None and revision is not None and entry["revid"] == revision:
+            with self._lock:
+                self.cached += 1
+            return entry["html"]
+
+        params = {
+            "action": "parse",
+            "page": page,
+            "section": number,
+            "format": "json",
+            "prop": "text|revid",
+        }
+        headers = {}
+        if entry is not None and entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        try:
+            response = self.session.get(
+                self.api_url, params=params, headers=headers, timeout=30
+            )
+            if response.status_code == 304 and entry is not None:
+                with self._lock:
+                    self.not_modified += 1
+                return entry["html"]
+            response.raise_for_status()
+            data = response.json()
+        except Exception as e:
+            logging.error(f"Error fetching {page} section {number}: {e}")
+            # A stale copy beats none
+            return None if entry is None else entry["html"]
+        if "parse" not in data:
+            logging.error(f"No content found in {page} section {number}")
+            return None
+
+        with self._lock:
+            self.downloaded += 1
+        html = data["parse"]["text"]["*"]
+        self.cache_path.mkdir(parents=True, exist_ok=True)
+        tmp = cache_file.with_suffix(".tmp")
+        tmp.write_text(
+            json.dumps(
+                {
+                    "revid": data["parse"].get("revid", revision),
+                    "etag": response.headers.get("ETag"),
+                    "html": html,
+                }
+            ),
+            encoding="utf-8",
+        )
+        tmp.replace(cache_file)
+        return html
+
+
+def saved_pages(cache_path: Path = CACHE_PATH) -> List[str]:
+    "HTML of every section in the response cache"
+    pages = []
+    for path in sorted(cache_path.glob("*.json")):
+        try:
+            pages.append(json.loads(path.read_text(encoding="utf-8"))["html"])
+        except (ValueError, KeyError):
+            continue
+    return pages
+
+
+def config_sections(config: dict) -> List[Section]:
+    "Every (page, section) of a language configuration, in list order"
+    # Handle both single page_path and multiple pages configurations
+    pages = config.get("pages", [config.get("page_path")])
+    return [(page, section) for page in pages for section in config.get("sections", [])]
+
+
+class RegexExtractor:
+    """Words captured by a precompiled pattern, yielded as they are matched.
+
+    Patterns should start from a literal that is rare in the page, such as
+    the end of a link's title attribute, so the regex engine can skip ahead
+    to it instead of trying a match at every tag.
+    """
+
+    def __init__(self, pattern: str, group: int = 1):
+        self.pattern = re.compile(pattern)
+        self.group = group
+
+    def __call__(self, html_content: str) -> Iterator[str]:
+        for match in self.pattern.finditer(html_content):
+            yield match.group(self.group)
+
+
+class _LinkParser(HTMLParser):
+    VOID = {"br", "hr", "img", "input", "link", "meta", "source", "wbr"}
+
+    def __init__(self, parent_class: Optional[str]):
+        super().__init__()
+        self.parent_class = parent_class
+        self.parents: List[Optional[str]] = []
+        self.text: Optional[List[str]] = None
+        self.words: List[str] = []
+
+    def handle_starttag(self, tag, attrs):
+        self.text = None
+        if tag in self.VOID:
+            return
+        if tag != "a":
+            self.parents.append(dict(attrs).get("class"))
+            return
+        title = dict(attrs).get("title") or ""
+        parent = self.parents[-1] if self.parents else None
+        if title and not title.startswith("#"):
+            if self.parent_class is None or (
+                parent is not None and self.parent_class in parent.split()
+            ):
+                self.text = []
+
+    def handle_endtag(self, tag):
+        if tag == "a":
+            if self.text:
+                self.words.append("".join(self.text))
+        elif self.parents and tag not in self.VOID:
+            self.parents.pop()
+        self.text = None
+
+    def handle_data(self, data):
+        if self.text is not None:
+            self.text.append(data)
+
+
+class HTMLLinkExtractor:
+    """Text of titled links, found by a streaming HTML tokenizer.
+
+    Slower than a regex but tolerant of attribute order and markup changes,
+    and entities are decoded. The page is fed in chunks, so only as much of
+    it is tokenized as the words taken from the iterator need. With
+    `parent_class`, only links directly inside an element of that class count.
+    """
+
+    def __init__(self, parent_class: Optional[str] = None, chunk_size: int = 16384):
+        self.parent_class = parent_class
+        self.chunk_size = chunk_size
+
+    def __call__(self, html_content: str) -> Iterator[str]:
+        parser = _LinkParser(self.parent_class)
+        for i in range(0, len(html_content), self.chunk_size):
+            parser.feed(html_content[i : i + self.chunk_size])
+            words, parser.words = parser.words, []
+            yield from words
+        parser.close()
+        yield from parser.words
+
+
+# Link text, format: <a href="..." title="word">word</a>
+LINK_TEXT = RegexExtractor(r'title="[^"#]+(?:#[^"]*)?">([^<]+)</a>')
+# Simplified Chinese characters: <span class="Hans"><a title="字">字</a></span>
+HANS_LINK_TEXT = RegexExtractor(
+    r'<span class="Hans"[^>]*><a [^>]*?title="[^"#]+(?:#[^"]*)?">([^<]+)</a></span>'
+)
+
+# Language configurations; "extractor" defaults to LINK_TEXT
+CONFIGS: Dict[str, dict] = {
+    "english": {
+        "page_path": "Wiktionary:Frequency_lists/English/Wikipedia_(2016)",
+        # Sections 1-1000 through 9001-10000
+        "sections": ["1", "2", "3", "4", "5", "6", "7", "8", "9", "10"],
+    },
+    "spanish": {
+        # Spanish frequency lists in 1000-word segments
+        "pages": [
+            "Wiktionary:Frequency_lists/Spanish1000",  # 1-1000
+            "Wiktionary:Frequency_lists/Spanish1001-2000",  # 1001-2000
+            "Wiktionary:Frequency_lists/Spanish2001-3000",  # 2001-3000
+            "Wiktionary:Frequency_lists/Spanish3001-4000",  # 3001-4000
+            "Wiktionary:Frequency_lists/Spanish4001-5000",  # 4001-5000
+            "Wiktionary:Frequency_lists/Spanish5001-6000",  # 5001-6000
+            "Wiktionary:Frequency_lists/Spanish6001-7000",  # 6001-7000
+            "Wiktionary:Frequency_lists/Spanish7001-8000",  # 7001-8000
+            "Wiktionary:Frequency_lists/Spanish8001-9000",  # 8001-9000
+            "Wiktionary:Frequency_lists/Spanish9001-10000",  # 9001-10000
+        ],
+        "sections": ["0"],  # Main section containing the word list
+    },
+    "french": {
+        "page_path": "Wiktionary:Frequency_lists/French_wordlist_opensubtitles_5000",
+        "sections": ["0"],  # Main section containing the word list
+    },
+    "german": {
+        "page_path": "Wiktionary:Frequency_lists/German/Mixed_web_3M",
+        # Sections 1-10 correspond to ranges 1-1000 through 9001-10000
+        "sections": ["1", "2", "3", "4", "5", "6", "7", "8", "9", "10"],
+    },
+    "italian": {
+        "page_path": "Wiktionary:Frequency_lists/Italian50k",
+        "sections": ["1", "2", "3", "4", "5", "6", "7", "8", "9", "10"],
+    },
+    "chinese": {
+        "pages": [
+            "Appendix:Mandarin_Frequency_lists/1-1000",
+            "Appendix:Mandarin_Frequency_lists/1001-2000",
+            "Appendix:Mandarin_Frequency_lists/2001-3000",
+            "Appendix:Mandarin_Frequency_lists/3001-4000",
+            "Appendix:Mandarin_Frequency_lists/4001-5000",
+            "Appendix:Mandarin_Frequency_lists/5001-6000",
+            "Appendix:Mandarin_Frequency_lists/6001-7000",
+            "Appendix:Mandarin_Frequency_lists/7001-8000",
+            "Appendix:Mandarin_Frequency_lists/8001-9000",
+            "Appendix:Mandarin_Frequency_lists/9001-10000",
+        ],
+        "sections": ["0"],  # Main section containing the word list
+        "extractor": HANS_LINK_TEXT,
+    },
+}
+
 
 def fetch_wiktionary_words(
     language: str,
     config: dict,
     num_words: int,
+    fetcher: Optional[PageFetcher] = None,
 ) -> Optional[List[str]]:
     """Fetch word frequency list from Wiktionary.
 
     Args:
         language: Language name (e.g., "english")
-        config: Language configuration containing pages and sections
+        config: Language configuration containing pages, sections and
+            optionally the extractor that finds words in a section's HTML
         num_words: Maximum number of words to fetch
+        fetcher: Shared fetcher; sections it already holds are not fetched
 
     Returns:
         List of words in frequency order, or None if fetch fails
     """
     try:
+        fetcher = fetcher or PageFetcher()
         all_words = []
         seen_words = set()  # Track unique words across all pages
-
-        # Handle both single page_path and multiple pages configurations
-        pages = config.get("pages", [config.get("page_path")])
-        sections = config.get("sections", [])
-
-        for page in pages:
+        extractor = config.get("extractor", LINK_TEXT)
+
+        # Sections are fetched as they are read, so none past the last one
+        # needed (and the few fetched ahead of it) is downloaded
+        for _, html_content in fetcher.fetch_in_order(config_sections(config)):
+            if html_content is None:
+                continue
+            # Extractors are lazy: the rest of a page is never parsed once
+            # enough words have been taken from it
+            for word in extractor(html_content):
+                # Check word validity: non-empty and not already seen
+                if word and word not in seen_words:
+                    seen_words.add(word)
+                    all_words.append(word)
+                    if len(all_words) >= num_words:
+                        break
             if len(all_words) >= num_words:
                 break
 
-            for section in sections:
-                params = {
-                    "action": "parse",
-                    "page": page,
-                    "section": section,
-                    "format": "json",
-                    "prop": "text",
-                }
-
-                response = requests.get(
-                    "https://en.wiktionary.org/w/api.php", params=params
-                )
-                response.raise_for_status()
-                data = response.json()
-
-                if "parse" not in data:
-                    logging.error(
-                        f"No content found in {language} frequency list "
-                        f"page {page} section {section}"
-                    )
-                    continue
-
-                # Extract words from the HTML content
-                html_content = data["parse"]["text"]["*"]
-
-                if language == "chinese":
-                    # Extract Simplified Chinese characters from spans
-                    word_pattern = (
-                        r'<span class="Hans"[^>]*>'
-                        r'<a[^>]+?title="([^"#]+)(?:#[^"]*)?">([^<]+)</a>'
-                        r"</span>"
-                    )
-                else:
-                    # Extract words from links (format: <a title="word">word</a>)
-                    word_pattern = r'<a[^>]+?title="([^"#]+)(?:#[^"]*)?">([^<]+)</a>'
-
-                for match in re.finditer(word_pattern, html_content):
-                    title, word = match.groups()
-                    # Check word validity: non-empty and not already seen
-                    if word and word not in seen_words:
-                        seen_words.add(word)
-                        all_words.append(word)
-                        if len(all_words) >= num_words:
-                            break
-
-                if len(all_words) >= num_words:
-                    break
-
         if not all_words:
             logging.error(f"No words found in {language} frequency list")
             return None
@@ -160,7 +474,7 @@ def main():
         "-l",
         "--language",
         type=str,
-        choices=["english", "spanish", "french", "german", "italian", "chinese"],
+        choices=list(CONFIGS),
         help="Specific language to fetch (if not specified, fetches all languages)",
     )
     parser.add_argument(
@@ -169,79 +483,37 @@ def main():
         default=True,
         help="Process all configured languages (default: True)",
     )
+    parser.add_argument(
+        "-w",
+        "--workers",
+        type=int,
+        default=6,
+        help="Pages fetched at a time (default: 6)",
+    )
+    parser.add_argument(
+        "--api-url",
+        default=API_URL,
+        help="MediaWiki API to fetch from (default: English Wiktionary)",
+    )
     args = parser.parse_args()
 
-    # Language configurations
-    configs = {
-        "english": {
-            "page_path": "Wiktionary:Frequency_lists/English/Wikipedia_(2016)",
-            # Sections 1-1000 through 9001-10000
-            "sections": ["1", "2", "3", "4", "5", "6", "7", "8", "9", "10"],
-        },
-        "spanish": {
-            # Spanish frequency lists in 1000-word segments
-            "pages": [
-                "Wiktionary:Frequency_lists/Spanish1000",  # 1-1000
-                "Wiktionary:Frequency_lists/Spanish1001-2000",  # 1001-2000
-                "Wiktionary:Frequency_lists/Spanish2001-3000",  # 2001-3000
-                "Wiktionary:Frequency_lists/Spanish3001-4000",  # 3001-4000
-                "Wiktionary:Frequency_lists/Spanish4001-5000",  # 4001-5000
-                "Wiktionary:Frequency_lists/Spanish5001-6000",  # 5001-6000
-                "Wiktionary:Frequency_lists/Spanish6001-7000",  # 6001-7000
-                "Wiktionary:Frequency_lists/Spanish7001-8000",  # 7001-8000
-                "Wiktionary:Frequency_lists/Spanish8001-9000",  # 8001-9000
-                "Wiktionary:Frequency_lists/Spanish9001-10000",  # 9001-10000
-            ],
-            "sections": ["0"],  # Main section containing the word list
-        },
-        "french": {
-            "page_path": (
-                "Wiktionary:Frequency_lists/French_wordlist_opensubtitles_5000"
-            ),
-            "sections": ["0"],  # Main section containing the word list
-        },
-        "german": {
-            "page_path": "Wiktionary:Frequency_lists/German/Mixed_web_3M",
-            # Sections 1-10 correspond to ranges 1-1000 through 9001-10000
-            "sections": ["1", "2", "3", "4", "5", "6", "7", "8", "9", "10"],
-        },
-        "italian": {
-            "page_path": "Wiktionary:Frequency_lists/Italian50k",
-            "sections": ["1", "2", "3", "4", "5", "6", "7", "8", "9", "10"],
-        },
-        "chinese": {
-            "pages": [
-                "Appendix:Mandarin_Frequency_lists/1-1000",
-                "Appendix:Mandarin_Frequency_lists/1001-2000",
-                "Appendix:Mandarin_Frequency_lists/2001-3000",
-                "Appendix:Mandarin_Frequency_lists/3001-4000",
-                "Appendix:Mandarin_Frequency_lists/4001-5000",
-                "Appendix:Mandarin_Frequency_lists/5001-6000",
-                "Appendix:Mandarin_Frequency_lists/6001-7000",
-                "Appendix:Mandarin_Frequency_lists/7001-8000",
-                "Appendix:Mandarin_Frequency_lists/8001-9000",
-                "Appendix:Mandarin_Frequency_lists/9001-10000",
-            ],
-            "sections": ["0"],  # Main section containing the word list
-        },
-    }
-
     # Determine which languages to process
     languages_to_process = []
     if args.language:
         languages_to_process = [args.language]
     elif args.all:
-        languages_to_process = list(configs.keys())
+        languages_to_process = list(CONFIGS)
 
     if not languages_to_process:
         logging.error("No languages specified to process")
         return 1
 
+    fetcher = PageFetcher(args.api_url, workers=args.workers)
     success = True
     for language in languages_to_process:
-        config = configs[language]
-        logging.info(f"Fetching {language} frequency list...")
-        words = fetch_wiktionary_words(language, config, args.num_words)
+        config = CONFIGS[language]
+        logging.info(f"Extracting {language} frequency list...")
+        words = fetch_wiktionary_words(language, config, args.num_words, fetcher)
 
         if words:
             if save_wordlist(words, language):
@@ -253,6 +525,10 @@ def main():
             logging.error(f"Failed to fetch {language} frequency list")
             success = False
 
+    logging.info(
+        f"Downloaded {fetcher.downloaded} sections, "
+        f"{fetcher.cached + fetcher.not_modified} unchanged since the last run"
+    )
     return 0 if success else 1
 
 
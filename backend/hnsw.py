@@ -0,0 +1,317 @@
+"""Inspect, tune and migrate the Chroma collection's HNSW index.
+
+Space, M and construction ef are fixed when a collection is created, so
+changing them means copying the records into a new collection; no word is
+embedded again. Search ef can be changed in place (HNSW_SEARCH_EF), and is
+used from the next time a process loads the index.
+
+    python3 hnsw.py show
+    python3 hnsw.py sweep --search-ef 10,20,50,100,200 --m 16,32
+    python3 hnsw.py migrate latent-dictionary-m32 --m 32 --construction-ef 200
+    python3 hnsw.py migrate latent-dictionary-m32 --m 32 --replace
+
+sweep measures recall@k against an exact cosine search (for an l2 or ip
+index, the same ranking as long as embeddings are unit vectors, as both
+embedding models' are) and per-query latency on the live data. Search ef
+is swept on the collection itself and restored afterwards; every other M
+is swept on a temporary copy.
+"""
+
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import chromadb
+import numpy as np
+from chromadb.api import ClientAPI
+from chromadb.api.shared_system_client import SharedSystemClient
+from chromadb.api.models.Collection import Collection
+from chromadb.api.types import Include
+
+from vector_index import EMBEDDINGS_DOCUMENTS_AND_METADATAS, NumpyIndex, iter_records
+
+
+def copy_records(source: Collection, target: Collection, batch_size: int = 5000) -> int:
+    "Add every record of `source` to `target`, embeddings included"
+    include: Include = EMBEDDINGS_DOCUMENTS_AND_METADATAS
+    copied = 0
+    for records in iter_records(source, include, batch_size=batch_size):
+        target.add(
+            ids=records["ids"],
+            embeddings=records.get("embeddings"),
+            documents=records.get("documents"),
+            metadatas=records.get("metadatas"),
+        )
+        copied += len(records["ids"])
+    return copied
+
+
+def migrate(
+    client: ClientAPI,
+    source: Collection,
+    name: str,
+    config: Dict[str, Any],
+    batch_size: int = 5000,
+    replace: bool = False,
+) -> Collection:
+    """Copy `source` into a new collection `name` created with `config`.
+
+    With `replace`, the copy then takes the source's name and the source is
+    kept as <name>-previous (replacing an older one). Servers keep reading
+    the collection they opened until they restart.
+    """
+    from db import open_collection
+
+    if name in [c.name for c in client.list_collections()]:
+        raise ValueError(f"Collection {name} already exists")
+    target = open_collection(client, name, config)
+    try:
+        copied = copy_records(source, target, batch_size)
+    except BaseException:
+        client.delete_collection(name)
+        raise
+    if copied != source.count():
+        client.delete_collection(name)
+        raise RuntimeError(
+            f"Copied {copied} of {source.count()} records; {source.name} changed "
+            "during the migration"
+        )
+    if replace:
+        source_name = source.name
+        previous = f"{source_name}-previous"
+        if previous in [c.name for c in client.list_collections()]:
+            client.delete_collection(previous)
+        source.modify(name=previous)
+        target.modify(name=source_name)
+    return target
+
+
+def hnsw_settings(collection: Collection) -> Dict[str, Any]:
+    return dict((collection.configuration or {}).get("hnsw") or {})
+
+
+def recall_latency(
+    collection: Collection,
+    truth: NumpyIndex,
+    queries: Dict[str, np.ndarray],
+    n_results: int,
+) -> Dict[str, float]:
+    "Mean recall@k of `collection` against `truth`, and its latency per query"
+    recalls: List[float] = []
+    seconds: List[float] = []
+    for language, vectors in queries.items():
+        for query in vectors:
+            expected = truth.query(query, language, n_results).words
+            start = time.perf_counter()
+            records = collection.query(
+                query_embeddings=[query],
+                where={"language": language},
+                n_results=n_results,
+                include=["documents"],  # type: ignore
+            )
+            seconds.append(time.perf_counter() - start)
+            found = set((records.get("documents") or [[]])[0])
+            recalls.append(len(found & set(expected)) / max(1, len(expected)))
+    ms = np.asarray(seconds) * 1000
+    return {
+        f"recall@{n_results}": float(np.mean(recalls)),
+        "mean_ms": float(ms.mean()),
+        "p50_ms": float(np.percentile(ms, 50)),
+        "p99_ms": float(np.percentile(ms, 99)),
+    }
+
+
+def sample_queries(
+    truth: NumpyIndex, n_queries: int, seed: int = 0
+) -> Dict[str, np.ndarray]:
+    "Stored embeddings sampled from every language"
+    rng = np.random.default_rng(seed)
+    queries = {}
+    for language, matrix in truth.languages.items():
+        rows = rng.choice(
+            len(matrix.words), min(n_queries, len(matrix.words)), replace=False
+        )
+        queries[language] = matrix.vectors(np.sort(rows))
+    return queries
+
+
+def sweep_search_ef(
+    path: Path,
+    name: str,
+    truth: NumpyIndex,
+    queries: Dict[str, np.ndarray],
+    search_efs: List[int],
+    n_results: int,
+) -> List[Dict[str, Any]]:
+    """Recall and latency of collection `name` at each search ef.
+
+    A loaded index keeps the search ef it was loaded with, so the client is
+    reopened for every value. The collection's own value is restored.
+    """
+    client = chromadb.PersistentClient(path=path.as_posix())
+    original = hnsw_settings(client.get_collection(name)).get("ef_search")
+    results = []
+    try:
+        for ef in search_efs:
+            client.get_collection(name).modify(
+                configuration={"hnsw": {"ef_search": ef}}
+            )
+            SharedSystemClient.clear_system_cache()
+            client = chromadb.PersistentClient(path=path.as_posix())
+            collection = client.get_collection(name)
+            settings = hnsw_settings(collection)
+            results.append(
+                {
+                    "M": settings.get("max_neighbors"),
+                    "construction_ef": settings.get("ef_construction"),
+                    "search_ef": ef,
+                    **recall_latency(collection, truth, queries, n_results),
+                }
+            )
+    finally:
+        if original is not None:
+            client.get_collection(name).modify(
+                configuration={"hnsw": {"ef_search": original}}
+            )
+        SharedSystemClient.clear_system_cache()
+    return results
+
+
+def sweep(
+    path: Path,
+    name: str,
+    search_efs: List[int],
+    ms: Optional[List[int]] = None,
+    n_queries: int = 100,
+    n_results: int = 20,
+    batch_size: int = 5000,
+) -> List[Dict[str, Any]]:
+    "Recall and latency of the collection at every (M, search ef) pair"
+    from db import open_collection
+
+    client = chromadb.PersistentClient(path=path.as_posix())
+    source = client.get_collection(name)
+    if not source.count():
+        raise ValueError(f"Cannot sweep {name}: it has no records")
+    settings = hnsw_settings(source)
+    truth = NumpyIndex.from_collection(source, batch_size)
+    queries = sample_queries(truth, n_queries)
+    results = sweep_search_ef(path, name, truth, queries, search_efs, n_results)
+    for m in ms or []:
+        if m == settings.get("max_neighbors"):
+            continue
+        # Built in a throwaway database, so the live one never holds a copy
+        workdir = Path(tempfile.mkdtemp(prefix="latentdictionary-hnsw-"))
+        try:
+            copy = open_collection(
+                chromadb.PersistentClient(path=workdir.as_posix()),
+                name,
+                {**settings, "max_neighbors": m},
+            )
+            client = chromadb.PersistentClient(path=path.as_posix())
+            copy_records(client.get_collection(name), copy, batch_size)
+            results.extend(
+                sweep_search_ef(workdir, name, truth, queries, search_efs, n_results)
+            )
+        finally:
+            SharedSystemClient.clear_system_cache()
+            shutil.rmtree(workdir, ignore_errors=True)
+    return results
+
+
+def int_list(value: str) -> List[int]:
+    return [int(v) for v in value.split(",") if v]
+
+
+def main() -> int:
+    import argparse
+
+    from db import COLLECTION_NAME, DB_PATH, hnsw_config
+
+    parser = argparse.ArgumentParser(
+        description="Inspect, tune and migrate the collection's HNSW index"
+    )
+    parser.add_argument("--collection", default=COLLECTION_NAME)
+    parser.add_argument("--batch-size", type=int, default=5000)
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("show", help="Print the collection's HNSW settings")
+    sweep_parser = commands.add_parser(
+        "sweep", help="Measure recall and latency over search ef and M"
+    )
+    sweep_parser.add_argument(
+        "--search-ef", type=int_list, default=[10, 20, 50, 100, 200, 400]
+    )
+    sweep_parser.add_argument("--m", type=int_list, help="Also try these M")
+    sweep_parser.add_argument("-q", "--queries", type=int, default=100)
+    sweep_parser.add_argument("-k", "--words-per-language", type=int, default=20)
+    migrate_parser = commands.add_parser(
+        "migrate", help="Copy the collection into one with new HNSW settings"
+    )
+    migrate_parser.add_argument("name", help="Name of the new collection")
+    migrate_parser.add_argument("--m", type=int, default=hnsw_config["max_neighbors"])
+    migrate_parser.add_argument(
+        "--construction-ef", type=int, default=hnsw_config["ef_construction"]
+    )
+    migrate_parser.add_argument("--search-ef", type=int)
+    migrate_parser.add_argument(
+        "--replace",
+        action="store_true",
+        help="Give the new collection the current one's name when done",
+    )
+    args = parser.parse_args()
+
+    client = chromadb.PersistentClient(path=DB_PATH.as_posix())
+    source = client.get_collection(args.collection)
+    if args.command == "show":
+        print(f"{source.name}: {source.count()} records")
+        for key, value in hnsw_settings(source).items():
+            print(f"{key}: {value}")
+        return 0
+
+    if args.command == "sweep":
+        if not source.count():
+            print(f"Error: {source.name} has no records")
+            return 1
+        results = sweep(
+            DB_PATH,
+            args.collection,
+            args.search_ef,
+            args.m,
+            args.queries,
+            args.words_per_language,
+            args.batch_size,
+        )
+        recall = f"recall@{args.words_per_language}"
+        print(f"{'M':>4} {'search_ef':>9} {recall:>10} {'mean_ms':>8} {'p99_ms':>8}")
+        for row in results:
+            print(
+                f"{row['M']:>4} {row['search_ef']:>9} {row[recall]:>10.4f} "
+                f"{row['mean_ms']:>8.2f} {row['p99_ms']:>8.2f}"
+            )
+        return 0
+
+    config: Dict[str, Any] = {
+        "space": "cosine",
+        "max_neighbors": args.m,
+        "ef_construction": args.construction_ef,
+    }
+    if args.search_ef:
+        config["ef_search"] = args.search_ef
+    start = time.monotonic()
+    target = migrate(
+        client, source, args.name, config, args.batch_size, replace=args.replace
+    )
+    print(
+        f"Copied {target.count()} records into {target.name} "
+        f"in {time.monotonic() - start:.1f}s"
+    )
+    if not args.replace:
+        print(f"Serve it with COLLECTION_NAME={target.name}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,108 @@
+"""Search latency histograms, rendered in the Prometheus text format.
+
+Code under `stage(name)` is timed into a histogram labelled by stage. While
+a request runs inside `breakdown()`, the same timings are also summed per
+stage for that request, for slow-request logging. The breakdown travels in
+a context variable, so it follows the request into worker threads that run
+with a copy of its context (WorkerPool does this for its thread pool).
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, List, Optional
+
+# Seconds; searches range from sub-millisecond cache hits to multi-second
+# embedding API calls
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+class Histogram:
+    "Cumulative-bucket histogram with a single label"
+
+    def __init__(self, name: str, help: str, label: str, buckets=BUCKETS):
+        self.name = name
+        self.help = help
+        self.label = label
+        self.buckets = buckets
+        # label value -> (bucket counts, sum, count)
+        self._series: Dict[str, List[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, label_value: str, seconds: float) -> None:
+        with self._lock:
+            series = self._series.setdefault(
+                label_value, [0.0] * (len(self.buckets) + 2)
+            )
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    series[i] += 1
+            series[-2] += seconds
+            series[-1] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for value, series in sorted(self._series.items()):
+                label = f'{self.label}="{value}"'
+                for bound, count in zip(self.buckets, series):
+                    lines.append(
+                        f'{self.name}_bucket{{{label},le="{bound}"}} {count:g}'
+                    )
+                lines.append(f'{self.name}_bucket{{{label},le="+Inf"}} {series[-1]:g}')
+                lines.append(f"{self.name}_sum{{{label}}} {series[-2]:.6f}")
+                lines.append(f"{self.name}_count{{{label}}} {series[-1]:g}")
+        return lines
+
+
+stage_seconds = Histogram(
+    "latentdictionary_search_stage_seconds",
+    "Time spent in each stage of a search",
+    "stage",
+)
+request_seconds = Histogram(
+    "latentdictionary_search_seconds",
+    "Time to answer a search, by whether it had to be computed",
+    "computed",
+)
+
+_breakdown: ContextVar[Optional[Dict[str, float]]] = ContextVar(
+    "breakdown", default=None
+)
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, time.perf_counter() - start)
+
+
+def record(name: str, seconds: float) -> None:
+    stage_seconds.observe(name, seconds)
+    stages = _breakdown.get()
+    if stages is not None:
+        stages[name] = stages.get(name, 0.0) + seconds
+
+
+@contextmanager
+def breakdown() -> Iterator[Dict[str, float]]:
+    "Collect {stage: seconds} for everything timed until the block exits"
+    stages: Dict[str, float] = {}
+    token = _breakdown.set(stages)
+    try:
+        yield stages
+    finally:
+        _breakdown.reset(token)
+
+
+def render_stats(prefix: str, stats: Dict[str, int]) -> List[str]:
+    "A component's stats() as gauges named latentdictionary_<prefix>_<key>"
+    lines = []
+    for key, value in stats.items():
+        name = f"latentdictionary_{prefix}_{key}"
+        lines.extend([f"# TYPE {name} gauge", f"{name} {value}"])
+    return lines
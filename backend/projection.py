@@ -0,0 +1,239 @@
+import os
+import sys
+from pathlib import Path
+from typing import Dict, Iterable, List, NamedTuple, Optional, cast
+
+import numpy as np
+from numpy.typing import ArrayLike
+
+N_COMPONENTS = 3
+# Up to about this many points the exact (n x n) Gram eigendecomposition is
+# cheaper than a randomized SVD (measured with 1536-dim embeddings)
+GRAM_LIMIT = 200
+
+
+PROJECTION_PATH = Path(
+    os.getenv("PROJECTION_PATH", "~/.latentdictionary-projection.npz")
+).expanduser()
+# Basis fitted over every record, used for language sets without their own
+ALL_LANGUAGES = "*"
+
+
+class ProjectionBasis(NamedTuple):
+    "A fixed 3D projection: coordinates are (x - mean) @ components.T"
+
+    mean: np.ndarray  # (dim,) float32
+    components: np.ndarray  # (3, dim) float32
+
+    def project(self, data: ArrayLike) -> np.ndarray:
+        X = np.asarray(data, dtype=np.float32)
+        return (X - self.mean) @ self.components.T
+
+
+def basis_key(languages: Iterable[str]) -> str:
+    return "+".join(sorted(set(languages)))
+
+
+def fit_basis(batches: Iterable[np.ndarray]) -> ProjectionBasis:
+    """Top-3 principal axes of all rows across `batches`.
+
+    Streams: only the running sum and the (dim x dim) scatter matrix are
+    kept, accumulated in float64, then the covariance is eigendecomposed.
+    """
+    total: Optional[np.ndarray] = None
+    scatter: Optional[np.ndarray] = None
+    n = 0
+    for batch in batches:
+        X = np.asarray(batch, dtype=np.float64)
+        if total is None or scatter is None:
+            total = np.zeros(X.shape[1])
+            scatter = np.zeros((X.shape[1], X.shape[1]))
+        total += X.sum(axis=0)
+        scatter += X.T @ X
+        n += len(X)
+    if total is None or scatter is None or n == 0:
+        raise ValueError("Cannot fit a projection basis without any embeddings")
+    mean = total / n
+    covariance = scatter / n - np.outer(mean, mean)
+    eigenvalues, eigenvectors = np.linalg.eigh(covariance)
+    k = min(N_COMPONENTS, len(mean))
+    components = eigenvectors[:, np.argsort(eigenvalues)[::-1][:k]].T
+    # Fix the sign of each axis so refits give the same orientation
+    rows = np.argmax(np.abs(components), axis=1)
+    components *= np.sign(components[np.arange(k), rows])[:, None]
+    if k < N_COMPONENTS:
+        components = np.vstack([components, np.zeros((N_COMPONENTS - k, len(mean)))])
+    return ProjectionBasis(mean.astype(np.float32), components.astype(np.float32))
+
+
+def save_bases(bases: Dict[str, ProjectionBasis], path: Path = PROJECTION_PATH):
+    arrays = {}
+    for key, basis in bases.items():
+        arrays[f"{key}/mean"] = basis.mean
+        arrays[f"{key}/components"] = basis.components
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # Write then rename so a running server never reads a half-written file
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "wb") as f:
+        np.savez(f, **arrays)
+    tmp.replace(path)
+
+
+def load_bases(path: Path = PROJECTION_PATH) -> Dict[str, ProjectionBasis]:
+    "Fitted bases by basis_key, or {} if none have been fitted yet"
+    if not path.exists():
+        return {}
+    with np.load(path) as arrays:
+        keys = {name.rsplit("/", 1)[0] for name in arrays.files}
+        return {
+            key: ProjectionBasis(arrays[f"{key}/mean"], arrays[f"{key}/components"])
+            for key in keys
+        }
+
+
+def pca(data: ArrayLike, method: str = "auto") -> np.ndarray:
+    """Basic 3-dimensional Principal Component Analysis.
+
+    Only the top three components are computed, in float32. `method` is
+    "gram" (eigendecomposition of X Xᵀ, exact), "randomized" (randomized
+    SVD) or "auto", which picks by the number of points. Returns an (n, 3)
+    array; component signs are fixed so the largest coordinate of each axis
+    is positive, and missing components (fewer than 3 points or dims) are 0.
+    """
+    X = np.asarray(data, dtype=np.float32)
+
+    # Reshape if we have a 3D array
+    if X.ndim == 3:
+        # Flatten to 2D: (batch*n_embeddings, embedding_dim)
+        X = X.reshape(-1, X.shape[-1])
+
+    if len(X) == 0:
+        return np.zeros((0, N_COMPONENTS), dtype=np.float32)
+    X = X - X.mean(axis=0)
+    if method == "auto":
+        method = "gram" if len(X) <= GRAM_LIMIT else "randomized"
+    if method == "gram":
+        coordinates = _gram_components(X, N_COMPONENTS)
+    elif method == "randomized":
+        coordinates = _randomized_components(X, N_COMPONENTS)
+    else:
+        raise ValueError(f"Unknown PCA method {method!r}")
+
+    # Make the result deterministic: SVD/eigh only define axes up to sign
+    rows = np.argmax(np.abs(coordinates), axis=0)
+    signs = np.sign(coordinates[rows, np.arange(coordinates.shape[1])])
+    coordinates *= np.where(signs == 0, 1, signs).astype(np.float32)
+
+    if coordinates.shape[1] < N_COMPONENTS:
+        padding = np.zeros(
+            (len(coordinates), N_COMPONENTS - coordinates.shape[1]), np.float32
+        )
+        coordinates = np.hstack([coordinates, padding])
+    return coordinates
+
+
+def fit_local_basis(data: ArrayLike) -> ProjectionBasis:
+    """The basis pca() lays `data` out in, to place further points with.
+
+    basis.project(data) equals pca(data), and projecting more points into
+    it leaves the first ones where they were.
+    """
+    X = np.asarray(data, dtype=np.float32)
+    mean = X.mean(axis=0) if len(X) else np.zeros(X.shape[-1], np.float32)
+    coordinates = pca(X)
+    # coordinates = (X - mean) @ components.T with orthonormal components,
+    # so components = coordinatesᵀ (X - mean) / σ² per axis
+    variances = (coordinates**2).sum(axis=0)
+    components = coordinates.T @ (X - mean)
+    nonzero = variances > 0
+    components[nonzero] /= variances[nonzero, None]
+    components[~nonzero] = 0
+    return ProjectionBasis(mean.astype(np.float32), components.astype(np.float32))
+
+
+def _gram_components(X: np.ndarray, k: int) -> np.ndarray:
+    "Scores U·S of the top-k components from the eigenvectors of X Xᵀ"
+    k = min(k, X.shape[0], X.shape[1])
+    eigenvalues, eigenvectors = np.linalg.eigh(X @ X.T)
+    top = np.argsort(eigenvalues)[::-1][:k]
+    singular_values = np.sqrt(np.clip(eigenvalues[top], 0, None))
+    return (eigenvectors[:, top] * singular_values).astype(np.float32)
+
+
+def _randomized_components(
+    X: np.ndarray, k: int, oversample: int = 10, n_iter: int = 4
+) -> np.ndarray:
+    "Scores U·S of the top-k components by randomized range finding"
+    k = min(k, X.shape[0], X.shape[1])
+    rng = np.random.default_rng(0)
+    sketch = min(k + oversample, X.shape[0], X.shape[1])
+    Q = X @ rng.standard_normal((X.shape[1], sketch), dtype=np.float32)
+    for _ in range(n_iter):
+        Q, _ = np.linalg.qr(Q)
+        Q = X @ (X.T @ Q)
+    Q, _ = np.linalg.qr(Q)
+    U, S, _ = np.linalg.svd(Q.T @ X, full_matrices=False)
+    return ((Q @ U[:, :k]) * S[:k]).astype(np.float32)
+
+
+def main() -> int:
+    """Fit global projection bases from the collection and save them."""
+    import argparse
+
+    from chromadb.api.types import Include, Where
+
+    from db import get_collection
+    from vector_index import iter_records
+
+    parser = argparse.ArgumentParser(
+        description="Fit fixed 3D projection bases for the 'global' search mode"
+    )
+    parser.add_argument(
+        "-l",
+        "--languages",
+        action="append",
+        default=[],
+        help=(
+            "Comma-separated language set to fit its own basis for, e.g. "
+            "english,spanish (repeatable; a basis over all records is always fit)"
+        ),
+    )
+    parser.add_argument(
+        "-o",
+        "--output",
+        type=Path,
+        default=PROJECTION_PATH,
+        help=f"Where to write the bases (default: {PROJECTION_PATH})",
+    )
+    args = parser.parse_args()
+
+    include: Include = ["embeddings"]  # type: ignore
+    language_sets: List[Optional[List[str]]] = [None]
+    language_sets += [value.split(",") for value in args.languages]
+
+    bases = {}
+    for languages in language_sets:
+        key = ALL_LANGUAGES if languages is None else basis_key(languages)
+        where = (
+            None if languages is None else cast(Where, {"language": {"$in": languages}})
+        )
+        batches = (
+            np.asarray(records.get("embeddings"), dtype=np.float32)
+            for records in iter_records(get_collection(), include, where=where)
+        )
+        try:
+            bases[key] = fit_basis(batches)
+        except ValueError as e:
+            print(f"Skipping {key}: {e}")
+            continue
+        print(f"Fitted projection basis for {key}")
+
+    if not bases:
+        return 1
+    save_bases(bases, args.output)
+    print(f"Saved {len(bases)} bases to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,168 @@
+"""Compact storage for the serving index's embeddings, and what it costs.
+
+"float16" halves the memory of each vector; "int8" quarters it, storing
+each vector as round(x / scale) with one float32 scale per vector
+(max |x| / 127). Separately, an index can search in two stages, first over
+vectors truncated to their leading dimensions (see NumpyIndex.truncate).
+Report how far either drifts from full precision:
+
+    python3 quantize.py --dtype int8 --bundle ~/.latentdictionary-bundle
+    python3 quantize.py --dims 256 --oversample 4
+"""
+
+import sys
+import time
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+
+import numpy as np
+from numpy.typing import ArrayLike
+
+if TYPE_CHECKING:
+    from vector_index import NumpyIndex
+
+INDEX_DTYPES = ("float32", "float16", "int8")
+
+
+def quantize(
+    embeddings: ArrayLike, dtype: str
+) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+    "Rows of `embeddings` as `dtype`, plus per-row scales for int8"
+    X = np.asarray(embeddings, dtype=np.float32)
+    if dtype == "float32":
+        return X, None
+    if dtype == "float16":
+        return X.astype(np.float16), None
+    if dtype == "int8":
+        scales = np.abs(X).max(axis=1) / 127 if X.size else np.ones(len(X))
+        scales = np.where(scales == 0, 1, scales).astype(np.float32)
+        return np.rint(X / scales[:, None]).astype(np.int8), scales
+    raise ValueError(f"Unknown index dtype {dtype!r}, expected one of {INDEX_DTYPES}")
+
+
+def dequantize(stored: np.ndarray, scales: Optional[np.ndarray]) -> np.ndarray:
+    "Inverse of quantize, as float32 (lossy for float16 and int8)"
+    X = np.asarray(stored, dtype=np.float32)
+    if scales is not None:
+        X = X * np.asarray(scales)[..., None]
+    return X
+
+
+def inverse_norms(stored: np.ndarray, scales: Optional[np.ndarray]) -> np.ndarray:
+    "1 / ||row|| of the dequantized rows, with 1 for zero rows"
+    norms = np.linalg.norm(dequantize(stored, scales), axis=1)
+    norms[norms == 0] = 1
+    return (1 / norms).astype(np.float32)
+
+
+def accuracy_report(
+    full: "NumpyIndex",
+    quantized: "NumpyIndex",
+    n_queries: int = 200,
+    n_results: int = 20,
+    seed: int = 0,
+) -> Dict[str, float]:
+    """Compare search results and 3D layouts of `quantized` against `full`.
+
+    `quantized` may also (or instead) be truncated for two-stage search.
+
+    Queries are stored embeddings sampled from every language. recall is
+    the share of the full-precision top-k that the quantized index also
+    returns; coordinate_error is the mean distance between the PCA layouts
+    of the full-precision neighbours computed from either index's vectors,
+    relative to the layout's RMS radius.
+    """
+    from projection import pca
+
+    rng = np.random.default_rng(seed)
+    recalls: List[float] = []
+    errors: List[float] = []
+    full_seconds = 0.0
+    quantized_seconds = 0.0
+    for language, matrix in full.languages.items():
+        rows = rng.choice(
+            len(matrix.words), min(n_queries, len(matrix.words)), replace=False
+        )
+        for row in rows:
+            query = full.vector(language, int(row))
+            start = time.perf_counter()
+            expected = full.query(query, language, n_results)
+            full_seconds += time.perf_counter() - start
+            start = time.perf_counter()
+            actual = quantized.query(query, language, n_results)
+            quantized_seconds += time.perf_counter() - start
+            recalls.append(
+                len(set(expected.words) & set(actual.words)) / len(expected.words)
+            )
+            if len(expected.words) < 2:
+                continue
+            # Same points, only the vectors differ
+            coordinates = pca(expected.embeddings)
+            vectors = []
+            for word in expected.words:
+                vector = quantized.embedding(word, [language])
+                assert vector is not None, f"{word} is missing from the copy"
+                vectors.append(vector)
+            approximate = pca(vectors)
+            radius = np.sqrt((coordinates**2).sum(axis=1).mean()) or 1.0
+            distance = np.linalg.norm(coordinates - approximate, axis=1).mean()
+            errors.append(float(distance / radius))
+    return {
+        "queries": len(recalls),
+        f"recall@{n_results}": float(np.mean(recalls)) if recalls else 1.0,
+        "coordinate_error": float(np.mean(errors)) if errors else 0.0,
+        "full_mb": full.nbytes / 1e6,
+        "quantized_mb": quantized.nbytes / 1e6,
+        "full_scan_mb": full.scan_nbytes / 1e6,
+        "quantized_scan_mb": quantized.scan_nbytes / 1e6,
+        "full_ms_per_query": 1000 * full_seconds / max(1, len(recalls)),
+        "quantized_ms_per_query": 1000 * quantized_seconds / max(1, len(recalls)),
+    }
+
+
+def main() -> int:
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description="Measure search and layout accuracy of a quantized index"
+    )
+    parser.add_argument(
+        "--dtype", choices=INDEX_DTYPES, help="Default: int8, unless --dims"
+    )
+    parser.add_argument(
+        "--dims", type=int, help="Search first on this many leading dimensions"
+    )
+    parser.add_argument("--oversample", type=int, default=4)
+    parser.add_argument(
+        "--bundle",
+        type=Path,
+        help="Full-precision bundle to read (default: the collection)",
+    )
+    parser.add_argument("-q", "--queries", type=int, default=200)
+    parser.add_argument("-k", "--words-per-language", type=int, default=20)
+    args = parser.parse_args()
+
+    from vector_index import NumpyIndex
+
+    if args.bundle:
+        from bundle import load_bundle
+
+        full = load_bundle(args.bundle.expanduser()).numpy_index()
+    else:
+        from db import get_collection
+
+        full = NumpyIndex.from_collection(get_collection())
+    compact = full
+    dtype = args.dtype or (None if args.dims else "int8")
+    if dtype and dtype != full.dtype:
+        compact = compact.quantize(dtype)
+    if args.dims:
+        compact = compact.truncate(args.dims, args.oversample)
+    report = accuracy_report(full, compact, args.queries, args.words_per_language)
+    for name, value in report.items():
+        print(f"{name}: {value:.4g}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,299 @@
+import contextvars
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, List, Optional, cast
+
+import numpy as np
+
+from bundle import load_bundle
+from db import (
+    embedding_model,
+    get_collection,
+    get_embedding_function,
+    record_id,
+)
+from embedding_cache import EmbeddingCache
+from metrics import stage
+from quantize import INDEX_DTYPES
+from vector_index import Neighbors, NumpyIndex
+
+if TYPE_CHECKING:
+    from chromadb.api.types import Include
+
+# Define valid include parameters
+EMBEDDINGS_AND_DOCUMENTS: "Include" = ["embeddings", "documents"]  # type: ignore
+EMBEDDINGS: "Include" = ["embeddings"]  # type: ignore
+
+EMBEDDING_CACHE_PATH = Path(
+    os.getenv("EMBEDDING_CACHE_PATH", "~/.latentdictionary-embeddings")
+).expanduser()
+query_embeddings = EmbeddingCache(
+    EMBEDDING_CACHE_PATH,
+    embedding_model,
+    max_entries=int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "200000")),
+)
+
+# Languages are queried side by side, so this only needs to cover one request
+query_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="query")
+
+
+# "chroma" searches the HNSW index per request; "numpy" loads the whole
+# collection into memory once and searches it exactly
+SEARCH_INDEX = os.getenv("SEARCH_INDEX", "chroma")
+if SEARCH_INDEX not in ("chroma", "numpy"):
+    raise ValueError(f"Unknown SEARCH_INDEX {SEARCH_INDEX!r}")
+# With SEARCH_INDEX=numpy, memory-map an exported bundle (see bundle.py)
+# instead of reading the collection: startup is near instant and worker
+# processes share the mapped pages
+EMBEDDING_BUNDLE = os.getenv("EMBEDDING_BUNDLE")
+# float16 or int8 keep the numpy index in 1/2 or 1/4 of the memory, at a
+# small cost in accuracy and search time (measure both with quantize.py).
+# Default: as stored, which is float32 unless the bundle was exported quantized.
+SEARCH_INDEX_DTYPE = os.getenv("SEARCH_INDEX_DTYPE")
+if SEARCH_INDEX_DTYPE and SEARCH_INDEX_DTYPE not in INDEX_DTYPES:
+    raise ValueError(f"Unknown SEARCH_INDEX_DTYPE {SEARCH_INDEX_DTYPE!r}")
+# With text-embedding-3 models, e.g. 256 or 512: rank every word on that many
+# leading dimensions first, then re-rank the best words_per_l *
+# SEARCH_INDEX_OVERSAMPLE with the full vectors. Each query reads 3-6x less
+# memory; check the recall it costs with quantize.py --dims. The cut vectors
+# (count * dims * 4 bytes, ~120 MB for 60k words at 512) are mapped from the
+# bundle and shared by workers; without a bundle every worker holds a copy.
+SEARCH_INDEX_DIMS = int(os.getenv("SEARCH_INDEX_DIMS", "0"))
+SEARCH_INDEX_OVERSAMPLE = int(os.getenv("SEARCH_INDEX_OVERSAMPLE", "4"))
+
+
+def load_numpy_index() -> NumpyIndex:
+    bundle = None
+    if not EMBEDDING_BUNDLE:
+        index = NumpyIndex.from_collection(get_collection())
+    else:
+        bundle = load_bundle(Path(EMBEDDING_BUNDLE).expanduser())
+        if bundle.model != embedding_model:
+            raise ValueError(
+                f"EMBEDDING_BUNDLE was embedded with {bundle.model}, "
+                f"but queries are embedded with {embedding_model}"
+            )
+        index = bundle.numpy_index()
+    if SEARCH_INDEX_DTYPE and SEARCH_INDEX_DTYPE != index.dtype:
+        # A private copy; export the bundle with --dtype to keep sharing it
+        index = index.quantize(SEARCH_INDEX_DTYPE)
+    if SEARCH_INDEX_DIMS and bundle is not None:
+        truncated = bundle.truncated(SEARCH_INDEX_DIMS)
+        index = NumpyIndex(index.languages, truncated, SEARCH_INDEX_OVERSAMPLE)
+    elif SEARCH_INDEX_DIMS:
+        index = index.truncate(SEARCH_INDEX_DIMS, SEARCH_INDEX_OVERSAMPLE)
+    return index
+
+
+# Loaded on first use, or up front by load_resources
+numpy_index: Optional[NumpyIndex] = None
+_numpy_index_lock = threading.Lock()
+
+
+def get_numpy_index() -> Optional[NumpyIndex]:
+    "The numpy index with SEARCH_INDEX=numpy, else None"
+    global numpy_index
+    if numpy_index is None and SEARCH_INDEX == "numpy":
+        with _numpy_index_lock:
+            if numpy_index is None:
+                numpy_index = load_numpy_index()
+    return numpy_index
+
+
+def load_resources() -> Dict[str, float]:
+    """Open everything a search needs, returning the seconds each took.
+
+    Searches open them on first use otherwise. With SEARCH_INDEX=chroma a
+    first query loads the collection's HNSW index into memory.
+    """
+    seconds = {}
+    start = time.perf_counter()
+    get_embedding_function()
+    seconds["embedding_function"] = time.perf_counter() - start
+    start = time.perf_counter()
+    if get_numpy_index() is None:
+        collection = get_collection()
+        include: Include = EMBEDDINGS
+        sample = collection.get(limit=1, include=include).get("embeddings")
+        if sample is not None and len(sample):
+            collection.query(
+                query_embeddings=[np.asarray(sample[0], np.float32)], n_results=1
+            )
+    seconds["index"] = time.perf_counter() - start
+    return seconds
+
+
+def stored_embedding(word: str, languages: List[str]) -> Optional[np.ndarray]:
+    """The embedding already in the collection for `word`, if it is a record.
+
+    Record ids are derived from (language, word), so this is a lookup by id
+    in the searched languages rather than a scan of the documents.
+    """
+    index = get_numpy_index()
+    if index is not None:
+        return index.embedding(word, languages)
+    include: Include = EMBEDDINGS
+    records = get_collection().get(
+        ids=[record_id(language, word) for language in languages], include=include
+    )
+    embeddings = records.get("embeddings")
+    if embeddings is None or len(embeddings) == 0:
+        return None
+    return np.asarray(embeddings[0], dtype=np.float32)
+
+
+def embed_queries(words: List[str], languages: List[str]) -> List[np.ndarray]:
+    """Resolve the query vector for each of `words`, cheapest source first.
+
+    Words in the dictionary reuse their stored embedding, previously seen
+    queries come from the on-disk cache, and only the rest pay for a call
+    to the embedding function, one call for all of them.
+    """
+    with stage("embed"):
+        embeddings: List[Optional[np.ndarray]] = []
+        for word in words:
+            embedding = stored_embedding(word, languages)
+            if embedding is None:
+                embedding = query_embeddings.get(word)
+            embeddings.append(embedding)
+        missing = list(dict.fromkeys(w for w, e in zip(words, embeddings) if e is None))
+        if missing:
+            with stage("embedding_function"):
+                vectors = get_embedding_function()(missing)
+            embedded = {}
+            for word, vector in zip(missing, vectors):
+                embedded[word] = np.asarray(vector, dtype=np.float32)
+                query_embeddings.set(word, embedded[word])
+            embeddings = [
+                embedded[word] if e is None else e for word, e in zip(words, embeddings)
+            ]
+    return cast(List[np.ndarray], embeddings)
+
+
+def embed_query(word: str, languages: List[str]) -> np.ndarray:
+    return embed_queries([word], languages)[0]
+
+
+def query_chroma(
+    query_embeddings: List[np.ndarray], language: str, n_results: int
+) -> List[Neighbors]:
+    "Top-k neighbours in one language for each query, in a single Chroma call"
+    include: Include = EMBEDDINGS_AND_DOCUMENTS
+    records = get_collection().query(
+        query_embeddings=query_embeddings,
+        where={"language": language},
+        n_results=n_results,
+        include=include,
+    )
+    docs = records.get("documents") or []
+    embeddings = records.get("embeddings")
+    results = []
+    for i in range(len(query_embeddings)):
+        if i >= len(docs) or not docs[i] or embeddings is None:
+            results.append(Neighbors(language, [], np.empty((0, 0), np.float32)))
+        else:
+            results.append(
+                Neighbors(
+                    language, list(docs[i]), np.asarray(embeddings[i], np.float32)
+                )
+            )
+    return results
+
+
+def query_language(
+    query_embedding: np.ndarray, language: str, n_results: int
+) -> Neighbors:
+    return query_chroma([query_embedding], language, n_results)[0]
+
+
+def search_language(
+    query_embedding: np.ndarray, language: str, n_results: int
+) -> Neighbors:
+    "Top-k neighbours of an embedded query in one language"
+    with stage("search"):
+        index = get_numpy_index()
+        if index is not None:
+            return index.query(query_embedding, language, n_results)
+        return query_language(query_embedding, language, n_results)
+
+
+def retrieve(word: str, languages: List[str], n_results: int) -> List[Neighbors]:
+    """Top-k neighbours of `word` in each language.
+
+    The word is embedded a single time and the per-language searches run
+    concurrently, so latency stays flat as more languages are selected.
+    """
+    if not languages:
+        return []
+    query_embedding = embed_query(word, languages)
+    if get_numpy_index() is not None:
+        return [
+            search_language(query_embedding, language, n_results)
+            for language in languages
+        ]
+    # One context per thread (a context can't be entered twice at once)
+    contexts = [contextvars.copy_context() for _ in languages]
+    return list(
+        query_pool.map(
+            lambda context, language: context.run(
+                search_language, query_embedding, language, n_results
+            ),
+            contexts,
+            languages,
+        )
+    )
+
+
+def search_union(
+    query_embeddings: List[np.ndarray], language: str, n_results: int
+) -> Neighbors:
+    "The union of each query's top-k in one language, each word once"
+    with stage("search"):
+        index = get_numpy_index()
+        if index is not None:
+            results = [
+                index.query(query_embedding, language, n_results)
+                for query_embedding in query_embeddings
+            ]
+        else:
+            results = query_chroma(query_embeddings, language, n_results)
+    words: List[str] = []
+    vectors: List[np.ndarray] = []
+    seen = set()
+    for result in results:
+        for word, vector in zip(result.words, result.embeddings):
+            if word not in seen:
+                seen.add(word)
+                words.append(word)
+                vectors.append(vector)
+    if not words:
+        return Neighbors(language, [], np.empty((0, 0), dtype=np.float32))
+    return Neighbors(language, words, np.vstack(vectors))
+
+
+def retrieve_many(
+    words: List[str], languages: List[str], n_results: int
+) -> List[Neighbors]:
+    """Union of the top-k neighbours of each of `words`, per language.
+
+    Neighbours shared by several words are returned once, and each language
+    is one search for all the words.
+    """
+    if not words or not languages:
+        return []
+    embeddings = embed_queries(words, languages)
+    if get_numpy_index() is not None:
+        return [search_union(embeddings, language, n_results) for language in languages]
+    contexts = [contextvars.copy_context() for _ in languages]
+    return list(
+        query_pool.map(
+            lambda context, language: context.run(
+                search_union, embeddings, language, n_results
+            ),
+            contexts,
+            languages,
+        )
+    )
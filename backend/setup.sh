@@ -19,3 +19,9 @@ pip install -r requirements.txt
 
 # Run db.py from the script's directory
 python3 db.py
+
+# Export the embeddings that the server's worker processes memory-map
+python3 bundle.py export ~/.latentdictionary-bundle
+
+# Fit the fixed projection used by the "global" search mode
+python3 projection.py
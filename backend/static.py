@@ -0,0 +1,182 @@
+"""Serve the built frontend from a table scanned once at startup.
+
+Every file under the dist directory is looked up in memory instead of on
+disk per request. Files are held in memory along with gzip and brotli
+variants, taken from `<file>.gz`/`<file>.br` siblings when they exist (write
+them at maximum compression with `python3 static.py`) and otherwise
+compressed quickly at startup. Responses carry ETags, so revalidations are
+304s. Vite's content-hashed assets are cached as immutable. Any path that
+is not a file gets index.html, for client-side routing.
+"""
+
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+import sys
+from pathlib import Path
+from typing import Dict, List, Mapping, NamedTuple, Optional
+
+from starlette.responses import FileResponse, Response
+
+try:
+    import brotli
+except ImportError:  # optional: without it only gzip is offered
+    brotli = None
+
+STATIC_ROOT = Path(
+    os.getenv("STATIC_ROOT", Path(__file__).parent.parent / "frontend" / "dist")
+)
+# Larger files are streamed from disk, uncompressed
+MAX_MEMORY_FILE = 4 * 1024 * 1024
+COMPRESSIBLE = re.compile(
+    r"^(text/|application/(javascript|json|xml|manifest))|svg|icon|ttf|otf"
+)
+# Vite writes built files as assets/<name>-<8 character hash>.<ext>
+HASHED_NAME = re.compile(r"^assets/.*-[A-Za-z0-9_-]{8}\.\w+$")
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "no-cache"
+
+
+class StaticFile(NamedTuple):
+    path: Path
+    media_type: str
+    etag: str
+    cache_control: str
+    # encoding ("identity", "gzip", "br") -> body; empty if served from disk
+    bodies: Dict[str, bytes]
+
+
+def media_type(path: Path) -> str:
+    guessed, _ = mimetypes.guess_type(path.name)
+    if guessed is None and path.suffix in (".woff", ".woff2", ".ttf", ".otf"):
+        guessed = f"font/{path.suffix[1:]}"
+    return guessed or "application/octet-stream"
+
+
+def compressed_variants(path: Path, body: bytes, kind: str) -> Dict[str, bytes]:
+    "gzip/brotli bodies worth sending (at least 5% smaller), prebuilt first"
+    variants = {}
+    for encoding, suffix in (("gzip", ".gz"), ("br", ".br")):
+        sibling = path.with_name(path.name + suffix)
+        if sibling.exists():
+            data: Optional[bytes] = sibling.read_bytes()
+        elif not COMPRESSIBLE.search(kind):
+            data = None
+        elif encoding == "gzip":
+            data = gzip.compress(body, compresslevel=6, mtime=0)
+        elif brotli is not None:
+            data = brotli.compress(body, quality=5)
+        else:
+            data = None
+        if data is not None and len(data) < len(body) * 0.95:
+            variants[encoding] = data
+    return variants
+
+
+def load_file(path: Path, relative: str) -> StaticFile:
+    kind = media_type(path)
+    cache_control = IMMUTABLE if HASHED_NAME.search(relative) else REVALIDATE
+    stat = path.stat()
+    if stat.st_size > MAX_MEMORY_FILE:
+        etag = f"{stat.st_mtime_ns:x}-{stat.st_size:x}"
+        return StaticFile(path, kind, etag, cache_control, {})
+    body = path.read_bytes()
+    bodies = {"identity": body, **compressed_variants(path, body, kind)}
+    etag = hashlib.sha256(body).hexdigest()[:16]
+    return StaticFile(path, kind, etag, cache_control, bodies)
+
+
+def accepted_encodings(header: str) -> List[str]:
+    "Encodings from an Accept-Encoding header, excluding any with q=0"
+    encodings = []
+    for part in header.split(","):
+        name, _, params = part.strip().partition(";")
+        if params.replace(" ", "") in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+            continue
+        if name:
+            encodings.append(name.strip().lower())
+    return encodings
+
+
+class StaticSite:
+    def __init__(self, root: Path = STATIC_ROOT):
+        self.root = root
+        self.files: Dict[str, StaticFile] = {}
+        if root.is_dir():
+            for path in sorted(root.rglob("*")):
+                if not path.is_file() or path.suffix in (".gz", ".br"):
+                    continue
+                relative = path.relative_to(root).as_posix()
+                self.files[relative] = load_file(path, relative)
+        self.index = self.files.get("index.html")
+
+    def __len__(self) -> int:
+        return len(self.files)
+
+    def response(self, path: str, headers: Mapping[str, str]) -> Response:
+        file = self.files.get(path.lstrip("/")) or self.index
+        if file is None:
+            return Response("Frontend not built", status_code=404)
+        encoding = "identity"
+        if len(file.bodies) > 1:
+            accepted = accepted_encodings(headers.get("accept-encoding", ""))
+            for candidate in ("br", "gzip"):
+                if candidate in file.bodies and candidate in accepted:
+                    encoding = candidate
+                    break
+        etag = (
+            f'"{file.etag}"' if encoding == "identity" else f'"{file.etag}-{encoding}"'
+        )
+        response_headers = {"ETag": etag, "Cache-Control": file.cache_control}
+        if len(file.bodies) > 1:
+            response_headers["Vary"] = "Accept-Encoding"
+        if etag in headers.get("if-none-match", ""):
+            return Response(status_code=304, headers=response_headers)
+        if not file.bodies:
+            return FileResponse(
+                file.path, media_type=file.media_type, headers=response_headers
+            )
+        if encoding != "identity":
+            response_headers["Content-Encoding"] = encoding
+        return Response(
+            file.bodies[encoding], media_type=file.media_type, headers=response_headers
+        )
+
+
+def precompress(root: Path) -> int:
+    "Write maximum-compression .gz/.br siblings for compressible files"
+    written = 0
+    for path in sorted(root.rglob("*")):
+        if not path.is_file() or path.suffix in (".gz", ".br"):
+            continue
+        if not COMPRESSIBLE.search(media_type(path)):
+            continue
+        body = path.read_bytes()
+        path.with_name(path.name + ".gz").write_bytes(
+            gzip.compress(body, compresslevel=9, mtime=0)
+        )
+        written += 1
+        if brotli is not None:
+            path.with_name(path.name + ".br").write_bytes(
+                brotli.compress(body, quality=11)
+            )
+            written += 1
+    return written
+
+
+def main() -> int:
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description="Precompress the built frontend for the server to send"
+    )
+    parser.add_argument("root", type=Path, nargs="?", default=STATIC_ROOT)
+    args = parser.parse_args()
+    print(f"Wrote {precompress(args.root)} compressed files in {args.root}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,6 +1,65 @@
 import sys
 from pathlib import Path
 
+import numpy as np
+import pytest
+
 # Add the backend directory to the Python path
 backend_dir = Path(__file__).parent.parent
 sys.path.insert(0, str(backend_dir))
+
+from vector_index import NumpyIndex  # noqa: E402
+
+
+def random_records(n, dim, seed=0, normalize=False):
+    "Words w0, w1, ... alternating english and spanish, with random embeddings"
+    embeddings = np.random.default_rng(seed).normal(size=(n, dim)).astype(np.float32)
+    if normalize:
+        embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True)
+    words = [f"w{i}" for i in range(n)]
+    languages = ["english" if i % 2 == 0 else "spanish" for i in range(n)]
+    return words, languages, embeddings
+
+
+@pytest.fixture
+def make_index():
+    "make_index(n, dim, seed) -> (NumpyIndex, embeddings) over random_records"
+
+    def make(n=50, dim=8, seed=0):
+        words, languages, embeddings = random_records(n, dim, seed)
+        return NumpyIndex.from_arrays(words, languages, embeddings), embeddings
+
+    return make
+
+
+@pytest.fixture
+def make_collection():
+    """make_collection(name, n, dim, ...) -> (collection, embeddings).
+
+    The records of random_records, with ids id0, id1, ...; `languages`
+    overrides each record's language.
+    """
+    import chromadb
+
+    def make(
+        name,
+        n=30,
+        dim=8,
+        seed=0,
+        normalize=False,
+        languages=None,
+        client=None,
+        configuration=None,
+    ):
+        words, alternating, embeddings = random_records(n, dim, seed, normalize)
+        client = client or chromadb.EphemeralClient()
+        collection = client.get_or_create_collection(name, configuration=configuration)
+        collection.add(
+            ids=[f"id{i}" for i in range(n)],
+            embeddings=embeddings,
+            documents=words,
+            metadatas=[{"language": language} for language in languages or alternating],
+        )
+        return collection, embeddings
+
+    return make
@@ -12,9 +12,8 @@ def test_pca_2d():
     assert len(result[0]) == 3
 
     # Check type
-    assert isinstance(result, list)
-    assert isinstance(result[0], list)
-    assert isinstance(result[0][0], float)
+    assert isinstance(result, np.ndarray)
+    assert result.dtype == np.float32
 
 
 def test_pca_3d():
@@ -30,9 +29,8 @@ def test_pca_3d():
     assert len(result[0]) == 3  # 3D output
 
     # Check type
-    assert isinstance(result, list)
-    assert isinstance(result[0], list)
-    assert isinstance(result[0][0], float)
+    assert isinstance(result, np.ndarray)
+    assert result.dtype == np.float32
 
 
 def test_pca_preserves_distances():
@@ -54,4 +52,50 @@ def test_pca_preserves_distances():
     # Check if the ratio of distances is approximately preserved
     ratio_orig = orig_dist_1_2 / orig_dist_2_3
     ratio_new = new_dist_1_2 / new_dist_2_3
-    assert abs(ratio_orig - ratio_new) < 1e-10
+    assert abs(ratio_orig - ratio_new) < 1e-6
+
+
+def exact_pca(data):
+    X = np.asarray(data, dtype=np.float64)
+    X = X - X.mean(axis=0)
+    _, _, Vt = np.linalg.svd(X, full_matrices=False)
+    return X @ Vt.T[:, :3]
+
+
+def assert_equal_up_to_sign(result, expected, atol):
+    for axis in range(3):
+        column = expected[:, axis]
+        sign = np.sign(np.dot(result[:, axis], column)) or 1.0
+        np.testing.assert_allclose(sign * result[:, axis], column, atol=atol)
+
+
+def test_pca_matches_exact_svd():
+    # Realistic shape (20 words per language, 6 languages, 1536 dims)
+    # with a few dominant directions plus noise
+    rng = np.random.default_rng(0)
+    latent = rng.normal(size=(120, 5)) * [10.0, 6.0, 3.0, 1.0, 0.5]
+    basis = np.linalg.qr(rng.normal(size=(1536, 5)))[0].T
+    data = latent @ basis + rng.normal(scale=0.01, size=(120, 1536))
+
+    expected = exact_pca(data)
+    for method in ["gram", "randomized"]:
+        result = pca(data, method=method)
+        assert result.shape == (120, 3)
+        assert_equal_up_to_sign(result, expected, atol=1e-2 * np.abs(expected).max())
+
+
+def test_pca_sign_is_deterministic():
+    rng = np.random.default_rng(1)
+    data = rng.normal(size=(30, 16))
+
+    result = pca(data)
+
+    for axis in range(3):
+        assert result[np.argmax(np.abs(result[:, axis])), axis] > 0
+
+
+def test_pca_pads_missing_components():
+    result = pca([[1.0, 2.0], [3.0, 5.0]])
+
+    assert result.shape == (2, 3)
+    np.testing.assert_array_equal(result[:, 1:], 0)
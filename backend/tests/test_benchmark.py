@@ -0,0 +1,60 @@
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+import numpy as np
+
+from benchmark import StubEmbeddingFunction, synthetic_page, synthetic_words
+
+BACKEND = Path(__file__).parent.parent
+
+
+def test_stub_embeddings_are_deterministic():
+    embed = StubEmbeddingFunction(dim=16)
+    first, second = embed(["cat", "dog"])
+
+    assert first.shape == (16,)
+    np.testing.assert_array_equal(first, embed(["cat"])[0])
+    assert not np.array_equal(first, second)
+
+
+def test_synthetic_words_cover_every_language():
+    words = synthetic_words(12)
+
+    assert len(set(words)) == 12
+    assert {language for _, language in words} == {
+        "english",
+        "spanish",
+        "french",
+        "german",
+        "italian",
+        "chinese",
+    }
+
+
+def test_benchmark_runs_offline_and_reports_json(tmp_path):
+    output = tmp_path / "bench.json"
+    pages = tmp_path / "pages"
+    pages.mkdir()
+    (pages / "saved.json").write_text(json.dumps({"html": synthetic_page(50)}))
+    subprocess.run(
+        [sys.executable, "benchmark.py", "--records", "300", "--dim", "16"]
+        + ["--requests", "5", "--pca-repeats", "1", "--concurrency", "2"]
+        + ["--pages", str(pages), "--extract-repeats", "1"]
+        + ["--db-path", str(tmp_path / "db"), "-o", str(output)],
+        cwd=BACKEND,
+        check=True,
+        capture_output=True,
+    )
+
+    results = json.loads(output.read_text())
+    assert results["ingest"]["records"] == 300
+    assert [row["points"] for row in results["pca"]] == [20, 60, 120, 200, 500, 1000]
+    assert results["extract"]["pages"] == 1
+    assert results["extract"]["link_text_regex"]["words"] == 100
+    assert results["extract"]["hans_link_text_regex"]["words"] == 50
+    assert results["extract"]["html_tokenizer"]["words"] == 100
+    assert results["retrieval"]["numpy"]["n"] == 5
+    assert results["search"]["six_languages"]["warm"]["n"] == 5
+    assert results["search"]["load_six_languages_cold"][0]["failed"] == 0
@@ -0,0 +1,80 @@
+import chromadb
+import numpy as np
+import pytest
+
+from bundle import export_bundle, import_bundle, load_bundle
+
+
+def test_export_groups_rows_by_language(make_collection, tmp_path):
+    # Uneven, so the languages' row ranges differ in size
+    languages = ["spanish" if i % 3 == 0 else "english" for i in range(30)]
+    collection, embeddings = make_collection("test-bundle-export", languages=languages)
+
+    bundle = export_bundle(collection, tmp_path / "bundle", "model", batch_size=7)
+
+    assert len(bundle) == 30
+    assert bundle.languages == {"english": (0, 20), "spanish": (20, 30)}
+    assert isinstance(bundle.embeddings, np.memmap)
+    for row, record_id in enumerate(bundle.ids):
+        i = int(record_id[2:])
+        assert bundle.words[row] == f"w{i}"
+        np.testing.assert_array_equal(bundle.embeddings[row], embeddings[i])
+    np.testing.assert_allclose(
+        bundle.inv_norms, 1 / np.linalg.norm(bundle.embeddings, axis=1), rtol=1e-6
+    )
+    assert not (tmp_path / "bundle.tmp").exists()
+
+
+def test_bundle_index_shares_the_memory_map(make_collection, tmp_path):
+    collection, embeddings = make_collection("test-bundle-index")
+    export_bundle(collection, tmp_path / "bundle", "model")
+
+    index = load_bundle(tmp_path / "bundle").numpy_index()
+
+    assert len(index) == 30
+    assert isinstance(index.languages["english"].embeddings, np.memmap)
+    assert index.query(embeddings[4], "english", 1).words == ["w4"]
+    assert index.query(embeddings[3], "spanish", 1).words == ["w3"]
+
+
+def test_truncated_copy_is_written_once_and_mapped(make_collection, tmp_path):
+    collection, _ = make_collection("test-bundle-truncated")
+    bundle = export_bundle(collection, tmp_path / "bundle", "model")
+    private = bundle.numpy_index().truncate(4).truncated
+    assert private is not None
+
+    truncated = bundle.truncated(4)
+    path = tmp_path / "bundle" / "truncated_4.npy"
+    written = path.stat().st_mtime_ns
+    again = load_bundle(tmp_path / "bundle").truncated(4)
+
+    assert path.stat().st_mtime_ns == written
+    for language, short in again.items():
+        assert isinstance(short, np.memmap)
+        np.testing.assert_allclose(short, private[language], rtol=1e-6)
+        np.testing.assert_array_equal(short, truncated[language])
+
+
+def test_import_round_trips_without_embedding(make_collection, tmp_path):
+    source, _ = make_collection("test-bundle-source")
+    bundle = export_bundle(source, tmp_path / "bundle", "model")
+    target = chromadb.EphemeralClient().get_or_create_collection("test-bundle-target")
+
+    import_bundle(bundle, target, batch_size=4)
+
+    records = target.get(ids=["id3"], include=["embeddings", "documents", "metadatas"])
+    expected = source.get(ids=["id3"], include=["embeddings"])["embeddings"]
+    assert target.count() == 30
+    assert records["documents"] == ["w3"]
+    assert records["metadatas"] == [{"language": "spanish"}]
+    assert records["embeddings"] is not None and expected is not None
+    np.testing.assert_array_equal(records["embeddings"][0], expected[0])
+
+
+def test_load_rejects_incomplete_bundle(make_collection, tmp_path):
+    collection, _ = make_collection("test-bundle-incomplete")
+    export_bundle(collection, tmp_path / "bundle", "model")
+    (tmp_path / "bundle" / "words.txt").write_text("w0\n")
+
+    with pytest.raises(ValueError, match="incomplete"):
+        load_bundle(tmp_path / "bundle")
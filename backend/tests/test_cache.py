@@ -0,0 +1,175 @@
+import asyncio
+import time
+
+import numpy as np
+from fastapi.testclient import TestClient
+
+import app
+from cache import LRUCache, SharedCache, SingleFlight
+from vector_index import Neighbors
+
+
+def test_lru_evicts_least_recently_used():
+    cache: LRUCache[str, int] = LRUCache(max_entries=2, max_bytes=1000, sizeof=len_one)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1  # "b" is now the oldest
+    cache.set("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert cache.evictions == 1
+
+
+def test_lru_respects_byte_budget():
+    cache: LRUCache[str, str] = LRUCache(max_entries=100, max_bytes=10, sizeof=len)
+    cache.set("a", "xxxx")
+    cache.set("b", "yyyy")
+    cache.set("c", "zzzz")
+
+    assert len(cache) == 2
+    assert cache.bytes == 8
+    assert cache.get("a") is None
+
+    # Values larger than the whole budget are not stored
+    cache.set("d", "x" * 11)
+    assert cache.get("d") is None
+    assert cache.bytes == 8
+
+
+def test_lru_ttl_expires_entries():
+    cache: LRUCache[str, int] = LRUCache(
+        max_entries=10, max_bytes=1000, ttl=0.01, sizeof=len_one
+    )
+    cache.set("a", 1)
+    time.sleep(0.02)
+
+    assert cache.get("a") is None
+    assert cache.stats()["expirations"] == 1
+    assert cache.stats()["entries"] == 0
+
+
+def test_lru_counts_hits_and_misses():
+    cache: LRUCache[str, int] = LRUCache(max_entries=10, max_bytes=1000, sizeof=len_one)
+    cache.get("a")
+    cache.set("a", 1)
+    cache.get("a")
+    cache.get("a")
+
+    assert cache.hits == 2
+    assert cache.misses == 1
+
+
+def test_shared_cache_is_visible_across_connections(tmp_path):
+    writer = SharedCache(tmp_path / "cache.sqlite", max_bytes=1000)
+    reader = SharedCache(tmp_path / "cache.sqlite", max_bytes=1000)
+    writer.set("a", b"xyz")
+
+    assert reader.get("a") == b"xyz"
+    assert reader.get("b") is None
+    assert reader.stats() == {"entries": 1, "bytes": 3, "hits": 1, "misses": 1}
+
+
+def test_shared_cache_trims_oldest_to_byte_budget(tmp_path):
+    cache = SharedCache(tmp_path / "cache.sqlite", max_bytes=10, trim_every=1)
+    for key in "abcd":
+        cache.set(key, b"xxxx")
+        time.sleep(0.001)
+
+    assert cache.get("a") is None
+    assert cache.get("b") is None
+    assert cache.get("d") == b"xxxx"
+    assert cache.stats()["bytes"] == 8
+
+
+def test_shared_cache_ttl_expires_entries(tmp_path):
+    cache = SharedCache(tmp_path / "cache.sqlite", max_bytes=1000, ttl=0.01)
+    cache.set("a", b"x")
+    time.sleep(0.02)
+
+    assert cache.get("a") is None
+
+
+def test_single_flight_coalesces_concurrent_calls():
+    flight: SingleFlight[str, int] = SingleFlight()
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return 42
+
+    async def main():
+        return await asyncio.gather(*[flight.run("key", compute) for _ in range(5)])
+
+    assert asyncio.run(main()) == [42] * 5
+    assert len(calls) == 1
+    assert flight.stats() == {"in_flight": 0, "started": 1, "coalesced": 4}
+
+
+def test_single_flight_survives_a_cancelled_caller():
+    flight: SingleFlight[str, int] = SingleFlight()
+
+    async def compute():
+        await asyncio.sleep(0.01)
+        return 42
+
+    async def main():
+        first = asyncio.ensure_future(flight.run("key", compute))
+        second = asyncio.ensure_future(flight.run("key", compute))
+        await asyncio.sleep(0)
+        first.cancel()
+        return await second
+
+    assert asyncio.run(main()) == 42
+
+
+def test_search_key_normalizes_languages_not_case():
+    def key(word, languages):
+        return app.search_key(*app.normalize_search(word, languages), 10, "local")
+
+    assert key(" sie ", ["spanish", "english", "spanish"]) == key(
+        "sie", ["english", "spanish"]
+    )
+    assert app.normalize_search(" sie ", ["spanish", "english", "spanish"]) == (
+        "sie",
+        ["spanish", "english"],
+    )
+    # German capitalization changes the word
+    assert key("Sie", ["german"]) != key("sie", ["german"])
+
+
+def test_variant_requests_do_not_poison_the_cache(monkeypatch):
+    searched = []
+
+    def retrieve(word, languages, n):
+        searched.append((word, list(languages)))
+        embeddings = np.eye(n, 8, dtype=np.float32)
+        return [
+            Neighbors(language, [f"{word}{i}" for i in range(n)], embeddings)
+            for language in languages
+        ]
+
+    monkeypatch.setattr(app, "retrieve", retrieve)
+    monkeypatch.setattr(app, "cache", LRUCache(max_entries=100, max_bytes=2**20))
+    client = TestClient(app.app)
+
+    def search(word, languages):
+        request = {"word": word, "languages": languages, "words_per_l": 4}
+        response = client.post("/api/search", json=request)
+        assert response.status_code == 200
+        return response.json()
+
+    repeated = search("Sie ", ["english", "english"])
+    assert len(repeated) == 4
+    assert search("Sie", ["english"]) == repeated
+    assert searched == [("Sie", ["english"])]
+
+    lower = search("sie", ["english"])
+    assert searched[-1] == ("sie", ["english"])
+    assert {dot["word"] for dot in lower} != {dot["word"] for dot in repeated}
+
+
+def len_one(_value: object) -> int:
+    return 1
@@ -0,0 +1,156 @@
+import chromadb
+import numpy as np
+import pytest
+
+import db
+
+
+@pytest.fixture
+def fake_db(monkeypatch, tmp_path):
+    collection = chromadb.EphemeralClient().get_or_create_collection(
+        f"test-db-{tmp_path.name}"
+    )
+    calls = []
+
+    def embed(texts):
+        calls.append(list(texts))
+        return [np.full(4, len(text), dtype=np.float32) for text in texts]
+
+    monkeypatch.setattr(db, "collection", collection)
+    monkeypatch.setattr(db, "embedding_function", embed)
+    monkeypatch.setattr(db, "INGEST_CHECKPOINT_PATH", tmp_path / "checkpoint")
+    return collection, calls
+
+
+def test_ingest_adds_all_words(fake_db):
+    collection, calls = fake_db
+    words = [(f"word{i}", "english") for i in range(25)]
+
+    ids = [db.record_id(language, word) for word, language in words]
+
+    db.ingest(words, ids, batch_size=10, workers=2)
+
+    assert collection.count() == 25
+    assert sorted(len(batch) for batch in calls) == [5, 10, 10]
+    assert db.existing_ids() == set(ids)
+
+
+def test_ingest_resumes_without_re_embedding(fake_db, monkeypatch):
+    collection, calls = fake_db
+    words = [(f"word{i}", "english") for i in range(20)]
+    ids = [f"id{i}" for i in range(20)]
+    real_upsert = collection.upsert
+
+    def failing_upsert(**kwargs):
+        if kwargs["ids"][0] == "id10":
+            raise RuntimeError("disk full")
+        real_upsert(**kwargs)
+
+    monkeypatch.setattr(collection, "upsert", failing_upsert)
+    with pytest.raises(RuntimeError):
+        db.ingest(words, ids, batch_size=10, workers=1)
+    assert collection.count() == 10
+    embedded = sum(len(batch) for batch in calls)
+
+    monkeypatch.setattr(collection, "upsert", real_upsert)
+    db.ingest(words[10:], ids[10:], batch_size=10, workers=1)
+
+    assert collection.count() == 20
+    # The second batch was embedded before the failed write and checkpointed
+    assert sum(len(batch) for batch in calls) == embedded
+
+
+def test_resumed_ingest_checkpoints_new_words(fake_db, monkeypatch):
+    collection, calls = fake_db
+    words = [(f"word{i}", "english") for i in range(30)]
+    ids = [f"id{i}" for i in range(30)]
+    real_upsert = collection.upsert
+    failing = {"id10"}
+
+    def failing_upsert(**kwargs):
+        if kwargs["ids"][0] in failing:
+            raise RuntimeError("disk full")
+        real_upsert(**kwargs)
+
+    monkeypatch.setattr(collection, "upsert", failing_upsert)
+    with pytest.raises(RuntimeError):
+        db.ingest(words[:20], ids[:20], batch_size=10, workers=1)
+    # The rerun also brings words the checkpoint has never seen
+    failing = {"id20"}
+    with pytest.raises(RuntimeError):
+        db.ingest(words[10:], ids[10:], batch_size=10, workers=1)
+    embedded = sum(len(batch) for batch in calls)
+
+    monkeypatch.setattr(collection, "upsert", real_upsert)
+    db.ingest(words[20:], ids[20:], batch_size=10, workers=1)
+
+    assert collection.count() == 30
+    assert sum(len(batch) for batch in calls) == embedded
+
+
+def write_wordlist(directory, language, words):
+    directory.mkdir(exist_ok=True)
+    text = f"# {language.title()} word list\n" + "".join(f"{w}\n" for w in words)
+    (directory / f"{language}.txt").write_text(text)
+
+
+def test_sync_diffs_by_id(fake_db, monkeypatch, tmp_path):
+    collection, calls = fake_db
+    wordlists = tmp_path / "wordlists"
+    monkeypatch.setattr(db, "WORDLISTS_DIR", wordlists)
+    monkeypatch.setattr(db.sys, "argv", ["db.py"])
+    # A collection from before content ids, plus a language we have no list for
+    collection.add(
+        ids=["id0", "id1", "id2"],
+        embeddings=np.ones((3, 4), dtype=np.float32),
+        documents=["the", "of", "hola"],
+        metadatas=[{"language": "english"}] * 2 + [{"language": "spanish"}],
+    )
+    write_wordlist(wordlists, "english", ["the", "and"])
+
+    assert db.main() == 0
+
+    # "the" moved to its content id with its old embedding, "of" was dropped,
+    # only "and" was embedded, and spanish was left alone
+    assert calls == [["and"]]
+    assert db.existing_ids(["english"]) == {
+        db.record_id("english", "the"),
+        db.record_id("english", "and"),
+    }
+    assert collection.get(ids=["id2"])["documents"] == ["hola"]
+
+    # A second sync with no changes does nothing
+    assert db.main() == 0
+    assert calls == [["and"]]
+
+
+def test_sync_without_wordlists_does_nothing(fake_db, monkeypatch, tmp_path, capsys):
+    collection, calls = fake_db
+    monkeypatch.setattr(db, "WORDLISTS_DIR", tmp_path / "wordlists")
+    monkeypatch.setattr(db.sys, "argv", ["db.py"])
+    collection.add(ids=["id0"], embeddings=np.ones((1, 4)), documents=["the"])
+
+    assert db.main() == 0
+    assert "Nothing to add" in capsys.readouterr().out
+    assert collection.count() == 1 and calls == []
+    assert db.existing_ids([]) == set()
+
+
+def test_rate_limiter_spaces_requests(monkeypatch):
+    clock = [0.0]
+    monkeypatch.setattr(db.time, "monotonic", lambda: clock[0])
+    monkeypatch.setattr(db.time, "sleep", lambda s: clock.__setitem__(0, clock[0] + s))
+    limiter = db.RateLimiter(requests_per_minute=60, tokens_per_minute=600)
+
+    # Starts with a full minute's budget, then refills at 1 request/s
+    for _ in range(60):
+        limiter.acquire(tokens=1)
+    assert clock[0] == 0
+    limiter.acquire(tokens=1)
+    assert clock[0] == pytest.approx(1.0)
+
+    # 600 tokens/minute: after spending 500, another 200 need 10s of refill
+    limiter = db.RateLimiter(requests_per_minute=0, tokens_per_minute=600)
+    limiter.acquire(tokens=500)
+    limiter.acquire(tokens=200)
+    assert clock[0] == pytest.approx(11.0)
@@ -0,0 +1,51 @@
+import json
+
+import numpy as np
+
+from dots import SearchResult, from_binary, to_binary, to_json
+
+
+def make_result():
+    return SearchResult(
+        ["hello", "hola", "你好"],
+        ["english", "spanish", "chinese"],
+        np.array([[0.5, 1.0, -1.0], [2.0, 0.0, 0.25], [-3.0, 1.5, 0.0]]),
+    )
+
+
+def test_binary_roundtrip():
+    result = make_result()
+
+    decoded = from_binary(to_binary(result))
+
+    assert decoded.words == result.words
+    assert decoded.languages == result.languages
+    np.testing.assert_allclose(decoded.coordinates, result.coordinates)
+
+
+def test_binary_is_smaller_than_json():
+    result = make_result()
+
+    data = to_binary(result)
+
+    assert data[:4] == b"LDOT"
+    assert len(data) < len(json.dumps(to_json(result)).encode())
+
+
+def test_binary_empty_result():
+    empty = SearchResult([], [], np.empty((0, 3)))
+
+    decoded = from_binary(to_binary(empty))
+
+    assert decoded.words == []
+    assert decoded.coordinates.shape == (0, 3)
+
+
+def test_json_matches_original_shape():
+    assert to_json(make_result())[1] == {
+        "word": "hola",
+        "language": "spanish",
+        "x": 2.0,
+        "y": 0.0,
+        "z": 0.25,
+    }
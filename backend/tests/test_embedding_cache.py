@@ -0,0 +1,56 @@
+import numpy as np
+
+from embedding_cache import EmbeddingCache
+
+
+def test_embedding_cache_roundtrip(tmp_path):
+    cache = EmbeddingCache(tmp_path, "test-model")
+    assert cache.get("hello") is None
+
+    cache.set("hello", np.array([1.0, 2.0, 3.0]))
+    cache.set("wörld\n", np.array([4.0, 5.0, 6.0]))
+
+    result = cache.get("hello")
+    assert result is not None
+    assert result.dtype == np.float32
+    np.testing.assert_array_equal(result, [1.0, 2.0, 3.0])
+    np.testing.assert_array_equal(cache.get("wörld\n"), [4.0, 5.0, 6.0])
+
+
+def test_embedding_cache_persists_across_instances(tmp_path):
+    EmbeddingCache(tmp_path, "test-model").set("hello", np.array([1.0, 2.0]))
+
+    reopened = EmbeddingCache(tmp_path, "test-model")
+    assert len(reopened) == 1
+    np.testing.assert_array_equal(reopened.get("hello"), [1.0, 2.0])
+
+    # Vectors from another model are never mixed in
+    assert EmbeddingCache(tmp_path, "other-model").get("hello") is None
+
+
+def test_embedding_cache_drops_orphan_rows(tmp_path):
+    cache = EmbeddingCache(tmp_path, "test-model")
+    cache.set("a", np.array([1.0, 2.0]))
+    # Simulate a crash between writing a vector and writing its key
+    with open(cache.path / "vectors.f32", "ab") as f:
+        f.write(np.array([9.0, 9.0], dtype=np.float32).tobytes())
+
+    reopened = EmbeddingCache(tmp_path, "test-model")
+    reopened.set("b", np.array([3.0, 4.0]))
+    np.testing.assert_array_equal(reopened.get("a"), [1.0, 2.0])
+    np.testing.assert_array_equal(reopened.get("b"), [3.0, 4.0])
+
+
+def test_embedding_cache_shared_between_processes(tmp_path):
+    # Two workers with the cache open on one path
+    a = EmbeddingCache(tmp_path, "test-model")
+    b = EmbeddingCache(tmp_path, "test-model")
+    a.set("x", np.array([1.0, 1.0]))
+    b.set("y", np.array([2.0, 2.0]))
+    a.set("z", np.array([3.0, 3.0]))
+
+    np.testing.assert_array_equal(b.get("y"), [2.0, 2.0])
+    np.testing.assert_array_equal(b.get("x"), [1.0, 1.0])
+    np.testing.assert_array_equal(b.get("z"), [3.0, 3.0])
+    np.testing.assert_array_equal(a.get("y"), [2.0, 2.0])
+    assert len(EmbeddingCache(tmp_path, "test-model")) == 3
@@ -0,0 +1,212 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+from fetch_wordlists import (
+    CONFIGS,
+    HANS_LINK_TEXT,
+    LINK_TEXT,
+    HTMLLinkExtractor,
+    PageFetcher,
+    RegexExtractor,
+    fetch_wiktionary_words,
+)
+
+HANS_ROW = (
+    '<tr><td><span class="Hans" lang="zh-Hans"><a href="/wiki/%E7%9A%84" '
+    'title="的">的</a></span></td><td><span class="Hant" lang="zh-Hant">'
+    '<a href="/wiki/x" title="x">x</a></span></td>'
+    '<td><a href="/wiki/de" title="de">de</a><br/></td></tr>'
+)
+
+PAGES = {
+    "Frequency_lists/One": {
+        "revid": 101,
+        "sections": {
+            "1": '<a href="/wiki/the" title="the">the</a> '
+            '<a href="/wiki/of" title="of">of</a>',
+            "2": '<a href="/wiki/and" title="and">and</a> '
+            '<a href="/wiki/the" title="the">the</a>',
+        },
+    },
+    "Frequency_lists/Two": {
+        "revid": 202,
+        "sections": {"0": '<a href="/wiki/to#English" title="to#English">to</a>'},
+    },
+}
+
+
+class MediaWiki(BaseHTTPRequestHandler):
+    "Stand-in for api.php: revisions queries and saved parse responses"
+
+    pages = PAGES
+    requests = []  # type: list
+    etags = False
+
+    def do_GET(self):
+        params = {k: v[0] for k, v in parse_qs(urlparse(self.path).query).items()}
+        type(self).requests.append(params)
+        if params["action"] == "query":
+            titles = params["titles"].split("|")
+            body = {
+                "query": {
+                    "normalized": [
+                        {"from": t, "to": t.replace("_", " ")}
+                        for t in titles
+                        if "_" in t
+                    ],
+                    "pages": [
+                        {
+                            "title": t.replace("_", " "),
+                            "revisions": [{"revid": self.pages[t]["revid"]}],
+                        }
+                        for t in titles
+                        if t in self.pages
+                    ],
+                }
+            }
+            return self.reply(body)
+        page = self.pages.get(params["page"])
+        if page is None:
+            return self.reply({"error": {"code": "missingtitle"}})
+        etag = f'"{page["revid"]}-{params["section"]}"'
+        if self.etags and self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+        html = page["sections"][params["section"]]
+        self.reply(
+            {"parse": {"revid": page["revid"], "text": {"*": html}}},
+            etag if self.etags else None,
+        )
+
+    def reply(self, body, etag=None):
+        data = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        if etag:
+            self.send_header("ETag", etag)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def api():
+    MediaWiki.pages = json.loads(json.dumps(PAGES))
+    MediaWiki.requests = []
+    MediaWiki.etags = False
+    server = ThreadingHTTPServer(("127.0.0.1", 0), MediaWiki)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}/w/api.php"
+    server.shutdown()
+    server.server_close()
+
+
+def parses():
+    return [r for r in MediaWiki.requests if r["action"] == "parse"]
+
+
+def test_words_keep_page_and_section_order(api, tmp_path):
+    fetcher = PageFetcher(api, tmp_path, workers=4)
+    config = {"page_path": "Frequency_lists/One", "sections": ["1", "2"]}
+    assert fetch_wiktionary_words("english", config, 10, fetcher) == [
+        "the",
+        "of",
+        "and",
+    ]
+    config = {"pages": ["Frequency_lists/Two"], "sections": ["0"]}
+    assert fetch_wiktionary_words("english", config, 10, fetcher) == ["to"]
+
+
+def test_unchanged_pages_are_not_downloaded_again(api, tmp_path):
+    sections = [("Frequency_lists/One", "1"), ("Frequency_lists/Two", "0")]
+    first = PageFetcher(api, tmp_path).fetch_all(sections)
+    assert len(parses()) == 2
+
+    MediaWiki.requests = []
+    second = PageFetcher(api, tmp_path)
+    assert second.fetch_all(sections) == first
+    # One batched revisions query, no parse requests
+    assert [r["action"] for r in MediaWiki.requests] == ["query"]
+    assert second.cached == 2 and second.downloaded == 0
+
+    MediaWiki.pages["Frequency_lists/Two"]["revid"] = 203
+    MediaWiki.pages["Frequency_lists/Two"]["sections"]["0"] = "changed"
+    MediaWiki.requests = []
+    third = PageFetcher(api, tmp_path)
+    assert third.fetch_all(sections)[("Frequency_lists/Two", "0")] == "changed"
+    assert [r["page"] for r in parses()] == ["Frequency_lists/Two"]
+
+
+def test_etag_revalidation_without_revisions(api, tmp_path, monkeypatch):
+    MediaWiki.etags = True
+    sections = [("Frequency_lists/One", "1")]
+    PageFetcher(api, tmp_path).fetch_all(sections)
+
+    fetcher = PageFetcher(api, tmp_path)
+    monkeypatch.setattr(fetcher, "latest_revisions", lambda pages: {})
+    html = fetcher.fetch_all(sections)
+    assert html[sections[0]] == PAGES["Frequency_lists/One"]["sections"]["1"]
+    assert fetcher.not_modified == 1 and fetcher.downloaded == 0
+
+
+def test_missing_pages_are_skipped(api, tmp_path):
+    fetcher = PageFetcher(api, tmp_path)
+    html = fetcher.fetch_all([("Nope", "0"), ("Frequency_lists/Two", "0")])
+    assert html[("Nope", "0")] is None
+    assert html[("Frequency_lists/Two", "0")] is not None
+    assert not list(tmp_path.glob("*.tmp"))
+
+
+def test_extractors_agree_on_frequency_tables():
+    html = PAGES["Frequency_lists/One"]["sections"]["1"] + HANS_ROW
+    assert list(LINK_TEXT(html)) == ["the", "of", "的", "x", "de"]
+    assert list(HTMLLinkExtractor()(html)) == ["the", "of", "的", "x", "de"]
+    assert list(HANS_LINK_TEXT(html)) == ["的"]
+    assert list(HTMLLinkExtractor("Hans", chunk_size=7)(html)) == ["的"]
+    assert CONFIGS["chinese"]["extractor"] is HANS_LINK_TEXT
+
+
+def test_extraction_stops_at_num_words(api, tmp_path):
+    taken = []
+
+    class Counting(RegexExtractor):
+        def __call__(self, html_content):
+            for word in super().__call__(html_content):
+                taken.append(word)
+                yield word
+
+    config = {
+        "page_path": "Frequency_lists/One",
+        "sections": ["1", "2"],
+        "extractor": Counting(LINK_TEXT.pattern.pattern),
+    }
+    words = fetch_wiktionary_words("english", config, 1, PageFetcher(api, tmp_path))
+    assert words == ["the"]
+    assert taken == ["the"]
+
+
+def test_sections_past_num_words_are_not_downloaded(api, tmp_path):
+    config = {
+        "pages": ["Frequency_lists/One", "Frequency_lists/Two"],
+        "sections": ["1", "2", "0"],
+    }
+    fetcher = PageFetcher(api, tmp_path, workers=1)
+    assert fetch_wiktionary_words("english", config, 1, fetcher) == ["the"]
+    assert [(r["page"], r["section"]) for r in parses()] == [
+        ("Frequency_lists/One", "1")
+    ]
+
+    # With more workers, only that many sections are fetched ahead
+    MediaWiki.requests = []
+    fetcher = PageFetcher(api, tmp_path / "ahead", workers=2)
+    assert fetch_wiktionary_words("english", config, 1, fetcher) == ["the"]
+    assert len(parses()) == 2
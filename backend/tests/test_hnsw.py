@@ -0,0 +1,67 @@
+import chromadb
+import pytest
+from chromadb.api.shared_system_client import SharedSystemClient
+
+from hnsw import hnsw_settings, migrate, sweep
+
+
+@pytest.fixture
+def live(make_collection, tmp_path):
+    client = chromadb.PersistentClient(path=tmp_path.as_posix())
+    # Unit vectors, like the embedding models': l2 ranks them as cosine does
+    collection, _ = make_collection(
+        "test-hnsw",
+        n=600,
+        dim=16,
+        normalize=True,
+        client=client,
+        configuration={
+            "hnsw": {"space": "l2", "max_neighbors": 8, "ef_construction": 20}
+        },
+    )
+    yield client, collection
+    SharedSystemClient.clear_system_cache()
+
+
+def test_migrate_copies_records_into_new_settings(live):
+    client, source = live
+    config = {"space": "cosine", "max_neighbors": 12, "ef_construction": 50}
+
+    target = migrate(client, source, "test-hnsw-m12", config, batch_size=100)
+
+    assert target.count() == 600
+    assert hnsw_settings(target)["max_neighbors"] == 12
+    assert hnsw_settings(target)["space"] == "cosine"
+    record = target.get(ids=["id7"], include=["documents", "metadatas"])
+    assert record["documents"] == ["w7"]
+    assert record["metadatas"] == [{"language": "spanish"}]
+    with pytest.raises(ValueError, match="already exists"):
+        migrate(client, source, "test-hnsw-m12", config)
+
+
+def test_migrate_replace_keeps_the_previous_collection(live):
+    client, source = live
+    config = {"space": "cosine", "max_neighbors": 12, "ef_construction": 50}
+
+    migrate(client, source, "test-hnsw-new", config, replace=True)
+
+    names = {c.name for c in client.list_collections()}
+    assert names == {"test-hnsw", "test-hnsw-previous"}
+    assert hnsw_settings(client.get_collection("test-hnsw"))["space"] == "cosine"
+    assert hnsw_settings(client.get_collection("test-hnsw-previous"))["space"] == "l2"
+
+
+def test_sweep_reports_recall_per_setting(live, tmp_path):
+    results = sweep(tmp_path, "test-hnsw", [10, 200], ms=[8, 4], n_queries=10)
+
+    assert [(row["M"], row["search_ef"]) for row in results] == [
+        (8, 10),
+        (8, 200),
+        (4, 10),
+        (4, 200),
+    ]
+    assert all(0 <= row["recall@20"] <= 1 for row in results)
+    assert results[1]["recall@20"] > 0.95
+    client = chromadb.PersistentClient(path=tmp_path.as_posix())
+    # The live collection's own search ef is restored
+    assert hnsw_settings(client.get_collection("test-hnsw"))["ef_search"] == 100
@@ -0,0 +1,72 @@
+import asyncio
+
+import numpy as np
+from fastapi.testclient import TestClient
+
+import app
+import metrics
+from vector_index import Neighbors
+from workers import WorkerPool
+
+
+def test_histogram_renders_cumulative_buckets():
+    histogram = metrics.Histogram("test_seconds", "Test", "stage", buckets=(0.1, 1))
+    histogram.observe("embed", 0.05)
+    histogram.observe("embed", 0.5)
+    histogram.observe("embed", 5)
+
+    lines = histogram.render()
+
+    assert 'test_seconds_bucket{stage="embed",le="0.1"} 1' in lines
+    assert 'test_seconds_bucket{stage="embed",le="1"} 2' in lines
+    assert 'test_seconds_bucket{stage="embed",le="+Inf"} 3' in lines
+    assert 'test_seconds_count{stage="embed"} 3' in lines
+
+
+def test_breakdown_follows_work_into_pool_threads():
+    pool = WorkerPool("thread", 2, 10)
+
+    def work():
+        with metrics.stage("projection"):
+            pass
+
+    async def main():
+        with metrics.breakdown() as stages:
+            await pool.run(work)
+        return stages
+
+    stages = asyncio.run(main())
+    pool.shutdown()
+    assert set(stages) == {"queue", "projection"}
+
+
+def test_search_records_stages_and_serves_metrics(monkeypatch, caplog):
+    def search_language(query_embedding, language, n_results):
+        with metrics.stage("search"):
+            embeddings = np.eye(n_results, 8, dtype=np.float32)
+            return Neighbors(language, [f"w{i}" for i in range(n_results)], embeddings)
+
+    monkeypatch.setattr(
+        app,
+        "retrieve",
+        lambda word, languages, n: [
+            search_language(app.embed_query(word, languages), language, n)
+            for language in languages
+        ],
+    )
+    monkeypatch.setattr(app, "embed_query", lambda word, languages: np.ones(8))
+    monkeypatch.setattr(app, "SLOW_SEARCH_SECONDS", 1e-9)
+    client = TestClient(app.app)
+
+    response = client.post(
+        "/api/search",
+        json={"word": "metrics test", "languages": ["english"], "words_per_l": 4},
+    )
+
+    assert response.status_code == 200
+    assert "Slow search 'metrics test'" in caplog.text
+    assert "search=" in caplog.text and "projection=" in caplog.text
+    body = client.get("/metrics").text
+    assert 'latentdictionary_search_stage_seconds_count{stage="projection"}' in body
+    assert 'latentdictionary_search_seconds_count{computed="true"}' in body
+    assert "latentdictionary_search_cache_misses" in body
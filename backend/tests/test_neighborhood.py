@@ -0,0 +1,84 @@
+import pytest
+from fastapi.testclient import TestClient
+
+import app
+from cache import SharedCache
+import retrieval
+
+
+@pytest.fixture
+def index(make_index, monkeypatch):
+    index, _ = make_index(n=60, dim=16)
+    monkeypatch.setattr(retrieval, "numpy_index", index)
+    return index
+
+
+def test_retrieve_many_deduplicates_shared_neighbours(index):
+
+    found = retrieval.retrieve_many(["w0", "w2"], ["english", "spanish"], 5)
+
+    assert [neighbors.language for neighbors in found] == ["english", "spanish"]
+    for neighbors in found:
+        expected = []
+        for word in ["w0", "w2"]:
+            query = index.embedding(word)
+            assert query is not None
+            for neighbor in index.query(query, neighbors.language, 5).words:
+                if neighbor not in expected:
+                    expected.append(neighbor)
+        assert neighbors.words == expected
+        assert len(neighbors.embeddings) == len(expected)
+
+
+def test_neighborhood_keeps_earlier_points_in_place(index):
+    client = TestClient(app.app)
+    request = {"languages": ["english"], "words_per_l": 5, "projection": "local"}
+
+    first = client.post("/api/neighborhood", json={"words": ["w0"], **request})
+    second = client.post(
+        "/api/neighborhood",
+        json={"words": ["w0", "w4"], "layout": first.json()["layout"], **request},
+    )
+
+    assert first.status_code == second.status_code == 200
+    before = {dot["word"]: dot for dot in first.json()["dots"]}
+    after = {dot["word"]: dot for dot in second.json()["dots"]}
+    assert second.json()["layout"] == first.json()["layout"]
+    assert set(before) < set(after)
+    for word, dot in before.items():
+        for axis in "xyz":
+            assert abs(after[word][axis] - dot[axis]) < 1e-5
+
+
+def test_neighborhood_layout_reaches_other_workers(index, monkeypatch, tmp_path):
+    monkeypatch.setattr(app, "shared_cache", SharedCache(tmp_path / "db", 2**20))
+    client = TestClient(app.app)
+    request = {"languages": ["english"], "words_per_l": 5, "projection": "local"}
+
+    first = client.post("/api/neighborhood", json={"words": ["w0"], **request})
+    # The follow-up is served by a worker that never saw this layout
+    app.layout_bases.clear()
+    second = client.post(
+        "/api/neighborhood",
+        json={"words": ["w0", "w4"], "layout": first.json()["layout"], **request},
+    )
+
+    assert second.json()["layout"] == first.json()["layout"]
+    before = {dot["word"]: dot for dot in first.json()["dots"]}
+    after = {dot["word"]: dot for dot in second.json()["dots"]}
+    for word, dot in before.items():
+        for axis in "xyz":
+            assert abs(after[word][axis] - dot[axis]) < 1e-5
+
+
+def test_neighborhood_validates_words(index):
+    client = TestClient(app.app)
+    request = {"languages": ["english"], "words_per_l": 5}
+
+    assert (
+        client.post("/api/neighborhood", json={"words": [], **request}).status_code
+        == 400
+    )
+    too_many = [f"w{i}" for i in range(app.NEIGHBORHOOD_MAX_WORDS + 1)]
+    response = client.post("/api/neighborhood", json={"words": too_many, **request})
+    assert response.status_code == 400
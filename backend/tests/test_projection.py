@@ -0,0 +1,47 @@
+import numpy as np
+
+from projection import fit_basis, fit_local_basis, load_bases, pca, save_bases
+
+
+def test_fit_basis_streaming_matches_pca():
+    rng = np.random.default_rng(0)
+    latent = rng.normal(size=(300, 4)) * [8.0, 4.0, 2.0, 0.5]
+    data = latent @ rng.normal(size=(4, 32)) + rng.normal(scale=0.01, size=(300, 32))
+
+    basis = fit_basis(np.array_split(data, 7))
+    projected = basis.project(data)
+
+    # Same axes and centering as the per-request PCA, up to sign
+    expected = pca(data)
+    signs = np.sign(np.sum(projected * expected, axis=0))
+    np.testing.assert_allclose(projected * signs, expected, atol=1e-2)
+
+
+def test_bases_roundtrip(tmp_path):
+    rng = np.random.default_rng(1)
+    bases = {
+        "*": fit_basis([rng.normal(size=(20, 8))]),
+        "english+spanish": fit_basis([rng.normal(size=(20, 8))]),
+    }
+    path = tmp_path / "projection.npz"
+
+    save_bases(bases, path)
+    loaded = load_bases(path)
+
+    assert set(loaded) == set(bases)
+    for key, basis in bases.items():
+        np.testing.assert_array_equal(loaded[key].mean, basis.mean)
+        np.testing.assert_array_equal(loaded[key].components, basis.components)
+    assert load_bases(tmp_path / "missing.npz") == {}
+
+
+def test_fit_local_basis_reproduces_pca():
+    rng = np.random.default_rng(3)
+    data = rng.normal(size=(40, 32)).astype(np.float32)
+
+    basis = fit_local_basis(data)
+
+    np.testing.assert_allclose(basis.project(data), pca(data), atol=1e-4)
+    np.testing.assert_allclose(
+        basis.components @ basis.components.T, np.eye(3), atol=1e-5
+    )
@@ -0,0 +1,92 @@
+import numpy as np
+import pytest
+
+from bundle import export_bundle, import_bundle
+from quantize import accuracy_report, dequantize, quantize
+from vector_index import NumpyIndex
+
+
+@pytest.mark.parametrize("dtype, tolerance", [("float16", 1e-3), ("int8", 1e-2)])
+def test_quantize_round_trip_error(make_index, dtype, tolerance):
+    _, embeddings = make_index(n=400, dim=64)
+
+    stored, scales = quantize(embeddings, dtype)
+    restored = dequantize(stored, scales)
+
+    assert stored.dtype == np.dtype(dtype)
+    assert restored.dtype == np.float32
+    relative = np.abs(restored - embeddings).max(axis=1) / np.abs(embeddings).max(
+        axis=1
+    )
+    assert relative.max() < tolerance
+
+
+def test_quantize_keeps_zero_rows():
+    stored, scales = quantize(np.zeros((2, 4)), "int8")
+
+    np.testing.assert_array_equal(dequantize(stored, scales), np.zeros((2, 4)))
+
+
+def test_quantized_index_agrees_with_full_precision(make_index):
+    index, embeddings = make_index(n=400, dim=64)
+    quantized = index.quantize("int8")
+
+    assert quantized.dtype == "int8"
+    assert quantized.nbytes < index.nbytes / 3
+    result = quantized.query(embeddings[5], "spanish", 10)
+    assert result.words[0] == "w5"
+    assert result.embeddings.dtype == np.float32
+    np.testing.assert_allclose(result.embeddings[0], embeddings[5], atol=0.05)
+    stored = quantized.embedding("w5", ["spanish"])
+    assert stored is not None
+    np.testing.assert_allclose(stored, embeddings[5], atol=0.05)
+    assert quantized.embedding("w5", ["english"]) is None
+
+    report = accuracy_report(index, quantized, n_queries=20, n_results=10)
+    assert report["queries"] == 40
+    assert report["recall@10"] > 0.9
+    assert report["coordinate_error"] < 0.05
+
+
+def test_truncated_index_reranks_with_full_vectors():
+    rng = np.random.default_rng(1)
+    # Matryoshka-like: the leading dimensions carry most of the variance
+    embeddings = (rng.normal(size=(600, 64)) * np.geomspace(3, 0.03, 64)).astype(
+        np.float32
+    )
+    words = [f"w{i}" for i in range(600)]
+    index = NumpyIndex.from_arrays(words, ["english"] * 600, embeddings)
+    truncated = index.truncate(16, oversample=4)
+
+    assert truncated.dims == 16 and index.dims is None
+    assert truncated.scan_nbytes < index.nbytes / 3
+    result = truncated.query(embeddings[7], "english", 10)
+    assert result.words[0] == "w7"
+    # Re-ranked candidates carry their full vectors, in full-search order
+    np.testing.assert_array_equal(result.embeddings[0], embeddings[7])
+    full = index.query(embeddings[7], "english", 10)
+    common = [word for word in full.words if word in result.words]
+    assert common == [word for word in result.words if word in full.words]
+    assert truncated.embedding("w7") is not None
+
+    # Oversampling past every row is exact
+    exact = index.truncate(16, oversample=60).query(embeddings[3], "english", 10)
+    assert exact.words == index.query(embeddings[3], "english", 10).words
+
+    report = accuracy_report(index, truncated, n_queries=50, n_results=10)
+    assert report["recall@10"] > 0.9
+    assert report["coordinate_error"] < 1e-5
+    with pytest.raises(ValueError):
+        index.truncate(64)
+
+
+def test_quantized_bundle_serves_but_does_not_import(make_collection, tmp_path):
+    collection, embeddings = make_collection("test-quantized-bundle", dim=64)
+
+    bundle = export_bundle(collection, tmp_path / "bundle", "model", dtype="int8")
+
+    assert bundle.embeddings.dtype == np.int8
+    assert bundle.scales is not None
+    assert bundle.numpy_index().query(embeddings[4], "english", 1).words == ["w4"]
+    with pytest.raises(ValueError, match="full-precision"):
+        import_bundle(bundle, collection)
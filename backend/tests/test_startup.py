@@ -0,0 +1,104 @@
+import os
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+
+from fastapi.testclient import TestClient
+
+import app
+from workers import WorkerPool
+
+BACKEND = Path(__file__).parent.parent
+
+
+def test_importing_the_app_opens_nothing(tmp_path):
+    env = {**os.environ, "DB_PATH": str(tmp_path / "db"), "WARMUP_WORDS": "0"}
+    subprocess.run(
+        [
+            sys.executable,
+            "-c",
+            "import app, db, retrieval; "
+            "assert db.client is None and db.collection is None; "
+            "assert db.embedding_function is None and retrieval.numpy_index is None",
+        ],
+        cwd=BACKEND,
+        env=env,
+        check=True,
+    )
+    assert not (tmp_path / "db").exists()
+
+
+def test_ready_once_resources_are_loaded(monkeypatch):
+    loaded = threading.Event()
+
+    def load_resources():
+        loaded.wait(5)
+        return {"embedding_function": 0.0, "index": 0.25}
+
+    monkeypatch.setattr(app, "load_resources", load_resources)
+    # The lifespan shuts the pool down on exit
+    monkeypatch.setattr(app, "search_pool", WorkerPool("thread", 1, 10))
+    monkeypatch.setattr(
+        app, "readiness", {"ready": False, "error": None, "seconds": None}
+    )
+    with TestClient(app.app) as client:
+        assert client.get("/health").json() == {"status": "ok"}
+        response = client.get("/ready")
+        assert response.status_code == 503
+        assert response.json()["ready"] is False
+
+        loaded.set()
+        for _ in range(100):
+            response = client.get("/ready")
+            if response.status_code == 200:
+                break
+            time.sleep(0.01)
+        assert response.status_code == 200
+        assert response.json()["seconds"] == {"embedding_function": 0.0, "index": 0.25}
+        assert "latentdictionary_index_ready 1" in client.get("/metrics").text
+
+
+def test_failed_load_is_reported(monkeypatch):
+    def load_resources():
+        raise RuntimeError("no such collection")
+
+    monkeypatch.setattr(app, "load_resources", load_resources)
+    # The lifespan shuts the pool down on exit
+    monkeypatch.setattr(app, "search_pool", WorkerPool("thread", 1, 10))
+    monkeypatch.setattr(
+        app, "readiness", {"ready": False, "error": None, "seconds": None}
+    )
+    with TestClient(app.app) as client:
+        response = client.get("/ready")
+        for _ in range(100):
+            if response.json()["error"]:
+                break
+            time.sleep(0.01)
+            response = client.get("/ready")
+        assert response.status_code == 503
+        assert response.json()["error"] == "no such collection"
+
+
+def test_failed_warm_up_is_reported(monkeypatch):
+    async def warm_from_env(search, exclusive):
+        raise ValueError("unknown language in WARMUP_LANGUAGE_SETS")
+
+    monkeypatch.setattr(app, "load_resources", lambda: {"index": 0.0})
+    monkeypatch.setattr(app, "warm_from_env", warm_from_env)
+    monkeypatch.setattr(app, "search_pool", WorkerPool("thread", 1, 10))
+    monkeypatch.setattr(
+        app, "readiness", {"ready": False, "error": None, "seconds": None}
+    )
+    with TestClient(app.app) as client:
+        response = client.get("/ready")
+        for _ in range(100):
+            if response.json()["error"]:
+                break
+            time.sleep(0.01)
+            response = client.get("/ready")
+        assert response.status_code == 503
+        assert response.json()["error"] == (
+            "Warm-up failed: unknown language in WARMUP_LANGUAGE_SETS"
+        )
@@ -0,0 +1,77 @@
+import gzip
+import os
+
+import brotli
+
+from static import StaticSite, accepted_encodings, precompress
+
+
+def make_dist(tmp_path):
+    (tmp_path / "assets").mkdir()
+    (tmp_path / "index.html").write_text("<html>" + "app " * 500 + "</html>")
+    (tmp_path / "assets" / "index-4f1c2a9b.js").write_text("let x = 1;\n" * 500)
+    (tmp_path / "font.woff").write_bytes(os.urandom(4000))
+    return StaticSite(tmp_path)
+
+
+def test_serves_best_accepted_encoding(tmp_path):
+    site = make_dist(tmp_path)
+
+    br = site.response("assets/index-4f1c2a9b.js", {"accept-encoding": "gzip, br"})
+    gz = site.response("assets/index-4f1c2a9b.js", {"accept-encoding": "gzip"})
+    plain = site.response("assets/index-4f1c2a9b.js", {})
+
+    assert br.headers["content-encoding"] == "br"
+    assert brotli.decompress(br.body) == b"let x = 1;\n" * 500
+    assert gzip.decompress(gz.body) == b"let x = 1;\n" * 500
+    assert "content-encoding" not in plain.headers
+    assert br.headers["vary"] == "Accept-Encoding"
+    assert len({br.headers["etag"], gz.headers["etag"], plain.headers["etag"]}) == 3
+    assert "immutable" in br.headers["cache-control"]
+
+
+def test_incompressible_files_are_sent_as_is(tmp_path):
+    site = make_dist(tmp_path)
+
+    response = site.response("font.woff", {"accept-encoding": "br, gzip"})
+
+    assert "content-encoding" not in response.headers
+    assert response.headers["content-type"] == "font/woff"
+    assert response.headers["cache-control"] == "no-cache"
+
+
+def test_etag_revalidation_returns_304(tmp_path):
+    site = make_dist(tmp_path)
+    first = site.response("index.html", {"accept-encoding": "gzip"})
+
+    again = site.response(
+        "index.html",
+        {"accept-encoding": "gzip", "if-none-match": first.headers["etag"]},
+    )
+
+    assert again.status_code == 304
+    assert again.body == b""
+
+
+def test_unknown_paths_fall_back_to_index(tmp_path):
+    site = make_dist(tmp_path)
+
+    response = site.response("some/client/route", {})
+
+    assert bytes(response.body).startswith(b"<html>")
+    assert StaticSite(tmp_path / "missing").response("", {}).status_code == 404
+
+
+def test_prebuilt_variants_are_preferred(tmp_path):
+    make_dist(tmp_path)
+    assert precompress(tmp_path) == 4  # index.html and the js, gzip and brotli
+
+    site = StaticSite(tmp_path)
+    response = site.response("index.html", {"accept-encoding": "br"})
+
+    assert len(site) == 3
+    assert response.body == (tmp_path / "index.html.br").read_bytes()
+
+
+def test_accepted_encodings_skips_refused():
+    assert accepted_encodings("gzip;q=0, br;q=0.5, identity") == ["br", "identity"]
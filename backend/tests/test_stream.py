@@ -0,0 +1,54 @@
+import json
+import time
+
+import numpy as np
+from fastapi.testclient import TestClient
+
+import app
+from vector_index import Neighbors
+from workers import WorkerPool
+
+# The first language is the slowest, so the others arrive before it
+DELAYS = {"english": 0.2, "spanish": 0.0, "french": 0.1}
+
+
+def fake_search_language(query_embedding, language, n_results):
+    time.sleep(DELAYS[language])
+    rng = np.random.default_rng(len(language))
+    embeddings = rng.normal(size=(n_results, 8)).astype(np.float32)
+    words = [f"{language}{i}" for i in range(n_results)]
+    return Neighbors(language, words, embeddings)
+
+
+def stream(client, word):
+    response = client.post(
+        "/api/search/stream",
+        json={"word": word, "languages": list(DELAYS), "words_per_l": 4},
+    )
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    return [json.loads(line) for line in response.text.splitlines()]
+
+
+def test_stream_refines_as_languages_arrive(monkeypatch):
+    monkeypatch.setattr(app, "embed_query", lambda word, languages: np.ones(8))
+    monkeypatch.setattr(app, "search_language", fake_search_language)
+    monkeypatch.setattr(app, "search_pool", WorkerPool("thread", 4, 10))
+    client = TestClient(app.app)
+
+    events = stream(client, "stream test")
+
+    assert [event["done"] for event in events] == [False, False, True]
+    assert events[0]["languages"] == ["spanish"]
+    assert events[1]["languages"] == ["spanish", "french"]
+    assert events[2]["languages"] == list(DELAYS)
+    assert len(events[1]["dots"]) == 8
+    expected = app.project(
+        [fake_search_language(None, language, 4) for language in DELAYS],
+        list(DELAYS),
+        "local",
+    )
+    assert events[2]["dots"] == app.to_json(expected)
+
+    # The final result was cached, so asking again is a single event
+    assert stream(client, "stream test") == [events[2]]
@@ -0,0 +1,43 @@
+import numpy as np
+
+from vector_index import NumpyIndex
+
+
+def test_numpy_index_matches_brute_force_cosine(make_index):
+    index, embeddings = make_index()
+    query = embeddings[3] + 0.1
+
+    result = index.query(query, "spanish", 5)
+
+    rows = np.arange(1, len(embeddings), 2)
+    spanish = embeddings[rows]
+    cosine = spanish @ query / np.linalg.norm(spanish, axis=1) / np.linalg.norm(query)
+    expected = [f"w{rows[i]}" for i in np.argsort(-cosine)[:5]]
+    assert result.language == "spanish"
+    assert result.words == expected
+    assert result.words[0] == "w3"
+    np.testing.assert_array_equal(result.embeddings[0], embeddings[3])
+
+
+def test_numpy_index_handles_small_and_missing_languages(make_index):
+    index, embeddings = make_index(n=6)
+
+    assert len(index.query(embeddings[0], "english", 10).words) == 3
+    assert index.query(embeddings[0], "klingon", 10).words == []
+
+
+def test_numpy_index_stored_embedding_lookup(make_index):
+    index, embeddings = make_index()
+
+    np.testing.assert_array_equal(index.embedding("w7"), embeddings[7])
+    assert index.embedding("not a word") is None
+
+
+def test_numpy_index_from_collection(make_collection):
+    collection, embeddings = make_collection("test-numpy-index")
+
+    index = NumpyIndex.from_collection(collection, batch_size=7)
+
+    assert len(index) == 30
+    assert index.languages["english"].embeddings.flags["C_CONTIGUOUS"]
+    assert index.query(embeddings[4], "english", 1).words == ["w4"]
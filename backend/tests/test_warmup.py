@@ -0,0 +1,44 @@
+import asyncio
+
+from warmup import DEFAULT_SEARCH_TERM, WarmupJob, load_wordlists, plan_jobs, warm
+
+
+def test_load_wordlists_takes_top_words(tmp_path):
+    (tmp_path / "english.txt").write_text("# English word list\nthe\nof\n\nand\n")
+    (tmp_path / "spanish.txt").write_text("# Spanish word list\nde\n")
+
+    assert load_wordlists(2, tmp_path) == {"english": ["the", "of"], "spanish": ["de"]}
+
+
+def test_plan_jobs_orders_by_rank_across_languages():
+    wordlists = {"english": ["the", "of"], "spanish": ["de", "la"]}
+
+    jobs = plan_jobs(wordlists, [["english"], ["english", "spanish"]])
+
+    assert jobs == [
+        WarmupJob(DEFAULT_SEARCH_TERM, ["english"]),
+        WarmupJob("the", ["english"]),
+        WarmupJob("the", ["english", "spanish"]),
+        WarmupJob("de", ["english", "spanish"]),
+        WarmupJob("of", ["english"]),
+        WarmupJob("of", ["english", "spanish"]),
+        WarmupJob("la", ["english", "spanish"]),
+    ]
+
+
+def test_warm_stops_at_budget_and_counts_failures():
+    seen = []
+
+    async def search(word, languages):
+        seen.append(word)
+        if word == "bad":
+            raise RuntimeError("boom")
+        await asyncio.sleep(0.02)
+
+    jobs = [WarmupJob(word, ["english"]) for word in ["a", "bad", "b", "c", "d", "e"]]
+    report = asyncio.run(warm(search, jobs, budget=0.03, concurrency=2))
+
+    assert report.failed == 1
+    assert report.completed + report.failed + report.skipped == len(jobs)
+    assert report.skipped > 0
+    assert seen[:2] == ["a", "bad"]
@@ -0,0 +1,37 @@
+import asyncio
+import threading
+
+import pytest
+
+from workers import PoolSaturated, WorkerPool
+
+
+def test_worker_pool_runs_off_the_event_loop():
+    pool = WorkerPool("thread", max_workers=2, max_queue=0)
+
+    async def main():
+        return await pool.run(threading.get_ident)
+
+    assert asyncio.run(main()) != threading.get_ident()
+    assert pool.stats()["completed"] == 1
+    assert pool.in_flight == 0
+
+
+def test_worker_pool_bounds_concurrency_and_rejects_overflow():
+    pool = WorkerPool("thread", max_workers=1, max_queue=1)
+    release = threading.Event()
+
+    async def main():
+        first = asyncio.ensure_future(pool.run(release.wait))
+        second = asyncio.ensure_future(pool.run(release.wait))
+        await asyncio.sleep(0.05)
+        assert pool.in_flight == 2
+        assert pool.queue_depth == 1
+        with pytest.raises(PoolSaturated):
+            await pool.run(release.wait)
+        release.set()
+        await asyncio.gather(first, second)
+
+    asyncio.run(main())
+    assert pool.rejected == 1
+    assert pool.completed == 2
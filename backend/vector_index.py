@@ -0,0 +1,267 @@
+from typing import TYPE_CHECKING, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from quantize import dequantize, inverse_norms, quantize
+
+if TYPE_CHECKING:
+    # chromadb takes most of a second to import; servers import it when they
+    # open the collection
+    from chromadb.api.models.Collection import Collection
+    from chromadb.api.types import GetResult, Include, Where
+
+# Define valid include parameters
+EMBEDDINGS_DOCUMENTS_AND_METADATAS: "Include" = [
+    "embeddings",
+    "documents",
+    "metadatas",
+]  # type: ignore
+
+
+def iter_records(
+    collection: "Collection",
+    include: "Include",
+    where: Optional["Where"] = None,
+    batch_size: int = 5000,
+) -> Iterator["GetResult"]:
+    "Page through a collection without holding all of it in one response"
+    offset = 0
+    while True:
+        records = collection.get(
+            where=where, include=include, limit=batch_size, offset=offset
+        )
+        if not records["ids"]:
+            return
+        yield records
+        offset += len(records["ids"])
+
+
+class Neighbors(NamedTuple):
+    "Nearest words to a query within a single language"
+
+    language: str
+    words: List[str]
+    embeddings: np.ndarray  # (len(words), dim) float32
+
+
+class LanguageMatrix(NamedTuple):
+    "Every record of one language as contiguous arrays"
+
+    words: List[str]
+    embeddings: np.ndarray  # (n, dim) float32, or float16/int8 (see quantize)
+    inv_norms: np.ndarray  # (n,) float32, 1 / ||embedding||
+    scales: Optional[np.ndarray] = None  # (n,) float32 for int8 rows
+
+    def vectors(self, rows: np.ndarray) -> np.ndarray:
+        "Rows as float32 vectors"
+        scales = None if self.scales is None else self.scales[rows]
+        return dequantize(self.embeddings[rows], scales)
+
+    def scores(self, query: np.ndarray, block_rows: int = 4096) -> np.ndarray:
+        "Cosine similarity of every row to `query`, up to the query's norm"
+        if self.embeddings.dtype == np.float32:
+            dots = self.embeddings @ query
+        else:
+            # Upcast a block at a time: a whole-matrix temporary would undo
+            # the memory saved by storing the rows compactly
+            dots = np.concatenate(
+                [
+                    self.embeddings[i : i + block_rows].astype(np.float32) @ query
+                    for i in range(0, len(self.embeddings), block_rows)
+                ]
+            )
+        if self.scales is not None:
+            dots *= self.scales
+        return dots * self.inv_norms
+
+
+class NumpyIndex:
+    """Exact cosine search over embeddings held in memory, one matrix per language.
+
+    For a read-only dictionary of this size a BLAS matrix-vector product and
+    an argpartition beats a round trip through Chroma's HNSW index, and the
+    neighbours are exact rather than approximate.
+    """
+
+    def __init__(
+        self,
+        languages: Dict[str, LanguageMatrix],
+        truncated: Optional[Dict[str, np.ndarray]] = None,
+        oversample: int = 4,
+    ):
+        self.languages = languages
+        # language -> (n, dims) float32 unit rows for a first pass (see truncate)
+        self.truncated = truncated
+        self.oversample = oversample
+        # (language, word) -> row for reusing stored embeddings as queries
+        self._rows: Dict[Tuple[str, str], int] = {}
+        for language, matrix in languages.items():
+            for row, word in enumerate(matrix.words):
+                self._rows.setdefault((language, word), row)
+
+    def __len__(self) -> int:
+        return sum(len(matrix.words) for matrix in self.languages.values())
+
+    @property
+    def dtype(self) -> str:
+        "How the vectors are stored: float32, float16 or int8"
+        for matrix in self.languages.values():
+            return str(matrix.embeddings.dtype)
+        return "float32"
+
+    @property
+    def dims(self) -> Optional[int]:
+        "Dimensions of the first-pass vectors, if queries are two-stage"
+        for short in (self.truncated or {}).values():
+            return short.shape[1]
+        return None
+
+    @property
+    def nbytes(self) -> int:
+        "Memory held by the vectors (and int8 scales, and truncated copies)"
+        return sum(
+            matrix.embeddings.nbytes
+            + matrix.inv_norms.nbytes
+            + (0 if matrix.scales is None else matrix.scales.nbytes)
+            for matrix in self.languages.values()
+        ) + sum(short.nbytes for short in (self.truncated or {}).values())
+
+    @property
+    def scan_nbytes(self) -> int:
+        "Memory read by a search of every language: the first pass if two-stage"
+        if self.truncated is not None:
+            return sum(short.nbytes for short in self.truncated.values())
+        return self.nbytes
+
+    @classmethod
+    def from_arrays(
+        cls, words: List[str], languages: List[str], embeddings: np.ndarray
+    ) -> "NumpyIndex":
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        language_array = np.array(languages)
+        matrices = {}
+        for language in dict.fromkeys(languages):
+            rows = np.flatnonzero(language_array == language)
+            matrix = np.ascontiguousarray(embeddings[rows])
+            norms = np.linalg.norm(matrix, axis=1)
+            norms[norms == 0] = 1
+            matrices[language] = LanguageMatrix(
+                [words[i] for i in rows], matrix, (1 / norms).astype(np.float32)
+            )
+        return cls(matrices)
+
+    @classmethod
+    def from_collection(
+        cls, collection: "Collection", batch_size: int = 5000
+    ) -> "NumpyIndex":
+        "Read the whole collection page by page into per-language matrices"
+        include: Include = EMBEDDINGS_DOCUMENTS_AND_METADATAS
+        words: List[str] = []
+        languages: List[str] = []
+        batches: List[np.ndarray] = []
+        for records in iter_records(collection, include, batch_size=batch_size):
+            words.extend(records.get("documents") or [])
+            languages.extend(
+                str(meta.get("language", "")) for meta in records.get("metadatas") or []
+            )
+            batches.append(np.asarray(records.get("embeddings"), dtype=np.float32))
+        if not batches:
+            return cls({})
+        return cls.from_arrays(words, languages, np.concatenate(batches))
+
+    def quantize(self, dtype: str) -> "NumpyIndex":
+        "A copy of this index with its vectors stored as `dtype`"
+        matrices = {}
+        for language, matrix in self.languages.items():
+            embeddings, scales = quantize(
+                matrix.vectors(np.arange(len(matrix.words))), dtype
+            )
+            matrices[language] = LanguageMatrix(
+                matrix.words, embeddings, inverse_norms(embeddings, scales), scales
+            )
+        return NumpyIndex(matrices)
+
+    def truncate(
+        self, dims: int, oversample: int = 4, block_rows: int = 4096
+    ) -> "NumpyIndex":
+        """This index, searched in two stages with a copy cut to `dims`.
+
+        Matryoshka-trained embeddings (OpenAI's text-embedding-3 models) keep
+        most of their ranking in the leading dimensions, so every row is
+        first scored on its first `dims` dimensions, renormalized, and only
+        the best k * `oversample` candidates are re-ranked with the full
+        vectors. The full vectors are shared, not copied; behind a bundle
+        they stay memory-mapped and only the candidates' rows are read. The
+        cut copy is private to the process; Bundle.truncated maps one that
+        worker processes share.
+        """
+        truncated = {}
+        for language, matrix in self.languages.items():
+            short = np.empty((len(matrix.words), dims), dtype=np.float32)
+            truncate_rows(matrix, dims, short, block_rows)
+            truncated[language] = short
+        index = NumpyIndex(self.languages, truncated, oversample)
+        index._rows = self._rows
+        return index
+
+    def vector(self, language: str, row: int) -> np.ndarray:
+        return self.languages[language].vectors(np.array([row]))[0]
+
+    def embedding(
+        self, word: str, languages: Optional[List[str]] = None
+    ) -> Optional[np.ndarray]:
+        "The stored embedding for `word` in the first of `languages` (default: any)"
+        for language in self.languages if languages is None else languages:
+            row = self._rows.get((language, word))
+            if row is not None:
+                return self.vector(language, row)
+        return None
+
+    def query(
+        self, query_embedding: np.ndarray, language: str, n_results: int
+    ) -> Neighbors:
+        matrix = self.languages.get(language)
+        if matrix is None or n_results <= 0:
+            return Neighbors(language, [], np.empty((0, 0), dtype=np.float32))
+        query = np.asarray(query_embedding, dtype=np.float32)
+        if self.truncated is None:
+            # Ranking by cosine similarity only needs the record norms; the
+            # query norm is the same for every row
+            top = best(matrix.scores(query), n_results)
+        else:
+            short = self.truncated[language]
+            candidates = best(
+                short @ query[: short.shape[1]], n_results * self.oversample
+            )
+            vectors = matrix.vectors(candidates)
+            scores = (vectors @ query) * matrix.inv_norms[candidates]
+            order = best(scores, n_results)
+            return Neighbors(
+                language, [matrix.words[candidates[i]] for i in order], vectors[order]
+            )
+        return Neighbors(language, [matrix.words[i] for i in top], matrix.vectors(top))
+
+
+def truncate_rows(
+    matrix: LanguageMatrix, dims: int, out: np.ndarray, block_rows: int = 4096
+) -> None:
+    "Write every row of `matrix` cut to its first `dims` dimensions, renormalized"
+    if not 0 < dims < matrix.embeddings.shape[1]:
+        raise ValueError(
+            f"Cannot truncate {matrix.embeddings.shape[1]} dimensions to {dims}"
+        )
+    for i in range(0, len(out), block_rows):
+        block = matrix.vectors(np.arange(i, min(i + block_rows, len(out))))[:, :dims]
+        norms = np.linalg.norm(block, axis=1)
+        norms[norms == 0] = 1
+        out[i : i + len(block)] = block / norms[:, None]
+
+
+def best(scores: np.ndarray, k: int) -> np.ndarray:
+    "Indices of the `k` highest scores, highest first"
+    k = min(k, len(scores))
+    if k < len(scores):
+        top = np.argpartition(-scores, k - 1)[:k]
+    else:
+        top = np.arange(len(scores))
+    return top[np.argsort(-scores[top], kind="stable")]
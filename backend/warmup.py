@@ -0,0 +1,221 @@
+"""Precompute popular searches so a fresh instance serves them from cache.
+
+Runs inside the app at startup when WARMUP_WORDS is set, or from the command
+line against a running server:
+
+    python3 warmup.py --url http://localhost:5001 --words 500
+"""
+
+import asyncio
+import fcntl
+import logging
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, List, NamedTuple, Optional
+
+# uvicorn configures this logger, so in-app warm-up progress shows in its output
+logger = logging.getLogger("uvicorn.error")
+
+WORDLISTS_DIR = Path(__file__).parent / "wordlists"
+# Mirrors the frontend: its first search on page load, and its page size
+DEFAULT_SEARCH_TERM = "when u don't wanna get out of bed"
+DEFAULT_LANGUAGES = ["english"]
+WORDS_PER_LANGUAGE = 20
+# Held by whichever worker process is warming up a shared result cache, so
+# that with several workers only one of them does
+WARMUP_LOCK_PATH = Path(
+    os.getenv(
+        "WARMUP_LOCK_PATH",
+        os.path.join(tempfile.gettempdir(), "latentdictionary-warmup.lock"),
+    )
+)
+
+
+class WarmupJob(NamedTuple):
+    word: str
+    languages: List[str]
+
+
+class WarmupReport(NamedTuple):
+    completed: int
+    failed: int
+    skipped: int
+    seconds: float
+
+
+def load_wordlists(
+    num_words: int, wordlists_dir: Path = WORDLISTS_DIR
+) -> Dict[str, List[str]]:
+    "The `num_words` most frequent words of each language (lists are ranked)"
+    wordlists = {}
+    for file in sorted(wordlists_dir.glob("*.txt")):
+        words = []
+        for line in file.read_text(encoding="utf-8").split("\n"):
+            if line.startswith("#") or not line.strip():
+                continue
+            words.append(line.strip())
+            if len(words) >= num_words:
+                break
+        wordlists[file.stem] = words
+    return wordlists
+
+
+def plan_jobs(
+    wordlists: Dict[str, List[str]], language_sets: List[List[str]]
+) -> List[WarmupJob]:
+    """Most valuable searches first.
+
+    The frontend's landing search comes first, then words in rank order,
+    interleaving the languages of each set so a cut-off budget still covers
+    every language's head.
+    """
+    jobs = [WarmupJob(DEFAULT_SEARCH_TERM, DEFAULT_LANGUAGES)]
+    seen = {(DEFAULT_SEARCH_TERM, tuple(DEFAULT_LANGUAGES))}
+    depth = max((len(words) for words in wordlists.values()), default=0)
+    for rank in range(depth):
+        for languages in language_sets:
+            for language in languages:
+                words = wordlists.get(language, [])
+                if rank >= len(words):
+                    continue
+                key = (words[rank], tuple(languages))
+                if key not in seen:
+                    seen.add(key)
+                    jobs.append(WarmupJob(words[rank], languages))
+    return jobs
+
+
+async def warm(
+    search: Callable[[str, List[str]], Awaitable[object]],
+    jobs: List[WarmupJob],
+    budget: float,
+    concurrency: int,
+) -> WarmupReport:
+    "Run `search` over `jobs` in order until done or `budget` seconds pass"
+    start = time.monotonic()
+    deadline = start + budget
+    queue: "asyncio.Queue[WarmupJob]" = asyncio.Queue()
+    for job in jobs:
+        queue.put_nowait(job)
+    completed = 0
+    failed = 0
+
+    async def worker() -> None:
+        nonlocal completed, failed
+        while not queue.empty() and time.monotonic() < deadline:
+            job = queue.get_nowait()
+            try:
+                await search(job.word, job.languages)
+                completed += 1
+            except Exception as e:
+                failed += 1
+                logger.warning(f"Warm-up search for {job.word!r} failed: {e}")
+
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    return WarmupReport(
+        completed, failed, queue.qsize(), round(time.monotonic() - start, 2)
+    )
+
+
+def parse_language_sets(value: Optional[str], languages: List[str]) -> List[List[str]]:
+    """Parse "english;english,spanish" into [["english"], ["english", "spanish"]].
+
+    Defaults to each language on its own.
+    """
+    if not value:
+        return [[language] for language in languages]
+    return [part.split(",") for part in value.split(";") if part]
+
+
+async def warm_from_env(
+    search: Callable[[str, List[str]], Awaitable[object]],
+    exclusive: bool = False,
+) -> Optional[WarmupReport]:
+    """In-app warm-up, configured by WARMUP_* variables; off unless WARMUP_WORDS.
+
+    With `exclusive`, skipped if another process on the host is warming up.
+    """
+    num_words = int(os.getenv("WARMUP_WORDS", "0"))
+    if num_words <= 0:
+        return None
+    if not exclusive:
+        return await _warm_from_env(search, num_words)
+    with open(WARMUP_LOCK_PATH, "w") as lock:
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            logger.info("Another worker is warming the search cache")
+            return None
+        return await _warm_from_env(search, num_words)
+
+
+async def _warm_from_env(
+    search: Callable[[str, List[str]], Awaitable[object]], num_words: int
+) -> WarmupReport:
+    wordlists = load_wordlists(num_words)
+    language_sets = parse_language_sets(
+        os.getenv("WARMUP_LANGUAGE_SETS"), list(wordlists)
+    )
+    jobs = plan_jobs(wordlists, language_sets)
+    logger.info(f"Warming search cache with up to {len(jobs)} searches")
+    report = await warm(
+        search,
+        jobs,
+        budget=float(os.getenv("WARMUP_SECONDS", "60")),
+        concurrency=int(os.getenv("WARMUP_CONCURRENCY", "2")),
+    )
+    logger.info(f"Warm-up finished: {report._asdict()}")
+    return report
+
+
+def main() -> int:
+    """Warm a running server's cache over HTTP."""
+    import argparse
+
+    import requests
+
+    logging.basicConfig(
+        level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
+    )
+    parser = argparse.ArgumentParser(description="Warm the /api/search cache")
+    parser.add_argument("--url", default="http://localhost:5001")
+    parser.add_argument(
+        "-n", "--words", type=int, default=200, help="Top words per language"
+    )
+    parser.add_argument(
+        "--language-sets",
+        help='Language sets to warm, e.g. "english;english,spanish" '
+        "(default: each language on its own)",
+    )
+    parser.add_argument("--budget", type=float, default=300, help="Seconds")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--words-per-language", type=int, default=WORDS_PER_LANGUAGE)
+    args = parser.parse_args()
+
+    wordlists = load_wordlists(args.words)
+    language_sets = parse_language_sets(args.language_sets, list(wordlists))
+    jobs = plan_jobs(wordlists, language_sets)
+    session = requests.Session()
+
+    async def search(word: str, languages: List[str]) -> object:
+        payload = {
+            "word": word,
+            "languages": languages,
+            "words_per_l": args.words_per_language,
+        }
+        response = await asyncio.get_running_loop().run_in_executor(
+            None, lambda: session.post(f"{args.url}/api/search", json=payload)
+        )
+        response.raise_for_status()
+        return response
+
+    report = asyncio.run(warm(search, jobs, args.budget, args.concurrency))
+    logger.info(f"Warm-up finished: {report._asdict()}")
+    return 0 if report.failed == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,101 @@
+import asyncio
+import contextvars
+import multiprocessing
+import os
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, TypeVar
+
+import metrics
+
+T = TypeVar("T")
+
+
+class PoolSaturated(Exception):
+    "Raised instead of queueing when the pool's backlog is already full"
+
+
+class WorkerPool:
+    """Runs blocking calls off the event loop with bounded concurrency.
+
+    At most `max_workers` calls run at once; up to `max_queue` more wait for
+    a free worker, and anything beyond that is rejected with PoolSaturated so
+    a burst turns into fast 503s rather than an unbounded backlog. "thread"
+    suits Chroma and NumPy, which release the GIL for their heavy lifting;
+    "process" sidesteps the GIL entirely but every worker process loads its
+    own copy of the collection, unless it memory-maps an EMBEDDING_BUNDLE.
+    """
+
+    def __init__(self, kind: str, max_workers: int, max_queue: int):
+        if kind == "thread":
+            self._executor: Executor = ThreadPoolExecutor(
+                max_workers=max_workers, thread_name_prefix="search"
+            )
+        elif kind == "process":
+            # spawn: forking a server that already runs threads is unsafe
+            self._executor = ProcessPoolExecutor(
+                max_workers=max_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        else:
+            raise ValueError(f"Unknown worker pool kind {kind!r}")
+        self.kind = kind
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        # Only touched from the event loop thread, so no lock is needed
+        self.in_flight = 0
+        self.completed = 0
+        self.rejected = 0
+
+    @property
+    def queue_depth(self) -> int:
+        "Calls submitted but still waiting for a worker"
+        return max(0, self.in_flight - self.max_workers)
+
+    @property
+    def saturated(self) -> bool:
+        "Whether run() would reject a call right now"
+        return self.in_flight >= self.max_workers + self.max_queue
+
+    async def run(self, fn: Callable[..., T], *args: Any) -> T:
+        if self.saturated:
+            self.rejected += 1
+            raise PoolSaturated(f"{self.in_flight} calls already in flight")
+        self.in_flight += 1
+        try:
+            loop = asyncio.get_running_loop()
+            if self.kind == "process":
+                return await loop.run_in_executor(self._executor, fn, *args)
+            # Threads run in a copy of the caller's context so stage timings
+            # reach the request's breakdown (processes' timings stay there)
+            context = contextvars.copy_context()
+            submitted = time.perf_counter()
+
+            def call() -> T:
+                metrics.record("queue", time.perf_counter() - submitted)
+                return fn(*args)
+
+            return await loop.run_in_executor(self._executor, context.run, call)
+        finally:
+            self.in_flight -= 1
+            self.completed += 1
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "workers": self.max_workers,
+            "in_flight": self.in_flight,
+            "queue_depth": self.queue_depth,
+            "completed": self.completed,
+            "rejected": self.rejected,
+        }
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+def pool_from_env() -> WorkerPool:
+    return WorkerPool(
+        kind=os.getenv("SEARCH_POOL", "thread"),
+        max_workers=int(os.getenv("SEARCH_WORKERS", str(os.cpu_count() or 4))),
+        max_queue=int(os.getenv("SEARCH_QUEUE_LIMIT", "100")),
+    )
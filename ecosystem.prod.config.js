@@ -3,11 +3,24 @@ module.exports = {
       {
           name: 'latentdictionary',
           cwd: './backend',
-          script: './.venv/bin/uvicorn app:app --host 0.0.0.0 --port 5001',
+          // Each worker exits after 20000-22000 requests (the jitter staggers
+          // them) and the uvicorn supervisor starts a fresh one, so memory a
+          // worker leaks is returned at least that often
+          script:
+            './.venv/bin/uvicorn app:app --host 0.0.0.0 --port 5001 --workers 4 ' +
+            '--limit-max-requests 20000 --limit-max-requests-jitter 2000',
           watch: false,
           env: {
             NODE_ENV: 'production',
+            // Every worker memory-maps the same exported bundle (setup.sh)
+            // and shares one result cache, so workers add little memory
+            SEARCH_INDEX: 'numpy',
+            EMBEDDING_BUNDLE: '~/.latentdictionary-bundle',
+            SEARCH_CACHE_SHARED_PATH: '~/.latentdictionary-search-cache.sqlite',
+            SEARCH_WORKERS: '2',
           },
+          // pm2 measures only the process it started, the uvicorn supervisor;
+          // workers are bounded by --limit-max-requests above, not by this
           max_memory_restart: '600M'
       },
     ],
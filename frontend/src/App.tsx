@@ -8,7 +8,7 @@ import ErrorModal from "./ErrorModal";
 import Navigation from "./navigation/Navigation";
 import SwipeIndicator from "./SwipeIndicator";
 import LanguageSelector from "./navigation/LanguageSelector";
-import { fetchWithAuth, Languages } from "./utils";
+import { fetchDots, Languages, streamSearch } from "./utils";
 import "./FullscreenButton.css";
 
 // Add type definition for screen orientation API
@@ -55,20 +55,38 @@ const App: React.FC = () => {
   const fetchSearch = useCallback(
     async (inputText: string, languages: string[]) => {
       setLoading(true);
+      const body = {
+        word: inputText,
+        languages: languages,
+        words_per_l: WORDS_PER_LANGUAGE,
+      };
       try {
-        const response: Record<string, CorpusItem> = await fetchWithAuth(
-          "/api/search",
-          "POST",
-          {
-            word: inputText,
-            languages: languages,
-            words_per_l: WORDS_PER_LANGUAGE,
-          },
-        );
-        if (response) {
-          setActiveText(inputText);
-          setCorpus(response);
+        if (languages.length > 1) {
+          // Show each language as soon as it is found instead of waiting
+          // for the slowest one
+          await streamSearch("/api/search/stream", body, (event) => {
+            const response: Record<string, CorpusItem> = {};
+            event.dots.forEach((dot, i) => {
+              response[i] = dot;
+            });
+            setActiveText(inputText);
+            setCorpus(response);
+          });
+          return;
         }
+        const dots = await fetchDots("/api/search", body);
+        const response: Record<string, CorpusItem> = {};
+        dots.words.forEach((word, i) => {
+          response[i] = {
+            word,
+            x: dots.coordinates[i * 3],
+            y: dots.coordinates[i * 3 + 1],
+            z: dots.coordinates[i * 3 + 2],
+            language: dots.languages[dots.languageIndex[i]],
+          };
+        });
+        setActiveText(inputText);
+        setCorpus(response);
       } finally {
         setLoading(false);
       }
@@ -33,39 +33,109 @@ const env = (): Environment => {
 export const backendUrl = (): string =>
   `${origin()}${env() === "DEV" ? ":5001" : ""}`;
 
-interface FetchOptions {
-  method?: string;
-  headers: Record<string, string>;
-  body?: string;
+// Compact /api/search response; layout documented in backend/dots.py
+export const DOTS_MEDIA_TYPE = "application/vnd.latentdictionary.dots";
+
+export interface DotArrays {
+  words: string[];
+  languages: string[];
+  languageIndex: Uint8Array;
+  coordinates: Float32Array; // x, y, z for each word
 }
 
-export const fetchWithAuth = async <T>(
+export const decodeDots = (buffer: ArrayBuffer): DotArrays => {
+  const header = new DataView(buffer, 0, 16);
+  const magic = String.fromCharCode(...new Uint8Array(buffer, 0, 4));
+  if (magic !== "LDOT" || header.getUint32(4, true) !== 1) {
+    throw new Error("Unsupported dots payload");
+  }
+  const n = header.getUint32(8, true);
+  let pos = 16;
+  const coordinates = new Float32Array(buffer, pos, n * 3);
+  pos += n * 3 * 4;
+  const offsets = new Uint32Array(buffer, pos, n + 1);
+  pos += (n + 1) * 4;
+  const languageIndex = new Uint8Array(buffer, pos, n);
+  pos += n;
+  const decoder = new TextDecoder();
+  const blob = new Uint8Array(buffer, pos, offsets[n]);
+  const words: string[] = [];
+  for (let i = 0; i < n; i++) {
+    words.push(decoder.decode(blob.subarray(offsets[i], offsets[i + 1])));
+  }
+  const languages = decoder
+    .decode(new Uint8Array(buffer, pos + offsets[n]))
+    .split("\n");
+  return { words, languages, languageIndex, coordinates };
+};
+
+export const fetchDots = async (
   route: string,
-  method: string = "GET",
-  body?: unknown,
-): Promise<T> => {
+  body: unknown,
+): Promise<DotArrays> => {
   const jwt = localStorage.getItem("jwt") || "";
-  const headers = {
-    "Content-Type": "application/json",
-    Authorization: `Bearer ${jwt}`,
-  };
-
-  const options: FetchOptions = {
-    method,
-    headers,
-  };
+  const res = await fetch(`${backendUrl()}${route}`, {
+    method: "POST",
+    headers: {
+      "Content-Type": "application/json",
+      Accept: DOTS_MEDIA_TYPE,
+      Authorization: `Bearer ${jwt}`,
+    },
+    body: JSON.stringify(body),
+  });
 
-  if (body) {
-    options.body = JSON.stringify(body);
+  if (!res.ok) {
+    throw new Error(`HTTP error! status: ${res.status}`);
   }
 
-  const res = await fetch(`${backendUrl()}${route}`, options);
+  return decodeDots(await res.arrayBuffer());
+};
 
-  if (!res.ok) {
+// One line of /api/search/stream (NDJSON); see search_events in backend/app.py
+export interface SearchEvent {
+  done: boolean;
+  languages: string[];
+  dots: { word: string; language: string; x: number; y: number; z: number }[];
+  error?: string;
+}
+
+// Calls onEvent with the layout so far each time another language's
+// neighbours arrive; resolves after the final, complete layout
+export const streamSearch = async (
+  route: string,
+  body: unknown,
+  onEvent: (event: SearchEvent) => void,
+): Promise<void> => {
+  const jwt = localStorage.getItem("jwt") || "";
+  const res = await fetch(`${backendUrl()}${route}`, {
+    method: "POST",
+    headers: {
+      "Content-Type": "application/json",
+      Authorization: `Bearer ${jwt}`,
+    },
+    body: JSON.stringify(body),
+  });
+
+  if (!res.ok || !res.body) {
     throw new Error(`HTTP error! status: ${res.status}`);
   }
 
-  return res.json() as Promise<T>;
+  const reader = res.body.getReader();
+  const decoder = new TextDecoder();
+  let buffered = "";
+  for (;;) {
+    const { value, done } = await reader.read();
+    if (done) break;
+    buffered += decoder.decode(value, { stream: true });
+    const lines = buffered.split("\n");
+    buffered = lines.pop() ?? "";
+    for (const line of lines) {
+      if (!line) continue;
+      const event = JSON.parse(line) as SearchEvent;
+      if (event.error) throw new Error(event.error);
+      onEvent(event);
+    }
+  }
 };
 
 export function debounce<T extends (...args: unknown[]) => void>(
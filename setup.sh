@@ -5,5 +5,7 @@ cd frontend
 npm install
 npm run build
 
+# Brotli/gzip copies of the build for the backend to serve
 cd ..
+backend/.venv/bin/python backend/static.py
 pm2 start ecosystem.prod.config.js
\ No newline at end of file